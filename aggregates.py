@@ -0,0 +1,264 @@
+"""SQL-side aggregates shared by the dashboard, charts and suggestion engine.
+
+Everything a page renders is read from the trigger-maintained
+monthly_summary rollup, so both the SQL and the frames handed to
+pandas/plotly scale with months x categories, not with the number of
+transactions.
+"""
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+
+import pandas as pd
+
+import cache
+import database as db
+import perf
+
+@dataclass
+class Summary:
+    month: str                  # YYYY-MM the totals below refer to
+    income: float
+    expense: float
+    by_category: pd.DataFrame   # category, amount: expenses this month, largest first
+    monthly: pd.DataFrame       # month, type, amount: whole history
+    budgets: pd.DataFrame       # category, limit_amount, amount, usage: this month
+    rollup: pd.DataFrame        # month, type, category, amount, count: whole history
+    daily: pd.DataFrame         # date, amount, count: expenses per day over the DAILY_WINDOW days to month end
+    recurring: pd.DataFrame     # description, category, amount, months: repeating expenses
+    deltas: int = 0             # Writes applied since it was built from the database
+    built: float = field(default_factory=time.monotonic)
+
+    @property
+    def balance(self):
+        return self.income - self.expense
+
+    @property
+    def savings_rate(self):
+        return (self.income - self.expense) / self.income * 100 if self.income > 0 else 0
+
+DAILY_WINDOW = 90       # Days of daily spend kept for anomaly detection
+RECURRING_WINDOW = 6    # Months searched for repeating charges
+RECURRING_MIN_MONTHS = 3
+
+def _grouped(conn, username):
+    grouped = pd.read_sql_query("""
+        SELECT month, type, category, total AS amount, count
+        FROM monthly_summary
+        WHERE username = ?
+        ORDER BY month, type, category
+    """, conn, params=(username,))
+    return db.compact(grouped)
+
+def _budget_usage(conn, username, month):
+    budgets = pd.read_sql_query("""
+        SELECT b.category, b.limit_amount, COALESCE(m.total, 0.0) AS amount
+        FROM budgets b
+        LEFT JOIN monthly_summary m
+               ON m.username = b.username AND m.month = b.month
+              AND m.type = 'Expense' AND m.category = b.category
+        WHERE b.username = ? AND b.month = ?
+        ORDER BY b.id
+    """, conn, params=(username, month))
+    return _with_usage(budgets)
+
+def _with_usage(budgets):
+    budgets['usage'] = budgets['amount'] / budgets['limit_amount'].where(budgets['limit_amount'] > 0)
+    budgets['usage'] = budgets['usage'].fillna(0)
+    return budgets
+
+def _daily_spend(conn, username, end):
+    start = date.fromisoformat(end) - timedelta(days=DAILY_WINDOW)
+    return pd.read_sql_query("""
+        SELECT date, SUM(amount) AS amount, COUNT(*) AS count
+        FROM transactions
+        WHERE username = ? AND date >= ? AND date < ? AND type = 'Expense'
+        GROUP BY date
+        ORDER BY date
+    """, conn, params=(username, start.isoformat(), end))
+
+def _recurring(conn, username, end):
+    year, mon = map(int, end[:7].split('-'))
+    first = year * 12 + mon - 1 - RECURRING_WINDOW
+    start = date(first // 12, first % 12 + 1, 1)
+    # Same payee and amount in several months, and that amount is what the payee usually charges
+    return pd.read_sql_query("""
+        SELECT description, category, amount, months FROM (
+            SELECT MAX(description) AS description, MAX(category) AS category, ROUND(amount) AS amount,
+                   COUNT(DISTINCT substr(date, 1, 7)) AS months, COUNT(*) AS charges,
+                   SUM(COUNT(*)) OVER (PARTITION BY lower(trim(description))) AS payee_charges
+            FROM transactions
+            WHERE username = ? AND date >= ? AND date < ? AND type = 'Expense' AND COALESCE(description, '') <> ''
+            GROUP BY lower(trim(description)), ROUND(amount)
+        )
+        WHERE months >= ? AND charges * 2 >= payee_charges
+        ORDER BY months DESC, amount DESC
+    """, conn, params=(username, start.isoformat(), end, RECURRING_MIN_MONTHS))
+
+@cache.cached('summary')
+@perf.timed('aggregates.summarize')
+def summarize(username, month):
+    """Builds the Summary for `username`, with current totals for `month` (YYYY-MM)."""
+    with db.get_connection() as conn:
+        grouped = _grouped(conn, username)
+        budgets = _budget_usage(conn, username, month)
+        _, month_end = db.month_range(month)
+        daily = _daily_spend(conn, username, month_end)
+        recurring = _recurring(conn, username, month_end)
+    return _summary(month, grouped, budgets, daily, recurring)
+
+def _summary(month, grouped, budgets, daily, recurring, **bookkeeping):
+    """Derives the month's totals and the chart frames from the rollup."""
+    this_month = grouped[grouped['month'] == month]
+    totals = this_month.groupby('type', observed=True)['amount'].sum()
+    by_category = (this_month[this_month['type'] == 'Expense']
+                   .groupby('category', as_index=False, observed=True)['amount'].sum()
+                   .sort_values('amount', ascending=False, ignore_index=True))
+    monthly = grouped.groupby(['month', 'type'], as_index=False, observed=True)['amount'].sum()
+
+    return Summary(
+        month=month,
+        income=float(totals.get('Income', 0.0)),
+        expense=float(totals.get('Expense', 0.0)),
+        by_category=by_category,
+        monthly=monthly,
+        budgets=budgets,
+        rollup=grouped,
+        daily=daily,
+        recurring=recurring,
+        **bookkeeping,
+    )
+
+@cache.cached('recent')
+def recent_transactions(username, n):
+    """The user's n newest transactions: id, date, amount, category, type."""
+    return db.query_transactions(username, columns=['id', 'date', 'amount', 'category', 'type'], limit=n)
+
+@perf.timed('aggregates.lifetime_totals')
+def lifetime_totals(username, month=None):
+    """All-time, or one month's, (income, expense, transaction count) for the user, from the rollup."""
+    sql = "SELECT type, SUM(total), SUM(count) FROM monthly_summary WHERE username = ?"
+    params = [username]
+    if month is not None:
+        sql += " AND month = ?"
+        params.append(month)
+    with db.get_connection() as conn:
+        rows = conn.execute(sql + " GROUP BY type", params).fetchall()
+    totals = {kind: (total, count) for kind, total, count in rows}
+    income = totals.get('Income', (0.0, 0))[0]
+    expense = totals.get('Expense', (0.0, 0))[0]
+    return income, expense, sum(count for _, count in totals.values())
+
+# --- Incremental updates ---
+# A single-row write changes a Summary in ways computable from the row
+# alone: one rollup cell, one budget's usage, one day of spend. After each
+# such write from this process, the summaries and recent-activity lists
+# cached at the version before it are updated with the row and cached at
+# the write's version, so the rerun that follows reads nothing but the data
+# version. Charts and suggestions are rebuilt from the updated summary in
+# memory. The cost depends on months x categories, not on history length.
+#
+# recurring is carried over as it was; one charge rarely changes it. A
+# summary that has absorbed RECONCILE_EVERY writes, or was built from the
+# database more than RECONCILE_SECONDS ago, is not carried forward: the
+# next read rebuilds it from the database, which corrects any drift.
+
+RECONCILE_EVERY = 50
+RECONCILE_SECONDS = 600
+
+INCREMENTAL_STATS = {"applied": 0, "reconciled": 0}
+_stats_lock = threading.Lock()
+
+def _count(outcome):
+    with _stats_lock:
+        INCREMENTAL_STATS[outcome] += 1
+
+def _add_to_rollup(rollup, month, kind, category, amount, count):
+    cell = (rollup['month'] == month) & (rollup['type'] == kind) & (rollup['category'] == category)
+    if cell.any():
+        rollup = rollup.copy()
+        rollup.loc[cell, 'amount'] += amount
+        rollup.loc[cell, 'count'] += count
+        # The rollup trigger deletes a cell once its last transaction is gone
+        return rollup[rollup['count'] > 0].reset_index(drop=True)
+    row = pd.DataFrame({'month': [month], 'type': [kind], 'category': [category], 'amount': [amount],
+                        'count': [count]})
+    rollup = pd.concat([rollup, row], ignore_index=True)
+    return db.compact(rollup.sort_values(['month', 'type', 'category'], ignore_index=True))
+
+def _add_to_daily(daily, day, amount, count):
+    same_day = daily['date'] == day
+    if same_day.any():
+        daily = daily.copy()
+        daily.loc[same_day, 'amount'] += amount
+        daily.loc[same_day, 'count'] += count
+        # A day with no expenses left has no row, as in _daily_spend
+        return daily[daily['count'] > 0].reset_index(drop=True)
+    row = pd.DataFrame({'date': [day], 'amount': [amount], 'count': [count]})
+    return pd.concat([daily, row], ignore_index=True).sort_values('date', ignore_index=True)
+
+@perf.timed('aggregates.apply_transaction')
+def apply_transaction(summary, row, sign):
+    """The Summary after adding (sign 1) or deleting (sign -1) a transaction row in db.CHANGE_COLUMNS order."""
+    _, day, amount, category, kind, _ = row
+    amount = sign * float(amount or 0)
+    kind, category = kind or '', category or ''
+    month = day[:7]
+    rollup = _add_to_rollup(summary.rollup, month, kind, category, amount, sign)
+    budgets, daily = summary.budgets, summary.daily
+    if kind == 'Expense':
+        budgeted = budgets['category'] == category
+        if month == summary.month and budgeted.any():
+            budgets = budgets.copy()
+            budgets.loc[budgeted, 'amount'] += amount
+            budgets = _with_usage(budgets)
+        _, month_end = db.month_range(summary.month)
+        if (date.fromisoformat(month_end) - timedelta(days=DAILY_WINDOW)).isoformat() <= day < month_end:
+            daily = _add_to_daily(daily, day, amount, sign)
+    return _summary(summary.month, rollup, budgets, daily, summary.recurring,
+                    deltas=summary.deltas + 1, built=summary.built)
+
+def apply_budget(summary, category, limit, month):
+    """The Summary after set_budget(category, limit, month)."""
+    if month != summary.month:
+        return replace(summary, deltas=summary.deltas + 1)
+    budgets = summary.budgets.copy()
+    budgeted = budgets['category'] == category
+    if budgeted.any():
+        budgets.loc[budgeted, 'limit_amount'] = float(limit)
+    else:
+        spent = summary.by_category.loc[summary.by_category['category'] == category, 'amount'].sum()
+        row = pd.DataFrame({'category': [category], 'limit_amount': [float(limit)], 'amount': [float(spent)]})
+        budgets = pd.concat([budgets, row], ignore_index=True)
+    return replace(summary, budgets=_with_usage(budgets), deltas=summary.deltas + 1)
+
+def _apply_recent(recent, n, row, sign):
+    if sign < 0:
+        # Deleting a listed row would need the next-newest one from the database
+        return None if (recent['id'] == row[0]).any() else recent
+    added = pd.DataFrame([dict(zip(db.CHANGE_COLUMNS, row))])[recent.columns]
+    merged = pd.concat([recent, db.compact(added)], ignore_index=True)
+    return db.compact(merged.sort_values(['date', 'id'], ascending=False, ignore_index=True).head(n))
+
+def _on_write(op, change):
+    if op in ("add_transaction", "delete_transaction"):
+        sign = 1 if op == "add_transaction" else -1
+        update = lambda summary: apply_transaction(summary, change.row, sign)
+        update_recent = lambda args, recent: _apply_recent(recent, args[0], change.row, sign)
+    elif op == "set_budget":
+        update = lambda summary: apply_budget(summary, *change.row)
+        update_recent = lambda args, recent: recent
+    else:
+        return
+
+    def carry(args, summary):
+        if summary.deltas >= RECONCILE_EVERY or time.monotonic() - summary.built > RECONCILE_SECONDS:
+            _count("reconciled")
+            return None
+        _count("applied")
+        return update(summary)
+
+    cache.carry_forward(change.username, change.version, {'summary': carry, 'recent': update_recent})
+
+db.WRITE_LISTENERS.append(_on_write)
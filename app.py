@@ -1,157 +1,86 @@
 import streamlit as st
-import pandas as pd
-from datetime import date
+import json
+import math
+import os
+from datetime import date, timedelta
 import database as db
+import cache
 import auth
-import charts
-import optimizer
+import perf
+import html_blocks
+# Page modules (aggregates, charts, optimizer, exports, importer) are imported
+# in the branch of the page that uses them, so pandas, plotly and fpdf load
+# the first time a page needs them rather than before the login form
+
+# Times this run of the script; see the Performance page
+perf.start_render(profile=st.session_state.get('profile_renders', False))
+perf.section("setup")
 
 # --- Page Config ---
 st.set_page_config(page_title="Budget Optimizer", page_icon="💰", layout="wide")
 
 # --- VISUAL STYLING (CSS) ---
 def load_css():
-    st.markdown("""
-        <style>
-        @import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;500;700&display=swap');
-
-        html, body, [class*="css"] {
-            font-family: 'Poppins', sans-serif;
-        }
-
-        /* App Background */
-        .stApp {
-            background: linear-gradient(135deg, #fdfbfb 0%, #ebedee 100%);
-        }
-
-        /* Sidebar Background */
-        section[data-testid="stSidebar"] {
-            background: linear-gradient(180deg, #1A237E 0%, #0D47A1 100%);
-        }
-
-        /* --- FIX: Force Sidebar Text to White --- */
-        section[data-testid="stSidebar"] * {
-            color: #ffffff !important;
-        }
-        
-        /* Specific fix for Radio Button Text (Navigation) */
-        div[data-testid="stSidebar"] label p {
-            font-size: 16px; 
-            font-weight: 500;
-        }
-
-        /* Custom Metric Cards */
-        .metric-container {
-            background: linear-gradient(135deg, #ffffff, #f0f2f5);
-            border-radius: 15px;
-            padding: 20px;
-            box-shadow: 0 10px 20px rgba(0,0,0,0.05);
-            text-align: center;
-            transition: transform 0.3s ease;
-            border: 1px solid rgba(255,255,255,0.5);
-        }
-        .metric-container:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 15px 25px rgba(0,0,0,0.1);
-        }
-        
-        /* Specific Card Gradients */
-        .card-income { border-bottom: 5px solid #00C853; }
-        .card-expense { border-bottom: 5px solid #FF3D00; }
-        .card-balance { border-bottom: 5px solid #2979FF; }
-
-        .metric-label { font-size: 14px; font-weight: 500; color: #546E7A; text-transform: uppercase; letter-spacing: 1px; }
-        .metric-value { font-size: 32px; font-weight: 700; color: #263238; margin: 10px 0; }
-        .metric-delta { font-size: 14px; font-weight: 600; padding: 4px 8px; border-radius: 8px; display: inline-block;}
-        
-        .delta-pos { background-color: #E8F5E9; color: #2E7D32; }
-        .delta-neg { background-color: #FFEBEE; color: #C62828; }
-
-        /* Form & Container Styling */
-        .form-container {
-            background-color: white;
-            padding: 30px;
-            border-radius: 20px;
-            box-shadow: 0 4px 15px rgba(0,0,0,0.05);
-        }
-
-        /* Styled Buttons */
-        div.stButton > button {
-            background: linear-gradient(90deg, #2979FF 0%, #1565C0 100%);
-            color: white;
-            border: none;
-            padding: 10px 24px;
-            border-radius: 50px;
-            font-weight: 600;
-            box-shadow: 0 4px 10px rgba(41, 121, 255, 0.3);
-            transition: all 0.3s;
-        }
-        div.stButton > button:hover {
-            transform: scale(1.05);
-            box-shadow: 0 6px 15px rgba(41, 121, 255, 0.4);
-        }
-
-        /* Budget Progress Bar Styling */
-        .progress-bar-bg {
-            background-color: #eee;
-            border-radius: 10px;
-            height: 20px;
-            width: 100%;
-            overflow: hidden;
-        }
-        .progress-bar-fill {
-            height: 100%;
-            text-align: center;
-            color: white;
-            font-size: 12px;
-            line-height: 20px;
-            transition: width 0.5s ease-in-out;
-        }
-        </style>
-    """, unsafe_allow_html=True)
+    # Sent on every rerun, as Streamlit rebuilds the page; minified once per process
+    st.markdown(html_blocks.css(), unsafe_allow_html=True)
 
 load_css()
 
 # --- Initialize DB ---
-db.init_db()
+db.init_db()    # Creates or migrates the schema on the first run in this process only
+# Background jobs, once per process; the writer service runs them when there is one
+if not db.WRITER_ADDRESS:
+    import backup
+    import recurring
+    recurring.start()   # Posts recurring transactions
+    backup.start()      # Scheduled snapshots, if BUDGET_BACKUP_INTERVAL is set
 
 # --- Authentication Check ---
-if 'logged_in' not in st.session_state:
-    st.session_state['logged_in'] = False
-
-if not st.session_state['logged_in']:
+# A session token, not the password, authenticates every rerun
+if auth.current_user() is None:
     auth.login_page()
     st.stop()
 
 # --- Sidebar ---
+perf.section("sidebar")
 with st.sidebar:
     st.image("https://cdn-icons-png.flaticon.com/512/3135/3135715.png", width=80)
     # Using explicit white color for the title just in case CSS misses it
     st.markdown(f"<h1 style='color: white;'>Hello, {st.session_state['name'].split()[0]}!</h1>", unsafe_allow_html=True)
     st.markdown("<p style='color: #E0E0E0;'>Your financial command center.</p>", unsafe_allow_html=True)
     st.markdown("---")
-    menu = st.radio("Navigate", ["Dashboard", "Add Transaction", "Budget Planner", "Reports"])
+    pages = ["Dashboard", "Add Transaction", "Import", "Budget Planner", "Reports"]
+    if auth.is_admin(st.session_state['username']):
+        pages.append("Performance")
+    menu = st.radio("Navigate", pages)
     st.markdown("---")
     if st.button("Logout"):
-        st.session_state['logged_in'] = False
+        auth.logout()
         st.rerun()
 
 # --- Data Loading ---
+# Each page loads only the rows and columns it renders
 username = st.session_state['username']
-df = db.get_user_data(username)
 current_month = date.today().strftime("%Y-%m")
-budget_df = db.get_budgets(username, current_month)
+REPORT_PAGE_SIZE = 50
 
 # --- Pages ---
+perf.section(menu)
 
 if menu == "Dashboard":
+    import aggregates
+    import charts
+    import optimizer
+
     st.title("🚀 Financial Dashboard")
     st.markdown("### Overview for this month")
     
+    summary = aggregates.summarize(username, current_month)
+
     # Calculate Metrics
-    income = df[df['type'] == 'Income']['amount'].sum()
-    expense = df[df['type'] == 'Expense']['amount'].sum()
-    balance = income - expense
+    income = summary.income
+    expense = summary.expense
+    balance = summary.balance
     
     # --- COLORFUL CARDS ---
     col1, col2, col3 = st.columns(3)
@@ -186,38 +115,36 @@ if menu == "Dashboard":
     st.markdown("---")
     
     # Charts Area
+    perf.section("Dashboard.charts")
     c1, c2 = st.columns([2, 1])
     with c1:
         st.markdown("##### 📅 Income & Expense Trend")
-        fig_trend = charts.plot_income_expense_trend(df)
+        fig_trend = cache.get_or_compute(username, 'trend_chart', (current_month,),
+                                         lambda: charts.plot_income_expense_trend(summary.monthly).to_json())
         if fig_trend:
-            st.plotly_chart(fig_trend, use_container_width=True)
+            st.plotly_chart(json.loads(fig_trend), use_container_width=True)
     with c2:
         st.markdown("##### 💸 Where is money going?")
-        fig_pie = charts.plot_expense_pie(df)
+        fig_pie = cache.get_or_compute(username, 'expense_pie', (current_month,),
+                                       lambda: charts.plot_expense_pie(summary.by_category).to_json())
         if fig_pie:
-            st.plotly_chart(fig_pie, use_container_width=True)
+            st.plotly_chart(json.loads(fig_pie), use_container_width=True)
         
     st.markdown("---")
+    perf.section("Dashboard.insights")
     st.subheader("🤖 AI Smart Insights")
     
     # Styled Suggestions
-    suggestions = optimizer.generate_suggestions(df, budget_df)
+    suggestions = cache.get_or_compute(username, 'suggestions', (current_month,),
+                                       lambda: optimizer.generate_suggestions(summary))
     if suggestions:
-        for s in suggestions:
-            # Check content to decide color
-            color = "#D1C4E9" if "Insight" in s else "#FFCDD2" if "Breach" in s or "Warning" in s else "#C8E6C9"
-            icon = "💡" if "Insight" in s else "🚨" if "Breach" in s else "✅"
-            
-            st.markdown(f"""
-                <div style="background-color: {color}; padding: 15px; border-radius: 10px; margin-bottom: 10px; border-left: 5px solid rgba(0,0,0,0.1);">
-                    <span style="font-size: 18px; margin-right: 10px;">{icon}</span> {s.replace('⚠️', '').replace('🚨', '').replace('✅', '').replace('💡', '')}
-                </div>
-            """, unsafe_allow_html=True)
+        st.markdown(html_blocks.suggestions(suggestions), unsafe_allow_html=True)
     else:
         st.info("No sufficient data for insights yet.")
 
 elif menu == "Add Transaction":
+    import aggregates
+
     st.title("➕ Add New Transaction")
     
     col1, col2 = st.columns([2, 1])
@@ -246,29 +173,84 @@ elif menu == "Add Transaction":
         
     with col2:
         st.markdown("#### 🕒 Recent Activity")
-        if not df.empty:
-            recent = df.sort_values(by='date', ascending=False).head(5)
-            for index, row in recent.iterrows():
-                color = "#e8f5e9" if row['type'] == "Income" else "#ffebee"
-                icon = "💰" if row['type'] == "Income" else "🛒"
-                st.markdown(f"""
-                    <div style="background-color: {color}; padding: 10px; border-radius: 8px; margin-bottom: 8px; font-size: 14px;">
-                        <strong>{icon} {row['category']}</strong><br>
-                        <span style="color: #666;">{row['date']}</span>
-                        <span style="float: right; font-weight: bold;">₹{row['amount']}</span>
-                    </div>
-                """, unsafe_allow_html=True)
+        recent = aggregates.recent_transactions(username, 5)
+        if not recent.empty:
+            st.markdown(html_blocks.recent_activity(recent), unsafe_allow_html=True)
         else:
             st.info("No recent activity.")
 
     with st.expander("🗑️ Delete History"):
+         found = st.text_input("Find by description or category")
+         if db.search_words(found):
+             matches = db.query_transactions(username, text=found, limit=10,
+                                             columns=["id", "date", "amount", "category", "description"])
+             st.dataframe(matches, use_container_width=True, hide_index=True,
+                          column_config={'date': st.column_config.DateColumn('date')})
          t_id = st.number_input("Transaction ID", step=1)
          if st.button("Delete Transaction"):
-             db.delete_transaction(t_id)
-             st.warning(f"Deleted ID: {t_id}")
-             st.rerun()
+             if db.delete_transaction(t_id) is None:
+                 st.error(f"No transaction with ID {t_id} to delete (archived months are read-only).")
+             else:
+                 st.warning(f"Deleted ID: {t_id}")
+                 st.rerun()
+
+    with st.expander("🔁 Recurring Transactions"):
+        with st.form("recurring_form", clear_on_submit=True):
+            c1, c2, c3 = st.columns(3)
+            r_start = c1.date_input("First date")
+            r_every = c2.number_input("Every (months)", min_value=1, max_value=12, value=1, step=1)
+            r_end = c3.date_input("Last date (optional)", value=None)
+            c4, c5, c6 = st.columns(3)
+            r_type = c4.selectbox("Type", ["Expense", "Income"], key="recurring_type")
+            r_amount = c5.number_input("Amount (₹)", min_value=0.0, step=100.0, key="recurring_amount")
+            r_category = c6.selectbox("Category", ["Food", "Transport", "Rent", "Entertainment", "Salary", "Freelance", "Health", "Shopping", "Other"], key="recurring_category")
+            r_desc = st.text_input("Description (Optional)", key="recurring_desc")
+            if st.form_submit_button("🔁 Save Rule"):
+                db.add_recurring_rule(username, r_amount, r_category, r_type, r_desc, r_start, int(r_every),
+                                      end=r_end)
+                _, posted = db.post_recurring(username=username)
+                st.success(f"Rule saved; {posted} past occurrences posted.")
+                st.rerun()
+        rules = db.get_recurring_rules(username)
+        if not rules.empty:
+            st.dataframe(rules, use_container_width=True, hide_index=True)
+            rule_id = st.number_input("Rule ID", step=1)
+            if st.button("Stop Rule"):
+                if db.delete_recurring_rule(username, rule_id):
+                    st.warning(f"Stopped rule {rule_id}; its past transactions are kept.")
+                    st.rerun()
+                else:
+                    st.error(f"No rule with ID {rule_id}.")
+
+elif menu == "Import":
+    import importer
+
+    st.title("📥 Import Bank Statements")
+    st.markdown("Upload a CSV, OFX or QFX export from your bank. Rows you have already imported are skipped.")
+
+    uploaded = st.file_uploader("Statement file", type=["csv", "ofx", "qfx"])
+    if uploaded is not None and st.button("🚀 Import"):
+        bar = st.progress(0.0, text="Importing...")
+        def report(fraction, result):
+            bar.progress(min(fraction or 0.0, 1.0), text=f"{result.read:,} rows read, {result.inserted:,} new")
+        try:
+            result = importer.import_file(uploaded, username, importer.detect_format(uploaded.name),
+                                          total_bytes=uploaded.size, progress=report)
+        except ValueError as e:
+            st.error(f"Could not import this file: {e}")
+        else:
+            st.success(f"Imported {result.inserted:,} new transactions in {result.seconds:.1f}s "
+                       f"({result.duplicates:,} already present).")
+            if result.rejected:
+                st.warning(f"{result.rejected:,} rows could not be read.")
+                st.dataframe([{"Line": line, "Problem": problem} for line, problem in result.errors],
+                             use_container_width=True)
 
 elif menu == "Budget Planner":
+    import aggregates
+    import charts
+    import optimizer
+
     st.title("🎯 Monthly Budget Targets")
     st.markdown(f"Set your limits for: **{current_month}**")
     
@@ -284,60 +266,138 @@ elif menu == "Budget Planner":
 
     st.markdown("### 📊 Budget Progress")
     
-    if not budget_df.empty and not df.empty:
-        expense_sum = df[df['type'] == 'Expense'].groupby('category')['amount'].sum().reset_index()
-        merged = pd.merge(budget_df, expense_sum, on='category', how='left').fillna(0)
-        
-        for _, row in merged.iterrows():
-            cat = row['category']
-            limit = row['limit_amount']
-            spent = row['amount']
-            pct = (spent / limit) * 100 if limit > 0 else 0
-            pct_clamped = min(pct, 100)
-            
-            bar_color = "#4CAF50" # Green
-            if pct > 75: bar_color = "#FFC107" # Yellow
-            if pct > 100: bar_color = "#F44336" # Red
-            
-            st.markdown(f"""
-                <div style="margin-bottom: 15px; background: white; padding: 15px; border-radius: 10px; box-shadow: 0 2px 5px rgba(0,0,0,0.05);">
-                    <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                        <strong>{cat}</strong>
-                        <span>₹{spent:,.0f} / ₹{limit:,.0f}</span>
-                    </div>
-                    <div class="progress-bar-bg">
-                        <div class="progress-bar-fill" style="width: {pct_clamped}%; background-color: {bar_color};">
-                            {pct:.0f}%
-                        </div>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+    summary = aggregates.summarize(username, current_month)
+    if not summary.budgets.empty:
+        st.markdown(html_blocks.budget_progress(summary.budgets), unsafe_allow_html=True)
     else:
         st.info("No budgets or expenses found yet.")
 
-    fig_budget = charts.plot_budget_vs_actual(budget_df, df)
+    perf.section("Budget Planner.chart")
+    fig_budget = cache.get_or_compute(username, 'budget_chart', (current_month,),
+                                      lambda: charts.plot_budget_vs_actual(summary.budgets).to_json())
     if fig_budget:
-        st.plotly_chart(fig_budget, use_container_width=True)
+        st.plotly_chart(json.loads(fig_budget), use_container_width=True)
+
+    perf.section("Budget Planner.optimize")
+    st.markdown("### 🤖 Optimize Budgets")
+    forecast = optimizer.forecast_for(username, current_month)
+    if forecast.by_category.empty:
+        st.info("Add some income and expenses to get forecast-based limits.")
+    else:
+        target = st.slider("Target savings rate (%)", 0, 80, optimizer.SAVINGS_TARGET, step=5)
+        plan = optimizer.allocate(forecast, target)
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Forecast Income", f"₹{forecast.income:,.0f}")
+        c2.metric("Forecast Expense", f"₹{forecast.expense:,.0f}")
+        c3.metric("Savings Rate with Limits", f"{plan.savings_rate:.1f}%")
+        if not plan.feasible:
+            st.warning(f"Spending already committed this month rules out a {target}% savings rate.")
+        st.dataframe(plan.limits[['category', 'spent', 'forecast', 'limit']].rename(columns=str.title),
+                     use_container_width=True, hide_index=True,
+                     column_config={c: st.column_config.NumberColumn(format="₹%.0f")
+                                    for c in ("Spent", "Forecast", "Limit")})
+        if st.button("Apply Suggested Limits"):
+            for cat, limit in zip(plan.limits['category'], plan.limits['limit']):
+                db.set_budget(username, cat, float(math.ceil(limit)), current_month)
+            st.success("Budgets updated!")
+            st.rerun()
 
 elif menu == "Reports":
+    import exports
+
     st.title("📑 Export & Reports")
     st.markdown("Download your data for offline analysis.")
     
+    # Files are only built when a button is clicked, in a background worker
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown('<div class="form-container">', unsafe_allow_html=True)
         st.markdown("#### 📄 CSV Report")
-        csv = df.to_csv(index=False).encode('utf-8')
-        st.download_button("📥 Download CSV", csv, "report.csv", "text/csv")
+        st.download_button("📥 Download CSV", lambda: exports.read_export(username, "csv"),
+                           "report.csv", "text/csv", on_click="ignore")
         st.markdown('</div>', unsafe_allow_html=True)
 
     with col2:
         st.markdown('<div class="form-container">', unsafe_allow_html=True)
         st.markdown("#### 📕 PDF Report")
-        pdf_bytes = optimizer.generate_pdf_report(df, st.session_state['name'])
-        st.download_button("📥 Download PDF", pdf_bytes, "report.pdf", "application/pdf")
+        name = st.session_state['name']
+        st.download_button("📥 Download PDF", lambda: exports.read_export(username, "pdf", name),
+                           "report.pdf", "application/pdf", on_click="ignore")
         st.markdown('</div>', unsafe_allow_html=True)
         
-    st.markdown("### Raw Data")
-    st.dataframe(df, use_container_width=True)
\ No newline at end of file
+    perf.section("Reports.raw_data")
+    st.markdown("### 🔎 Find Transactions")
+    f1, f2 = st.columns([3, 1])
+    text = f1.text_input("Search description or category", placeholder="e.g. netflix, groc*")
+    kind = f2.selectbox("Type", ["All", "Income", "Expense"])
+    f3, f4, f5, f6 = st.columns(4)
+    start = f3.date_input("From", value=None)
+    end = f4.date_input("To", value=None)
+    min_amount = f5.number_input("Min Amount (₹)", min_value=0.0, value=None, step=100.0)
+    max_amount = f6.number_input("Max Amount (₹)", min_value=0.0, value=None, step=100.0)
+    filters = {'text': " ".join(db.search_words(text)) or None, 'type': None if kind == "All" else kind,
+               'start': start, 'end': end and end + timedelta(days=1),
+               'min_amount': min_amount, 'max_amount': max_amount}
+
+    # Keyset pagination: remember the (date, id) of the last row of each page shown,
+    # starting over whenever the filters change
+    if st.session_state.get('report_filters') != filters:
+        st.session_state['report_filters'] = filters
+        st.session_state['report_cursors'] = [None]
+    cursors = st.session_state['report_cursors']
+    key = (tuple(filters.values()), cursors[-1])
+    page = cache.get_or_compute(username, 'report_page', key, lambda: db.query_transactions(
+        username, limit=REPORT_PAGE_SIZE + 1, after=cursors[-1], **filters))
+    has_next = len(page) > REPORT_PAGE_SIZE
+    page = page.head(REPORT_PAGE_SIZE)
+    st.dataframe(page, use_container_width=True, column_config={'date': st.column_config.DateColumn('date')})
+
+    p1, p2, p3 = st.columns([1, 1, 4])
+    if p1.button("⬅️ Previous", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if p2.button("Next ➡️", disabled=not has_next):
+        last = page.iloc[-1]
+        cursors.append((f"{last['date']:%Y-%m-%d}", int(last['id'])))
+        st.rerun()
+    p3.caption(f"Page {len(cursors)}")
+
+elif menu == "Performance":
+    st.title("⏱️ Performance")
+    st.markdown(f"Timings in this server process (pid {os.getpid()}) since it started.")
+
+    renders = perf.recent_renders()
+    if renders:
+        by_page = {}
+        for r in renders:
+            by_page.setdefault(r['page'], []).append(r)
+        st.markdown("#### Recent Renders")
+        st.dataframe([{"Page": p, "Renders": len(rs),
+                       "Mean (ms)": sum(r['seconds'] for r in rs) / len(rs) * 1000,
+                       "Slowest (ms)": max(r['seconds'] for r in rs) * 1000,
+                       "Queries per render": sum(r['queries'] for r in rs) / len(rs)}
+                      for p, rs in by_page.items()], use_container_width=True, hide_index=True)
+
+    st.markdown("#### Spans")
+    st.dataframe(perf.snapshot(), use_container_width=True, hide_index=True,
+                 column_config={c: st.column_config.NumberColumn(format="%.2f")
+                                for c in ("total_ms", "mean_ms", "p50_ms", "p95_ms", "p99_ms")})
+    st.download_button("📥 Prometheus metrics", perf.metrics_text(), "metrics.prom", "text/plain")
+
+    c1, c2 = st.columns(2)
+    c1.markdown("#### Cache")
+    c1.json(cache.stats(), expanded=False)
+    c2.markdown("#### Connection Pool")
+    c2.json(db.pool_stats(), expanded=False)
+
+    st.markdown("#### Profiler")
+    # Kept outside the widget's key so profiling continues on other pages
+    st.session_state['profile_renders'] = st.toggle("Profile my renders with cProfile",
+                                                    value=st.session_state.get('profile_renders', False))
+    if st.session_state.get('last_profile'):
+        st.code(st.session_state['last_profile'], language=None)
+
+render = perf.finish_render(menu)
+if render and render['profile']:
+    st.session_state['last_profile'] = render['profile']
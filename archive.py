@@ -0,0 +1,397 @@
+"""Archival of closed months to per-user, per-month Parquet files.
+
+Transactions older than the last HOT_MONTHS months are only read for
+all-time totals and trends, which come from the monthly_summary rollup,
+yet every history load and export scans them. `archive` moves each such
+month of each user to
+
+    <archive dir>/<owner token>/<YYYY-MM>.<lowest id>-<highest id>.parquet
+
+(columnar, sorted by date and id) and deletes the rows. One
+transaction deletes them, records the file in archive_parts, adds their
+totals to archived_summary, so the rollup keeps counting them and
+rebuilds still include them, and adds their dedupe keys to
+archived_keys. The file is written before that transaction commits; a
+crash in between leaves a file archive_parts does not list, which
+readers ignore and `compact` deletes.
+
+Opening a file costs more than reading a month of rows from it, so
+`compact` rewrites each user's archived months of a year as one
+<YYYY>.<ids>.parquet file with a row group per month. archive_parts keeps
+one row per month either way, naming the file that holds it.
+
+database.query_transactions() and iter_transactions() merge archived
+months back in. Only the files holding months inside the requested date
+range are opened, memory-mapped; row groups whose date statistics fall
+outside the range are skipped, and only the requested columns are read.
+Archived rows are read-only: a row written later with a date in an
+archived month stays in the table and the next run archives it as
+another file. `verify` checks the files against archive_parts,
+archived_summary and the table.
+
+Only the SQLite backend archives.
+
+    python archive.py archive --hot-months 12 --vacuum
+    python archive.py compact
+    python archive.py verify
+"""
+import argparse
+import functools
+import itertools
+import operator
+import os
+import re
+import time
+import unicodedata
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import database as db
+import perf
+
+ARCHIVE_DIR = os.environ.get("BUDGET_ARCHIVE_DIR")      # Default: <database file>.archive
+HOT_MONTHS = int(os.environ.get("BUDGET_ARCHIVE_HOT_MONTHS", "12"))
+ORPHAN_GRACE = 3600.0   # Seconds before compact deletes a file archive_parts does not list
+COMPRESSION = "snappy"  # Decodes about 1.5x faster than zstd for files about 25% larger
+
+SCHEMA = pa.schema([("id", pa.int64()), ("date", pa.string()), ("amount", pa.float64()),
+                    ("category", pa.string()), ("type", pa.string()), ("description", pa.string()),
+                    ("dedupe_key", pa.string())])
+COLUMNS = ", ".join(SCHEMA.names)
+
+def archive_dir():
+    return ARCHIVE_DIR or f"{db.DB_NAME}.archive"
+
+def _full_path(relative):
+    return os.path.join(archive_dir(), relative)
+
+def cutoff(hot_months=HOT_MONTHS, today=None):
+    """First day of the oldest month kept in the table: the current month and the hot_months - 1 before it."""
+    today = today or date.today()
+    index = today.year * 12 + today.month - 1 - (hot_months - 1)
+    return date(index // 12, index % 12 + 1, 1).isoformat()
+
+def _write_file(username, period, tables):
+    """Writes `tables` as the row groups of a new file, atomically; returns its path relative to the archive directory.
+
+    `period` (YYYY-MM or YYYY) starts the file name, followed by the range of ids it holds.
+    """
+    ids = pc.min_max(pa.chunked_array([t.column("id") for t in tables])).as_py()
+    directory = db.owner_token(username)
+    os.makedirs(_full_path(directory), exist_ok=True)
+    for n in itertools.count():
+        relative = os.path.join(directory, f"{period}.{ids['min']}-{ids['max']}{f'.{n}' if n else ''}.parquet")
+        path = _full_path(relative)
+        if not os.path.exists(path):
+            break
+    partial = f"{path}.part"
+    with pq.ParquetWriter(partial, SCHEMA, compression=COMPRESSION) as writer:
+        for table in tables:
+            writer.write_table(table, row_group_size=max(table.num_rows, 1))
+    with open(partial, "rb") as fh:
+        os.fsync(fh.fileno())
+    os.replace(partial, path)
+    return relative
+
+# --- Archiving ---
+
+def archive_month(username, month):
+    """Moves `username`'s rows dated in `month` (YYYY-MM) to a new part file; returns how many."""
+    start, end = db.month_range(month)
+    where, params = "username = ? AND date >= ? AND date < ?", (username, start, end)
+    with db.get_connection() as conn:
+        # Takes the write lock before reading, so no row is written between the read and the delete
+        conn.execute("BEGIN IMMEDIATE")
+        frame = pd.read_sql_query(f"SELECT {COLUMNS} FROM transactions WHERE {where} ORDER BY date, id",
+                                  conn, params=params)
+        if frame.empty:
+            return 0
+        relative = _write_file(username, month, [pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False)])
+        conn.execute("INSERT INTO archive_parts (username, month, path, rows, total, created) VALUES (?, ?, ?, ?, ?, ?)",
+                     (username, month, relative, len(frame), float(frame["amount"].fillna(0).sum()), time.time()))
+        conn.execute(f"INSERT INTO archived_keys (username, dedupe_key) SELECT username, dedupe_key FROM transactions "
+                     f"WHERE {where} AND dedupe_key IS NOT NULL ON CONFLICT DO NOTHING", params)
+        totals = f"""SELECT username, substr(date, 1, 7), COALESCE(type, ''), COALESCE(category, ''),
+                            SUM(COALESCE(amount, 0)), COUNT(*)
+                     FROM transactions WHERE {where} GROUP BY 1, 2, 3, 4"""
+        db.add_rollup_rows(conn, "archived_summary", totals, params)
+        # The delete triggers subtract the rows from monthly_summary; adding them first keeps the totals
+        db.add_rollup_rows(conn, "monthly_summary", totals, params)
+        conn.execute(f"DELETE FROM transactions WHERE {where}", params)
+    return len(frame)
+
+def closed_months(username, before):
+    """Months of `username`'s rows in the table dated before `before`."""
+    with db.get_connection() as conn:
+        rows = conn.execute("SELECT DISTINCT substr(date, 1, 7) FROM transactions "
+                            "WHERE username = ? AND date < ? ORDER BY 1", (username, before)).fetchall()
+    return [row[0] for row in rows]
+
+def usernames(username=None):
+    if username is not None:
+        return [username]
+    with db.get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT username FROM users ORDER BY username")]
+
+def archive(username=None, hot_months=HOT_MONTHS, today=None):
+    """Archives every closed month before cutoff(); returns (users, months, rows) archived."""
+    import aggregates
+    # Anomaly and recurring-charge detection read recent months from the table directly
+    if hot_months <= aggregates.RECURRING_WINDOW:
+        raise ValueError(f"Keep more than {aggregates.RECURRING_WINDOW} months in the table")
+    before = cutoff(hot_months, today)
+    users = months = rows = 0
+    for user in usernames(username):
+        moved = [archive_month(user, month) for month in closed_months(user, before)]
+        users += bool(moved)
+        months += len(moved)
+        rows += sum(moved)
+    return users, months, rows
+
+# --- Reading ---
+
+def _fold(text):
+    """Lowercase without diacritics, as the full-text index compares words."""
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c)).casefold()
+
+def _matches(frame, words):
+    """Rows whose description or category has every word, as database.search_words() defines them."""
+    text = (frame["description"].fillna("") + " " + frame["category"].fillna("")).map(_fold)
+    mask = pd.Series(True, index=frame.index)
+    for word in words:
+        pattern = r"(?<!\w)" + re.escape(_fold(word.rstrip("*"))) + ("" if word.endswith("*") else r"(?!\w)")
+        mask &= text.str.contains(pattern, regex=True)
+    return mask
+
+def _condition(start, end, after, order, type, min_amount, max_amount):
+    field = ds.field
+    conditions = []
+    if start is not None:
+        conditions.append(field("date") >= start)
+    if end is not None:
+        conditions.append(field("date") < end)
+    if type is not None:
+        conditions.append(field("type") == type)
+    if min_amount is not None:
+        conditions.append(field("amount") >= float(min_amount))
+    if max_amount is not None:
+        conditions.append(field("amount") <= float(max_amount))
+    if after is not None:
+        seek = operator.lt if order == "desc" else operator.gt
+        conditions.append(seek(field("date"), after[0]) | ((field("date") == after[0]) & seek(field("id"), after[1])))
+    return functools.reduce(operator.and_, conditions) if conditions else None
+
+def _read_file(path, columns, start, end):
+    """The row groups of one file whose dates can fall in [start, end), as a table of `columns`."""
+    parquet = pq.ParquetFile(_full_path(path), memory_map=True)
+    date_column = parquet.schema_arrow.get_field_index("date")
+    groups = []
+    for i in range(parquet.num_row_groups):
+        stats = parquet.metadata.row_group(i).column(date_column).statistics
+        if stats is not None and stats.has_min_max and \
+                ((end is not None and stats.min >= end) or (start is not None and stats.max < start)):
+            continue
+        groups.append(i)
+    return parquet.read_row_groups(groups, columns=columns, use_threads=False)
+
+@perf.timed("archive.read")
+def read(username, paths, columns, start=None, end=None, after=None, order="asc",
+         text=None, type=None, min_amount=None, max_amount=None):
+    """Archived rows from `paths` (relative, as in archive_parts) matching the filters, unsorted.
+
+    `start`/`end` are ISO dates and `after` an ISO (date, id) pair, as in
+    database._transactions_sql(). The frame is uncompacted, with `columns`.
+    """
+    words = db.search_words(text)
+    # Columns the filters below need are read too, and dropped at the end
+    needed = set(columns)
+    if after is not None:
+        needed |= {"date", "id"}
+    if type is not None:
+        needed.add("type")
+    if min_amount is not None or max_amount is not None:
+        needed.add("amount")
+    if words:
+        needed |= {"description", "category"}
+    read_columns = [c for c in SCHEMA.names if c in needed]
+    # The same yearly file can hold several of the months asked for
+    table = pa.concat_tables([_read_file(path, read_columns, start, end) for path in dict.fromkeys(paths)])
+    condition = _condition(start, end, after, order, type, min_amount, max_amount)
+    if condition is not None:
+        table = table.filter(condition)
+    frame = table.to_pandas()
+    if words:
+        frame = frame[_matches(frame, words)]
+    if "username" in columns:
+        frame["username"] = username
+    return frame[list(columns)]
+
+# --- Maintenance ---
+
+def _catalog(conn, username=None):
+    sql = "SELECT username, month, path, rows, total FROM archive_parts"
+    params = ()
+    if username is not None:
+        sql, params = sql + " WHERE username = ?", (username,)
+    return conn.execute(sql + " ORDER BY username, month, path", params).fetchall()
+
+def _files(username=None):
+    """Relative paths of every file under the archive directory (one user's, if given)."""
+    top = archive_dir() if username is None else _full_path(db.owner_token(username))
+    for directory, _, names in os.walk(top):
+        for name in names:
+            yield os.path.relpath(os.path.join(directory, name), archive_dir())
+
+def compact(username=None):
+    """Rewrites each user's archived year as one file, a row group per month, and deletes unlisted files.
+
+    Returns (years rewritten, files deleted).
+    """
+    with db.get_connection() as conn:
+        catalog = _catalog(conn, username)
+    years = {}
+    for user, month, path, _, _ in catalog:
+        years.setdefault((user, month[:4]), []).append(path)
+
+    rewritten = deleted = 0
+    for (user, year), listed in years.items():
+        paths = list(dict.fromkeys(listed))
+        if len(paths) < 2:
+            continue
+        table = pa.concat_tables([pq.ParquetFile(_full_path(p), memory_map=True).read() for p in paths])
+        table = table.sort_by([("date", "ascending"), ("id", "ascending")])
+        months = pc.utf8_slice_codeunits(table.column("date"), 0, 7)
+        groups = {month: table.filter(pc.equal(months, month)) for month in sorted(set(months.to_pylist()))}
+        relative = _write_file(user, year, list(groups.values()))
+        with db.get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            marks = ", ".join("?" * len(paths))
+            removed = conn.execute(f"DELETE FROM archive_parts WHERE username = ? AND path IN ({marks})",
+                                   (user, *paths)).rowcount
+            if removed == len(listed):
+                conn.executemany("INSERT INTO archive_parts (username, month, path, rows, total, created) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(user, month, relative, group.num_rows, pc.sum(group.column("amount")).as_py() or 0.0,
+                                   time.time()) for month, group in groups.items()])
+            else:
+                conn.rollback()
+        if removed != len(listed):
+            continue    # The catalog changed underneath; the new file is unlisted and goes with the orphans
+        for path in paths:
+            os.remove(_full_path(path))
+        rewritten += 1
+        deleted += len(paths)
+
+    # Files no catalog row lists were left by interrupted runs
+    with db.get_connection() as conn:
+        listed = {row[2] for row in _catalog(conn, username)}
+    now = time.time()
+    for relative in list(_files(username)):
+        path = _full_path(relative)
+        if relative not in listed and now - os.path.getmtime(path) > ORPHAN_GRACE:
+            os.remove(path)
+            deleted += 1
+    return rewritten, deleted
+
+def verify(username=None, tolerance=0.005):
+    """Problems found in the archive, as messages; empty when it is consistent."""
+    problems = []
+    frames = []
+    with db.get_connection() as conn:
+        catalog = _catalog(conn, username)
+        files = {}
+        for user, month, path, rows, total in catalog:
+            files.setdefault(path, (user, {}))[1][month] = (rows, total)
+        for path, (user, listed) in files.items():
+            if not os.path.exists(_full_path(path)):
+                problems.append(f"{path}: listed in archive_parts but missing")
+                continue
+            frame = pq.ParquetFile(_full_path(path), memory_map=True).read(
+                columns=["id", "date", "amount", "category", "type"]).to_pandas()
+            frame["month"] = frame["date"].str[:7]
+            held = frame.groupby("month")["amount"].agg(["size", "sum"])
+            for month in sorted(set(held.index) | set(listed)):
+                rows, total = held.loc[month] if month in held.index else (0, 0.0)
+                expected_rows, expected_total = listed.get(month, (0, 0.0))
+                if rows != expected_rows or abs(total - expected_total) > tolerance:
+                    problems.append(f"{path}: {rows} rows totalling {total:.2f} in {month}, "
+                                    f"archive_parts says {expected_rows} totalling {expected_total:.2f}")
+            # An id in both places would be counted twice
+            if len(frame):
+                hot = conn.execute("SELECT id FROM transactions WHERE id BETWEEN ? AND ?",
+                                   (int(frame["id"].min()), int(frame["id"].max()))).fetchall()
+                both = set(frame["id"]) & {row[0] for row in hot}
+                if both:
+                    problems.append(f"{path}: {len(both)} rows also in transactions")
+            frame["username"] = user
+            frames.append(frame)
+        where, params = ("WHERE username = ?", (username,)) if username is not None else ("", ())
+        actual = pd.read_sql_query(f"SELECT * FROM archived_summary {where}", conn, params=params)
+
+    # archived_summary must hold exactly the files' totals
+    keys = ["username", "month", "type", "category"]
+    if frames:
+        rows = pd.concat(frames, ignore_index=True)
+        rows = rows.assign(type=rows["type"].fillna(""), category=rows["category"].fillna(""),
+                           total=rows["amount"].fillna(0))
+        expected = rows.groupby(keys, as_index=False).agg(total=("total", "sum"), count=("id", "size"))
+    else:
+        expected = pd.DataFrame(columns=keys + ["total", "count"])
+    compared = expected.merge(actual, on=keys, how="outer", suffixes=("_files", "_summary")).fillna(0)
+    for row in compared.itertuples(index=False):
+        if abs(row.total_files - row.total_summary) > tolerance or row.count_files != row.count_summary:
+            problems.append(f"archived_summary {row.username} {row.month} {row.type}/{row.category}: "
+                            f"{row.total_summary:.2f} ({row.count_summary:.0f} rows), "
+                            f"files hold {row.total_files:.2f} ({row.count_files:.0f} rows)")
+
+    for relative in _files(username):
+        if relative not in files:
+            problems.append(f"{relative}: not listed in archive_parts (compact deletes it)")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    parser.add_argument("--dir", help="archive directory (default: <db>.archive)")
+    parser.add_argument("--user", help="limit to one username")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("archive", help="move closed months to Parquet files")
+    run.add_argument("--hot-months", type=int, default=HOT_MONTHS,
+                     help="months kept in the table, counting the current one (default: %(default)s)")
+    run.add_argument("--vacuum", action="store_true", help="give the freed pages back to the file system")
+    commands.add_parser("compact", help="rewrite each archived year as one file; delete unlisted files")
+    commands.add_parser("verify", help="check files against the catalog, rollup and table")
+    args = parser.parse_args()
+
+    global ARCHIVE_DIR
+    if db.DATABASE_URL:
+        parser.error("archiving needs the SQLite backend")
+    db.DB_NAME = args.db
+    ARCHIVE_DIR = args.dir or ARCHIVE_DIR
+    db.init_db()
+    t0 = time.perf_counter()
+    if args.command == "archive":
+        users, months, rows = archive(args.user, args.hot_months)
+        print(f"Archived {rows:,} rows in {months:,} months of {users:,} users before {cutoff(args.hot_months)} "
+              f"in {time.perf_counter() - t0:.1f}s")
+        if args.vacuum:
+            with db.get_connection() as conn:
+                conn.execute("VACUUM")
+            print(f"{args.db}: {os.path.getsize(args.db) / 2**20:,.1f} MB after VACUUM")
+    elif args.command == "compact":
+        rewritten, deleted = compact(args.user)
+        print(f"Rewrote {rewritten:,} years; deleted {deleted:,} files")
+    elif args.command == "verify":
+        problems = verify(args.user)
+        for problem in problems:
+            print(problem)
+        print("archive is consistent" if not problems else f"{len(problems):,} problems")
+        raise SystemExit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
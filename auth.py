@@ -1,59 +1,216 @@
 import streamlit as st
-import sqlite3
-import bcrypt
+import hashlib
+import os
+import secrets
+import threading
+import time
 import database as db
+import hashing
 
-def register_user(username, password, name):
-    conn = db.get_connection()
-    c = conn.cursor()
-    hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+SESSION_TTL = 7 * 24 * 3600     # Seconds a login stays valid
+LOGIN_ATTEMPTS = (5, 60)        # Per username: burst size, seconds to refill it
+IP_ATTEMPTS = (20, 60)          # Per client address
+# Proxies in front of the app that append to X-Forwarded-For (launcher.py
+# sets 1 for its load balancer). Behind them every connection comes from a
+# proxy, so the client address is read from the header instead.
+TRUSTED_PROXIES = int(os.environ.get("BUDGET_TRUSTED_PROXIES", "0"))
+# Comma-separated usernames that see the Performance page
+ADMINS = {u.strip() for u in os.environ.get("BUDGET_ADMINS", "").split(",") if u.strip()}
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many attempts, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """Token bucket per key: `capacity` attempts, refilled evenly over `period` seconds."""
+
+    def __init__(self, capacity, period, max_keys=100_000):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.max_keys = max_keys
+        self._buckets = {}      # key -> (tokens, last update)
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Takes one token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+            return 0.0
+
+    def _prune(self, now):
+        # Buckets that have refilled completely carry no state worth keeping
+        full = self.capacity / self.rate
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < full}
+
+_user_limiter = RateLimiter(*LOGIN_ATTEMPTS)
+_ip_limiter = RateLimiter(*IP_ATTEMPTS)
+
+def client_address(peer, forwarded_for, proxies=TRUSTED_PROXIES):
+    """Address the per-client limit is keyed on; None skips that limit.
+
+    With `proxies` trusted hops, it is the entry they appended to
+    X-Forwarded-For, `proxies` from the right; earlier entries are the
+    client's own claims. None if the header has fewer entries.
+    """
+    if not proxies:
+        return peer
+    hops = [hop.strip() for hop in (forwarded_for or "").split(",") if hop.strip()]
+    return hops[-proxies] if len(hops) >= proxies else None
+
+def _check_rate(username, ip):
+    # Cheap rejection before any database read or hashing happens
+    waits = [_user_limiter.hit(username.lower())]
+    if ip:
+        waits.append(_ip_limiter.hit(ip))
+    if max(waits) > 0:
+        raise RateLimited(max(waits))
+
+def register_user(username, password, name, ip=None):
+    wait = _ip_limiter.hit(ip) if ip else 0
+    if wait:
+        raise RateLimited(wait)
+    hashed_pw = hashing.hash_password(password)
     try:
-        c.execute("INSERT INTO users (username, password, name) VALUES (?, ?, ?)", (username, hashed_pw, name))
-        conn.commit()
-        db.seed_data(username) # Seed data for new users
-        return True
-    except sqlite3.IntegrityError:
+        db.create_user(username, hashed_pw, name)
+    except db.DuplicateError:
         return False
-    finally:
-        conn.close()
-
-def login_user(username, password):
-    conn = db.get_connection()
-    c = conn.cursor()
-    c.execute("SELECT password, name FROM users WHERE username=?", (username,))
-    data = c.fetchone()
-    conn.close()
-    
+    db.seed_data(username) # Seed data for new users
+    return True
+
+def login_user(username, password, ip=None):
+    _check_rate(username, ip)
+    with db.get_connection() as conn:
+        data = conn.execute("SELECT password, name FROM users WHERE username=?", (username,)).fetchone()
+
     if data:
         stored_hash = data[0]
-        if bcrypt.checkpw(password.encode('utf-8'), stored_hash):
+        if hashing.check_password(password, stored_hash):
             return data[1] # Return name
     return None
 
+# --- Sessions ---
+# Only a SHA-256 of each token is stored. Validated sessions are also kept
+# in process so a rerun costs a dict lookup, not a query.
+
+MAX_SESSIONS = 100_000     # Sessions kept in process; older ones are read from the table again
+SESSION_SWEEP = 60.0       # Seconds between sweeps of expired sessions
+
+_sessions = {}      # token hash -> (username, name, expires_at), oldest first
+_sessions_lock = threading.Lock()
+_swept = 0.0
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def _remember(key, session):
+    global _swept
+    now = time.time()
+    with _sessions_lock:
+        _sessions[key] = session
+        # An expired token may never be presented again, so it is dropped here
+        if now - _swept > SESSION_SWEEP or len(_sessions) > MAX_SESSIONS:
+            for stale in [k for k, (_, _, expires_at) in _sessions.items() if expires_at < now]:
+                del _sessions[stale]
+            _swept = now
+        while len(_sessions) > MAX_SESSIONS:
+            del _sessions[next(iter(_sessions))]
+
+def create_session(username, name):
+    token = secrets.token_urlsafe(32)
+    expires_at = time.time() + SESSION_TTL
+    db.add_session(_token_hash(token), username, expires_at)
+    _remember(_token_hash(token), (username, name, expires_at))
+    return token
+
+def validate_session(token):
+    """Returns (username, name) for a live session token, else None."""
+    if not token:
+        return None
+    key = _token_hash(token)
+    with _sessions_lock:
+        session = _sessions.get(key)
+    if session is None:
+        # Issued by another worker process, or before a restart
+        with db.get_connection() as conn:
+            session = conn.execute("""SELECT s.username, u.name, s.expires_at FROM sessions s
+                                      JOIN users u ON u.username = s.username
+                                      WHERE s.token_hash = ?""", (key,)).fetchone()
+        if session is None:
+            return None
+        _remember(key, tuple(session))
+    username, name, expires_at = session
+    if expires_at < time.time():
+        revoke_session(token)
+        return None
+    return username, name
+
+def revoke_session(token):
+    if not token:
+        return
+    key = _token_hash(token)
+    with _sessions_lock:
+        _sessions.pop(key, None)
+    db.delete_session(key)
+
+def current_user():
+    """(username, name) of this browser session, or None if it is not logged in."""
+    user = validate_session(st.session_state.get('token'))
+    st.session_state['logged_in'] = user is not None
+    if user:
+        st.session_state['username'], st.session_state['name'] = user
+    return user
+
+def is_admin(username):
+    return username in ADMINS
+
+def logout():
+    revoke_session(st.session_state.pop('token', None))
+    st.session_state['logged_in'] = False
+
 def login_page():
     st.title("🔐 Budget Optimizer Login")
-    
+
     tab1, tab2 = st.tabs(["Login", "Register"])
-    
+    ip = client_address(st.context.ip_address, st.context.headers.get("X-Forwarded-For"))
+
     with tab1:
         username = st.text_input("Username (Email)")
         password = st.text_input("Password", type="password")
         if st.button("Login"):
-            name = login_user(username, password)
-            if name:
-                st.session_state['logged_in'] = True
-                st.session_state['username'] = username
-                st.session_state['name'] = name
-                st.rerun()
+            try:
+                name = login_user(username, password, ip)
+            except RateLimited as e:
+                st.error(f"Too many login attempts. Try again in {e.retry_after:.0f} seconds.")
             else:
-                st.error("Invalid Username or Password")
+                if name:
+                    st.session_state['token'] = create_session(username, name)
+                    st.session_state['logged_in'] = True
+                    st.session_state['username'] = username
+                    st.session_state['name'] = name
+                    st.rerun()
+                else:
+                    st.error("Invalid Username or Password")
 
     with tab2:
         new_user = st.text_input("New Username (Email)")
         new_name = st.text_input("Full Name")
         new_pass = st.text_input("New Password", type="password")
         if st.button("Register"):
-            if register_user(new_user, new_pass, new_name):
-                st.success("Account created! Please login.")
+            try:
+                created = register_user(new_user, new_pass, new_name, ip)
+            except RateLimited as e:
+                st.error(f"Too many attempts. Try again in {e.retry_after:.0f} seconds.")
             else:
-                st.error("Username already exists.")
\ No newline at end of file
+                if created:
+                    st.success("Account created! Please login.")
+                else:
+                    st.error("Username already exists.")
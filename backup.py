@@ -0,0 +1,269 @@
+"""Online backups of the SQLite database: snapshots, retention and restore.
+
+Copying budget.db while the app writes can produce a torn copy, and the
+WAL file holds the latest commits anyway. `snapshot` uses SQLite's
+online backup API instead, on a pooled connection.
+- It copies STEP_PAGES pages per step and pauses between steps, so a
+  large copy does not take the disk from the app in one burst.
+- In WAL mode the copy only holds read snapshots, so writers never wait
+  for it.
+- A write from another connection restarts a stepped backup from the
+  first page. After MAX_RESTARTS restarts, the rest is copied in one
+  step from a single read snapshot, so steady writes cannot starve it.
+
+The copy is switched to a rollback journal, so a snapshot is one
+self-contained file. It is checked with PRAGMA integrity_check before
+being renamed into place, as
+
+    <backup dir>/<database name>-<YYYYmmdd-HHMMSS>.db
+
+and only the newest KEEP snapshots are kept. With BUDGET_BACKUP_INTERVAL
+set, `start` takes a snapshot on a daemon thread whenever the newest one
+is older than that, in the app or, with a writer service, in the writer.
+
+`restore` copies a verified snapshot back into the live database through
+the same API, so open connections in other processes see either the old
+or the restored data, never a mix. It snapshots the current state
+first. It then raises every data version above any seen before, so no
+worker serves a summary cached from before the restore. Snapshots taken
+before archiving may list archive files that compact has since removed;
+run `python archive.py verify` after restoring one.
+
+Only the SQLite backend is backed up here; use pg_dump for PostgreSQL.
+
+    python backup.py snapshot
+    python backup.py list
+    python backup.py verify budget.db.backups/budget-20260101-030000.db
+    python backup.py restore budget.db.backups/budget-20260101-030000.db
+    python backup.py run --interval 86400
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import database as db
+import perf
+
+BACKUP_DIR = os.environ.get("BUDGET_BACKUP_DIR")    # Default: <database file>.backups
+INTERVAL = float(os.environ.get("BUDGET_BACKUP_INTERVAL", "0"))    # Seconds; 0 leaves scheduling to cron
+KEEP = int(os.environ.get("BUDGET_BACKUP_KEEP", "7"))
+STEP_PAGES = 1024       # Pages per backup step (4 MB at the default page size)
+STEP_PAUSE = 0.001      # Seconds between steps
+MAX_RESTARTS = 3        # Restarts caused by other writers before copying the rest in one step
+
+Snapshot = namedtuple("Snapshot", "path created bytes")
+BackupResult = namedtuple("BackupResult", "path bytes seconds steps restarts")
+
+def backup_dir():
+    return BACKUP_DIR or db.DB_NAME + ".backups"
+
+def _stem():
+    return os.path.splitext(os.path.basename(db.DB_NAME))[0]
+
+# --- Copying ---
+
+class _Restarted(Exception):
+    pass
+
+def _copy(source, target, pages=STEP_PAGES, pause=STEP_PAUSE):
+    """Online backup of `source` into `target`; returns (steps, restarts)."""
+    steps, restarts, last = 0, 0, None
+
+    def progress(status, remaining, total):
+        nonlocal steps, restarts, last
+        steps += 1
+        # Remaining pages only go up when a write restarted the copy
+        if last is not None and remaining > last:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted
+        last = remaining
+        if remaining and pause:
+            time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    except _Restarted:
+        source.backup(target)
+        steps += 1
+    return steps, restarts
+
+def verify(path):
+    """Problems found in a snapshot file (empty when it can be restored)."""
+    try:
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    except sqlite3.Error as exc:
+        return [f"{path}: {exc}"]
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check(10)") if row[0] != "ok"]
+        version = db.schema_version(conn)
+    except sqlite3.Error as exc:
+        return [f"{path}: {exc}"]
+    finally:
+        conn.close()
+    if version > len(db.MIGRATIONS):
+        problems.append(f"{path}: schema version {version} is newer than this code ({len(db.MIGRATIONS)})")
+    return problems
+
+def snapshot(directory=None, keep=KEEP, pages=STEP_PAGES, pause=STEP_PAUSE):
+    """Backs the database up into a new verified snapshot file; returns a BackupResult.
+
+    Afterwards only the newest `keep` snapshots are kept (all of them if None).
+    """
+    if db.DATABASE_URL:
+        raise RuntimeError("backup.py backs up SQLite; use pg_dump for PostgreSQL")
+    directory = directory or backup_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f"{_stem()}-{datetime.now():%Y%m%d-%H%M%S}"
+    path = os.path.join(directory, name + ".db")
+    for n in range(1, 1000):
+        if not os.path.exists(path):
+            break
+        path = os.path.join(directory, f"{name}.{n}.db")
+    part = path + ".part"
+
+    t0 = time.perf_counter()
+    with perf.span("backup.snapshot"):
+        target = sqlite3.connect(part)
+        try:
+            with db.get_connection() as source:
+                steps, restarts = _copy(source, target, pages, pause)
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+        problems = verify(part)
+        if problems:
+            os.remove(part)
+            raise RuntimeError("Snapshot failed its integrity check: " + "; ".join(problems))
+        with open(part, "rb") as fh:
+            os.fsync(fh.fileno())
+        os.replace(part, path)
+    if keep is not None:
+        prune(directory, keep)
+    return BackupResult(path, os.path.getsize(path), time.perf_counter() - t0, steps, restarts)
+
+def snapshots(directory=None):
+    """The database's snapshots, newest first."""
+    found = []
+    for path in glob.glob(os.path.join(directory or backup_dir(), f"{glob.escape(_stem())}-*.db")):
+        stat = os.stat(path)
+        found.append(Snapshot(path, stat.st_mtime, stat.st_size))
+    return sorted(found, key=lambda s: s.created, reverse=True)
+
+def prune(directory=None, keep=KEEP):
+    """Deletes all but the newest `keep` snapshots; returns the paths deleted."""
+    stale = [s.path for s in snapshots(directory)[max(keep, 1):]]
+    for path in stale:
+        os.remove(path)
+    return stale
+
+# --- Restore ---
+
+def restore(path, directory=None, keep=KEEP):
+    """Replaces the database's contents with a snapshot's; returns the snapshot taken just before."""
+    problems = verify(path)
+    if problems:
+        raise ValueError("Not restoring: " + "; ".join(problems))
+    # Pruned after restoring, so the extra snapshot cannot delete the one being restored
+    before = snapshot(directory, keep=None)
+    source = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        with db.get_connection() as conn:
+            seen = conn.execute("SELECT IFNULL(MAX(version), 0) FROM data_versions").fetchone()[0]
+            conn.commit()
+            # One step, under the write lock: other connections see the old or the new database
+            source.backup(conn)
+            conn.execute("PRAGMA journal_mode=WAL")
+            db.migrate(conn)
+            conn.execute("UPDATE data_versions SET version = version + ?", (seen + 1,))
+    finally:
+        source.close()
+    prune(directory, keep)
+    return before
+
+# --- Scheduling ---
+
+def run(interval, stop=None, log=None, directory=None, keep=KEEP):
+    """Takes a snapshot whenever the newest is `interval` seconds old, until `stop` is set."""
+    stop = stop or threading.Event()
+    while True:
+        newest = snapshots(directory)
+        wait = newest[0].created + interval - time.time() if newest else 0
+        if wait <= 0:
+            try:
+                result = snapshot(directory, keep)
+                if log:
+                    log(f"{result.path}: {result.bytes / 2**20:,.1f} MB in {result.seconds:.1f}s")
+                wait = interval
+            except Exception as exc:
+                print(f"Backup failed: {exc!r}", file=sys.stderr)
+                wait = min(interval, 300)
+        if stop.wait(wait):
+            return
+
+_started = None
+_lock = threading.Lock()
+
+def start(interval=INTERVAL):
+    """Starts scheduled snapshots on a daemon thread, once per process; returns the Event that stops it."""
+    global _started
+    with _lock:
+        if _started is None and interval > 0 and not db.DATABASE_URL:
+            _started = threading.Event()
+            threading.Thread(target=run, args=(interval, _started), name="backup", daemon=True).start()
+        return _started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    parser.add_argument("--dir", help="snapshot directory (default: <db>.backups)")
+    parser.add_argument("--keep", type=int, default=KEEP, help="snapshots kept (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("snapshot", help="take a snapshot now")
+    commands.add_parser("list", help="list snapshots, newest first")
+    for name, text in [("verify", "integrity-check a snapshot"), ("restore", "restore a snapshot into --db")]:
+        commands.add_parser(name, help=text).add_argument("path")
+    loop = commands.add_parser("run", help="take a snapshot whenever the newest is --interval seconds old")
+    loop.add_argument("--interval", type=float, default=INTERVAL or 86400, help="seconds (default: %(default)s)")
+    args = parser.parse_args()
+
+    global BACKUP_DIR
+    if db.DATABASE_URL:
+        parser.error("backup.py backs up SQLite; use pg_dump for PostgreSQL")
+    db.DB_NAME = args.db
+    BACKUP_DIR = args.dir or BACKUP_DIR
+    if args.command == "snapshot":
+        db.init_db()
+        result = snapshot(keep=args.keep)
+        print(f"{result.path}: {result.bytes / 2**20:,.1f} MB in {result.seconds:.1f}s "
+              f"({result.steps:,} steps, {result.restarts} restarts)")
+    elif args.command == "list":
+        for s in snapshots():
+            print(f"{datetime.fromtimestamp(s.created):%Y-%m-%d %H:%M:%S}  {s.bytes / 2**20:>10,.1f} MB  {s.path}")
+    elif args.command == "verify":
+        problems = verify(args.path)
+        for problem in problems:
+            print(problem)
+        print("snapshot is consistent" if not problems else f"{len(problems):,} problems")
+        raise SystemExit(1 if problems else 0)
+    elif args.command == "restore":
+        try:
+            before = restore(args.path, keep=args.keep)
+        except ValueError as exc:
+            raise SystemExit(str(exc))
+        print(f"Restored {args.path} into {args.db}; the previous contents are in {before.path}")
+    elif args.command == "run":
+        db.init_db()
+        try:
+            run(args.interval, log=lambda message: print(message, file=sys.stderr), keep=args.keep)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Batch job writing every user's monthly statement as PDF and CSV.
+
+Users are read from the users table in username order, a page at a time,
+and handed to a process pool in batches. Workers stream each user's
+transactions for the month from a database cursor and write
+<out>/<month>/<user>-<digest>.<kind> atomically, so an interrupted run
+never leaves a truncated statement behind. The digest of the username
+keeps names that sanitize alike ("a b@x", "a_b@x") apart.
+
+A checkpoint file in the month's directory records the last username
+before which every batch has finished. Rerunning the same command resumes
+after it. Statements that already exist are not rebuilt, so batches that
+finished past the checkpoint cost only a stat; --restart ignores the
+checkpoint and fills in whatever is missing, e.g. after failures.
+
+Progress lines report users/sec and the peak memory of the job and of its
+busiest worker, for sizing the nightly run.
+
+    python batch_reports.py --month 2026-09 --out statements --workers 8
+"""
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+
+import aggregates
+import database as db
+import optimizer
+
+KINDS = ("pdf", "csv")
+BATCH_USERS = 50        # Users per pool task
+USER_PAGE = 1_000       # Users read from the database per query
+CHUNK_ROWS = 5_000
+CHECKPOINT = "checkpoint.json"
+LOG_EVERY = 10.0        # Seconds between progress lines
+
+_UNSAFE = re.compile(r"[^\w@.+-]")
+
+def previous_month(today=None):
+    today = today or date.today()
+    return f"{today.year - (today.month == 1)}-{(today.month - 2) % 12 + 1:02d}"
+
+def statement_path(directory, username, kind):
+    digest = hashlib.sha1(username.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(directory, f"{_UNSAFE.sub('_', username)}-{digest}.{kind}")
+
+def peak_rss():
+    """Peak resident set size of this process, in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def iter_users(after=None, page=USER_PAGE):
+    """(username, name) in username order, after `after`, one keyset page per query."""
+    while True:
+        with db.get_connection() as conn:
+            rows = conn.execute("SELECT username, name FROM users WHERE username > ? ORDER BY username LIMIT ?",
+                                (after or "", page)).fetchall()
+        yield from rows
+        if len(rows) < page:
+            return
+        after = rows[-1][0]
+
+# --- Writers (run inside worker processes) ---
+
+def write_csv(username, name, month, path):
+    start, end = db.month_range(month)
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        for i, chunk in enumerate(db.iter_transactions(username, start, end, chunksize=CHUNK_ROWS)):
+            chunk.to_csv(fh, header=(i == 0), index=False)
+
+def write_pdf(username, name, month, path):
+    start, end = db.month_range(month)
+    income, expense, total_rows = aggregates.lifetime_totals(username, month)
+    chunks = db.iter_transactions(username, start, end, columns=["date", "category", "type", "amount"],
+                                  order="desc", limit=optimizer.PDF_MAX_ROWS, chunksize=CHUNK_ROWS)
+    optimizer.generate_pdf_report(chunks, f"{name or username}, {month}", income, expense,
+                                  total_rows=total_rows, path=path)
+
+WRITERS = {"csv": write_csv, "pdf": write_pdf}
+
+def _init_worker(db_name):
+    db.DB_NAME = db_name
+
+def build_batch(users, month, directory, kinds):
+    """Writes the batch's missing statements; returns (built, skipped, failures, peak RSS)."""
+    built = skipped = 0
+    failures = []
+    for username, name in users:
+        for kind in kinds:
+            path = statement_path(directory, username, kind)
+            if os.path.exists(path):
+                skipped += 1
+                continue
+            partial = f"{path}.{os.getpid()}.part"
+            try:
+                WRITERS[kind](username, name, month, partial)
+                os.replace(partial, path)
+                built += 1
+            except Exception as exc:
+                failures.append((username, kind, f"{type(exc).__name__}: {exc}"))
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+    return built, skipped, failures, peak_rss()
+
+# --- Job (parent process) ---
+
+def load_checkpoint(directory):
+    try:
+        with open(os.path.join(directory, CHECKPOINT), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+def save_checkpoint(directory, state):
+    path = os.path.join(directory, CHECKPOINT)
+    with open(f"{path}.part", "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(f"{path}.part", path)
+
+def run(month, out, kinds=KINDS, workers=None, batch_users=BATCH_USERS, restart=False, log=None):
+    """Writes statements for every user; returns the job's stats dict."""
+    directory = os.path.join(out, month)
+    os.makedirs(directory, exist_ok=True)
+    state = {} if restart else load_checkpoint(directory)
+    stats = {"users": 0, "built": 0, "skipped": 0, "failed": 0, "resumed_after": state.get("after"),
+             "seconds": 0.0, "peak_rss": 0, "peak_worker_rss": 0}
+    state = {"month": month, "after": state.get("after"), "users": state.get("users", 0)}
+    users = iter_users(state["after"])
+    workers = workers or os.cpu_count() or 1
+
+    # Batches finish out of order; the checkpoint only moves past a batch
+    # once every batch before it has finished too
+    pending = {}        # future -> (batch number, last username, user count)
+    finished = {}       # batch number -> (last username, user count)
+    submitted = checkpointed = 0
+    start = last_log = time.perf_counter()
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker, initargs=(db.DB_NAME,)) as pool:
+        while True:
+            # At most two batches per worker in flight bounds the parent's memory
+            while len(pending) < 2 * workers:
+                batch = list(itertools.islice(users, batch_users))
+                if not batch:
+                    break
+                future = pool.submit(build_batch, batch, month, directory, kinds)
+                pending[future] = (submitted, batch[-1][0], len(batch))
+                submitted += 1
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number, last, count = pending.pop(future)
+                built, skipped, failures, rss = future.result()
+                stats["users"] += count
+                stats["built"] += built
+                stats["skipped"] += skipped
+                stats["failed"] += len(failures)
+                stats["peak_worker_rss"] = max(stats["peak_worker_rss"], rss)
+                for username, kind, message in failures:
+                    print(f"{username} {kind}: {message}", file=sys.stderr)
+                finished[number] = (last, count)
+            if checkpointed in finished:
+                while checkpointed in finished:
+                    state["after"], count = finished.pop(checkpointed)
+                    state["users"] += count
+                    checkpointed += 1
+                save_checkpoint(directory, state)
+
+            now = time.perf_counter()
+            if log and now - last_log >= LOG_EVERY:
+                last_log = now
+                stats["seconds"] = now - start
+                stats["peak_rss"] = peak_rss()
+                log(stats)
+    stats["seconds"] = time.perf_counter() - start
+    stats["peak_rss"] = peak_rss()
+    return stats
+
+def _format(stats):
+    rate = stats["users"] / stats["seconds"] if stats["seconds"] else 0.0
+    return (f"{stats['users']:,} users in {stats['seconds']:.1f}s ({rate:,.1f} users/s), "
+            f"{stats['built']:,} built, {stats['skipped']:,} skipped, {stats['failed']:,} failed; "
+            f"peak RSS {stats['peak_rss'] / 2**20:,.0f} MB job, {stats['peak_worker_rss'] / 2**20:,.0f} MB worker")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write monthly statements for every Budget Optimizer user")
+    parser.add_argument("--month", default=previous_month(), help="YYYY-MM (default: last month, %(default)s)")
+    parser.add_argument("--out", default="statements", help="output directory (default: %(default)s)")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-users", type=int, default=BATCH_USERS)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and fill in missing files")
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    args = parser.parse_args()
+
+    db.DB_NAME = args.db
+    db.init_db()
+    stats = run(args.month, args.out, args.kinds, args.workers, args.batch_users, args.restart,
+                log=lambda s: print(_format(s), file=sys.stderr))
+    if stats["resumed_after"]:
+        print(f"Resumed after {stats['resumed_after']}", file=sys.stderr)
+    print(_format(stats))
+    sys.exit(1 if stats["failed"] else 0)
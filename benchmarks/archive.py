@@ -0,0 +1,93 @@
+"""History reads against one table versus archived Parquet months.
+
+Generates users with --years of history and times the reads that span
+it: the full history (get_user_data), a full export stream, one year
+from the middle, and the newest page. It then archives every month
+before the last --hot-months and vacuums, and times the same reads
+again, now merging the table with one file per month; then once more
+after compaction, with one file per year. The database file and archive
+sizes are reported for each layout.
+
+    python -m benchmarks.archive --years 10 --per-user 40000 --out archive.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+import archive
+import database as db
+from benchmarks import synthetic
+from benchmarks.suite import measure
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+def cases(user, end):
+    year = str(end.year - 5)
+    return {
+        "get_user_data": lambda: db.get_user_data(user),
+        "export_stream": lambda: sum(len(c) for c in db.iter_transactions(user, chunksize=5_000)),
+        "one_year": lambda: db.query_transactions(user, start=f"{year}-01-01", end=f"{int(year) + 1}-01-01"),
+        "newest_page": lambda: db.query_transactions(user, limit=51),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--per-user", type=int, default=40_000)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--hot-months", type=int, default=archive.HOT_MONTHS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    end = date(2026, 6, 30)
+    t0 = time.perf_counter()
+    users = synthetic.generate(args.users, args.per_user, args.years, bcrypt_rounds=4, end=end)
+    print(f"Generated {args.users * args.per_user:,} transactions in {time.perf_counter() - t0:.1f}s",
+          file=sys.stderr)
+    with db.get_connection() as conn:
+        conn.execute("VACUUM")
+
+    results = {"params": {k: getattr(args, k) for k in ("users", "per_user", "years", "hot_months", "repeat")}}
+    table = {name: measure(fn, args.repeat) for name, fn in cases(users[0], end).items()}
+    results["table"] = {"cases": table, "db_bytes": _size(db.DB_NAME)}
+
+    t0 = time.perf_counter()
+    _, months, rows = archive.archive(hot_months=args.hot_months, today=end)
+    seconds = time.perf_counter() - t0
+    with db.get_connection() as conn:
+        conn.execute("VACUUM")
+    print(f"Archived {rows:,} rows in {months:,} month files in {seconds:.1f}s", file=sys.stderr)
+    monthly = {name: measure(fn, args.repeat) for name, fn in cases(users[0], end).items()}
+    results["monthly"] = {"cases": monthly, "db_bytes": _size(db.DB_NAME),
+                          "archive_bytes": _size(archive.archive_dir()), "archive_seconds": seconds}
+
+    t0 = time.perf_counter()
+    archive.compact()
+    seconds = time.perf_counter() - t0
+    yearly = {name: measure(fn, args.repeat) for name, fn in cases(users[0], end).items()}
+    results["yearly"] = {"cases": yearly, "db_bytes": _size(db.DB_NAME),
+                         "archive_bytes": _size(archive.archive_dir()), "compact_seconds": seconds}
+
+    layouts = ("table", "monthly", "yearly")
+    print(f"\n{'median ms':<24}" + "".join(f"{layout:>10}" for layout in layouts))
+    for name in table:
+        print(f"{name:<24}" + "".join(f"{results[layout]['cases'][name]['median_ms']:>10.1f}" for layout in layouts))
+    print(f"{'database MB':<24}" + "".join(f"{results[layout]['db_bytes'] / 2**20:>10.1f}" for layout in layouts))
+    print(f"{'archive MB':<24}" + "".join(f"{results[layout].get('archive_bytes', 0) / 2**20:>10.1f}"
+                                         for layout in layouts))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Backup throughput, and how long writers stall while a backup runs.
+
+Generates a database, then starts a writer process adding a transaction
+every --write-interval seconds and timing each add_transaction call.
+While it runs, the database is copied three ways:
+- steps: backup.snapshot(), STEP_PAGES pages per step;
+- one_step: backup.snapshot(pages=-1), the whole copy from one read
+  snapshot;
+- file_copy: copying the database file, as a plain cp would. The copy
+  misses whatever the WAL file still holds, so the number of rows it
+  lacks is reported.
+
+For each, the copy's MB/s and the writer's median and maximum latency
+during the copy are reported, next to the same latencies with no backup
+running.
+
+    python -m benchmarks.backup --users 20 --per-user 20000 --out backup.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import backup
+import database as db
+from benchmarks import synthetic
+
+def _write_load(path, interval, stop, results):
+    """Writer process: add_transaction until `stop` is set, sending (wall time, seconds) per write."""
+    db.DB_NAME = path
+    timings = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        db.add_transaction(synthetic.username(0), "2026-01-01", 1.0, "Other", "Expense", "load")
+        timings.append((time.time(), time.perf_counter() - t0))
+        time.sleep(interval)
+    results.send(timings)
+
+def _latency(timings, start, end):
+    window = [seconds * 1000 for at, seconds in timings if start <= at <= end]
+    return {"writes": len(window), "median_ms": statistics.median(window) if window else 0.0,
+            "max_ms": max(window, default=0.0)}
+
+def _rows(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT count(*) FROM transactions").fetchone()[0]
+    finally:
+        conn.close()
+
+def _file_copy(target):
+    """Copies the database file; returns how many rows committed before the copy it lacks."""
+    committed = _rows(db.DB_NAME)
+    shutil.copyfile(db.DB_NAME, target)
+    return committed - _rows(target)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--per-user", type=int, default=20_000)
+    parser.add_argument("--write-interval", type=float, default=0.002, help="seconds between writes")
+    parser.add_argument("--idle", type=float, default=2.0, help="seconds of writes timed with no backup")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    db.DB_NAME = os.path.join(directory, "bench.db")
+    backup.BACKUP_DIR = os.path.join(directory, "backups")
+    synthetic.generate(args.users, args.per_user, bcrypt_rounds=4)
+    size = os.path.getsize(db.DB_NAME)
+    print(f"{args.users * args.per_user:,} transactions, {size / 2**20:,.1f} MB")
+
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    receive, send = context.Pipe(duplex=False)
+    writer = context.Process(target=_write_load, args=(db.DB_NAME, args.write_interval, stop, send))
+    writer.start()
+    time.sleep(1.0)     # Let the writer start up
+
+    windows = {}
+    start = time.time()
+    time.sleep(args.idle)
+    windows["no backup"] = (start, time.time(), None)
+    for name, copy in [("steps", lambda: backup.snapshot(keep=None)),
+                       ("one_step", lambda: backup.snapshot(keep=None, pages=-1)),
+                       ("file_copy", lambda: _file_copy(os.path.join(directory, "copy.db")))]:
+        start = time.time()
+        result = copy()
+        windows[name] = (start, time.time(), result)
+        time.sleep(0.5)
+    stop.set()
+    timings = receive.recv()
+    writer.join()
+
+    results = {"params": {k: getattr(args, k) for k in ("users", "per_user", "write_interval")}, "db_bytes": size}
+    print(f"\n{'copy':<12}{'seconds':>9}{'MB/s':>9}{'steps':>7}{'restarts':>10}{'writes':>8}"
+          f"{'median ms':>11}{'max ms':>9}")
+    for name, (start, end, result) in windows.items():
+        latency = _latency(timings, start, end)
+        seconds = end - start
+        entry = dict(latency, seconds=seconds)
+        steps = restarts = ""
+        if name != "no backup":
+            entry["mb_per_s"] = size / 2**20 / seconds
+        if isinstance(result, backup.BackupResult):
+            entry.update(steps=result.steps, restarts=result.restarts)
+            steps, restarts = result.steps, result.restarts
+        results[name] = entry
+        print(f"{name:<12}{seconds:>9.2f}{entry.get('mb_per_s', 0):>9.0f}{steps:>7}{restarts:>10}"
+              f"{latency['writes']:>8}{latency['median_ms']:>11.2f}{latency['max_ms']:>9.1f}")
+    missing = results["file_copy"]["rows_missing"] = windows["file_copy"][2]
+    print(f"\nfile_copy lacks {missing:,} committed rows still in the WAL")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Fit, refit and allocation times of the forecasting and budget engine.
+
+Synthetic monthly history for --categories categories over --months
+months. "fit" is optimizer.fit_holt() from scratch. "refit" is
+HoltFit.resume() after the last month changes, which is what a new
+transaction in the current data costs. "allocate" solves limits for a
+savings target.
+
+    python -m benchmarks.budget_engine --categories 500 --months 36
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import optimizer
+
+def timed(fn, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categories", type=int, default=500)
+    parser.add_argument("--months", type=int, default=optimizer.HISTORY_MONTHS)
+    parser.add_argument("--target", type=float, default=optimizer.SAVINGS_TARGET, help="savings rate, %%")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    labels = [optimizer.INCOME] + [f"category{i}" for i in range(args.categories)]
+    months = optimizer._months_before("2030-01", args.months)
+    seasonal = 1 + 0.2 * np.sin(np.arange(args.months) * 2 * np.pi / 12)
+    history = rng.gamma(2.0, 1000.0, (len(labels), 1)) * seasonal * rng.uniform(0.8, 1.2, (len(labels), args.months))
+    history[0] *= args.categories
+    changed = history.copy()
+    changed[1:, -1] += 100.0
+
+    fit = optimizer.fit_holt(labels, months, history)
+    forecast = optimizer.Forecast("2030-01", 0.5, float(history[0, -1]), pd.DataFrame({
+        "category": labels[1:], "spent": history[1:, -1] / 2, "forecast": history[1:, -1]}))
+    plan = optimizer.allocate(forecast, args.target)
+
+    print(f"{args.categories:,} categories x {args.months} months\n")
+    print(f"{'step':<10}{'ms':>10}")
+    print(f"{'fit':<10}{timed(lambda: optimizer.fit_holt(labels, months, changed)):>10.2f}")
+    print(f"{'refit':<10}{timed(lambda: fit.resume(labels, months, changed)):>10.2f}")
+    print(f"{'allocate':<10}{timed(lambda: optimizer.allocate(forecast, args.target)):>10.2f}")
+    print(f"\nTarget {args.target:.0f}%: limits give {plan.savings_rate:.1f}% "
+          f"({'feasible' if plan.feasible else 'infeasible'})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Figure build time and browser payload size against history length.
+
+For each size, fills a fresh database with one user's transactions and
+compares the charts built the old way (plotly aggregating raw rows) with
+charts.py building from the rollup-backed Summary. Time covers loading
+the inputs, building the figures and serializing them to JSON.
+
+    python -m benchmarks.chart_payloads --sizes 1000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import plotly.express as px
+
+import aggregates
+import charts
+import database as db
+
+CATEGORIES = [f"Category {i}" for i in range(30)]
+USER = "bench@example.com"
+
+def build(rows, years=10):
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db.init_db()
+    start = date.today() - timedelta(days=365 * years)
+    batch = []
+    with db.get_connection() as conn:
+        for _ in range(rows):
+            day = start + timedelta(days=random.randrange(365 * years))
+            kind = "Income" if random.random() < 0.1 else "Expense"
+            batch.append((USER, day.isoformat(), round(random.uniform(10, 5000), 2),
+                          random.choice(CATEGORIES), kind, "bench"))
+            if len(batch) >= 100_000:
+                conn.executemany("INSERT INTO transactions (username, date, amount, category, type, description) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch.clear()
+        if batch:
+            conn.executemany("INSERT INTO transactions (username, date, amount, category, type, description) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+def raw_figures():
+    """The pre-rollup approach: every transaction handed to plotly."""
+    df = db.query_transactions(USER)
+    df['date'] = pd.to_datetime(df['date'])
+    monthly = df.groupby([pd.Grouper(key='date', freq='ME'), 'type'])['amount'].sum().reset_index()
+    trend = px.area(monthly, x='date', y='amount', color='type', markers=True)
+    pie = px.pie(df[df['type'] == 'Expense'], values='amount', names='category', hole=0.5)
+    return [trend.to_json(), pie.to_json()]
+
+def summary_figures():
+    summary = aggregates.summarize.uncached(USER, date.today().strftime("%Y-%m"))
+    return [charts.plot_income_expense_trend(summary.monthly).to_json(),
+            charts.plot_expense_pie(summary.by_category).to_json()]
+
+def measure(build_figures):
+    t0 = time.perf_counter()
+    payloads = build_figures()
+    return (time.perf_counter() - t0) * 1000, sum(len(p.encode("utf-8")) for p in payloads)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--skip-raw", action="store_true", help="only time the summary-based figures")
+    args = parser.parse_args()
+
+    random.seed(42)
+    print(f"{'transactions':>12}{'raw (ms)':>11}{'raw KB':>10}{'summary (ms)':>14}{'summary KB':>12}")
+    for rows in args.sizes:
+        build(rows)
+        raw_ms, raw_bytes = measure(raw_figures) if not args.skip_raw else (float("nan"), float("nan"))
+        ms, size = measure(summary_figures)
+        print(f"{rows:>12,}{raw_ms:>11.0f}{raw_bytes / 1024:>10.1f}{ms:>14.0f}{size / 1024:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Memory and filter/groupby speed of compact vs plain transaction frames.
+
+The plain frame is what get_user_data() used to return: SELECT * read
+straight into pandas. "object" is the same frame with text held as Python
+str objects, the default before pandas 3. The compact frame is
+database.query_transactions().
+
+    python -m benchmarks.frame_memory --rows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+import database as db
+
+CATEGORIES = ["Food", "Transport", "Rent", "Entertainment", "Health", "Shopping", "Utilities", "Other"]
+MERCHANTS = [f"UPI-MERCHANT{i}" for i in range(500)]
+USER = "bench@example.com"
+
+def build(rows, years=10):
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db.init_db()
+    start = date.today() - timedelta(days=365 * years)
+    sql = "INSERT INTO transactions (username, date, amount, category, type, description) VALUES (?, ?, ?, ?, ?, ?)"
+    batch = []
+    with db.get_connection() as conn:
+        for _ in range(rows):
+            day = start + timedelta(days=random.randrange(365 * years))
+            kind = "Income" if random.random() < 0.1 else "Expense"
+            batch.append((USER, day.isoformat(), round(random.uniform(10, 5000), 2), random.choice(CATEGORIES),
+                          kind, f"{random.choice(MERCHANTS)} ref {random.randrange(10**6)}"))
+            if len(batch) >= 100_000:
+                conn.executemany(sql, batch)
+                batch.clear()
+        if batch:
+            conn.executemany(sql, batch)
+
+def plain_frame():
+    with db.get_connection() as conn:
+        return pd.read_sql_query("SELECT * FROM transactions WHERE username = ? ORDER BY date, id",
+                                 conn, params=(USER,))
+
+def timed(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+def operations(frame):
+    return {
+        "type == 'Expense'": lambda: frame[frame["type"] == "Expense"],
+        "sum by category": lambda: frame.groupby("category", observed=True)["amount"].sum(),
+        "sum by month": lambda: frame.groupby(frame["date"].str[:7] if frame["date"].dtype.kind != "M"
+                                              else frame["date"].dt.to_period("M"))["amount"].sum(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    random.seed(42)
+    build(args.rows)
+    t0 = time.perf_counter()
+    plain = plain_frame()
+    plain_load = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    compact = db.query_transactions(USER, order="asc")
+    compact_load = time.perf_counter() - t0
+
+    text = plain.select_dtypes(exclude="number").columns
+    objects = plain.astype({column: object for column in text})
+    plain_mem, object_mem, compact_mem = db.memory_report(plain), db.memory_report(objects), db.memory_report(compact)
+    print(f"{args.rows:,} transactions (pandas {pd.__version__})\n")
+    print(f"{'column':<14}{'object MB':>11}{'plain MB':>10}{'compact MB':>12}")
+    for column in plain_mem:
+        print(f"{column:<14}{object_mem[column] / 2**20:>11.1f}{plain_mem[column] / 2**20:>10.1f}"
+              f"{compact_mem.get(column, 0) / 2**20:>12.1f}")
+    print(f"\nMemory: {object_mem['total'] / compact_mem['total']:.1f}x smaller than object, "
+          f"{plain_mem['total'] / compact_mem['total']:.1f}x smaller than plain; "
+          f"load {plain_load:.2f}s plain, {compact_load:.2f}s compact\n")
+
+    print(f"{'operation':<20}{'object (ms)':>13}{'plain (ms)':>12}{'compact (ms)':>14}")
+    object_ops, plain_ops, compact_ops = operations(objects), operations(plain), operations(compact)
+    for name in plain_ops:
+        print(f"{name:<20}{timed(object_ops[name]):>13.1f}{timed(plain_ops[name]):>12.1f}"
+              f"{timed(compact_ops[name]):>14.1f}")
+
+if __name__ == "__main__":
+    main()
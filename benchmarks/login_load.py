@@ -0,0 +1,115 @@
+"""Sustained login throughput and dashboard latency under a login burst.
+
+Registers a set of users, then times the dashboard's derived data
+(summary, charts, suggestions, computed uncached) alone and again while
+--threads clients log in continuously for --seconds. A brute-force run
+against a single account then shows the rate limiter rejecting attempts
+before any hashing.
+
+    python -m benchmarks.login_load --users 50 --threads 16 --seconds 10
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+import aggregates
+import auth
+import charts
+import database as db
+import hashing
+import optimizer
+
+def render_dashboard(username, month):
+    summary = aggregates.summarize.uncached(username, month)
+    charts.plot_income_expense_trend(summary.monthly).to_json()
+    charts.plot_expense_pie(summary.by_category).to_json()
+    optimizer.generate_suggestions(summary)
+
+def render_latencies(username, seconds):
+    month = date.today().strftime("%Y-%m")
+    timings = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        render_dashboard(username, month)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return timings
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+def login_burst(users, threads, stop, counts):
+    lock = threading.Lock()
+
+    def client(i):
+        # Rotating through accounts and addresses keeps honest clients under their limits
+        n = i
+        while not stop.is_set():
+            user = users[n % len(users)]
+            try:
+                outcome = "ok" if auth.login_user(user, "password", ip=f"10.0.{i}.{n % 250}") else "failed"
+            except auth.RateLimited:
+                outcome = "limited"
+            with lock:
+                counts[outcome] += 1
+            n += threads
+
+    workers = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    return workers
+
+def brute_force(username, attempts):
+    hashed = limited = 0
+    t0 = time.perf_counter()
+    for _ in range(attempts):
+        try:
+            auth.login_user(username, "wrong", ip="203.0.113.7")
+            hashed += 1
+        except auth.RateLimited:
+            limited += 1
+    return hashed, limited, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    db.init_db()
+    users = [f"user{u}@example.com" for u in range(args.users)]
+    t0 = time.perf_counter()
+    for username in users:
+        auth.register_user(username, "password", "Bench User")
+    print(f"Registered {args.users} users in {time.perf_counter() - t0:.1f}s "
+          f"(bcrypt rounds {hashing.BCRYPT_ROUNDS}, {hashing.HASH_WORKERS} hash workers, {os.cpu_count()} CPUs)")
+
+    idle = render_latencies(users[-1], args.seconds / 2)
+
+    counts = Counter()
+    stop = threading.Event()
+    workers = login_burst(users, args.threads, stop, counts)
+    t0 = time.perf_counter()
+    busy = render_latencies(users[-1], args.seconds)
+    stop.set()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+
+    print(f"\nLogins: {counts['ok'] / elapsed:.1f}/s sustained ({counts['ok']:,} ok, {counts['failed']} failed, "
+          f"{counts['limited']} rate limited)")
+    hashed, limited, seconds = brute_force(users[0], 1000)
+    print(f"Brute force: {hashed + limited:,} attempts in {seconds:.2f}s, {hashed} hashed, {limited:,} rejected unhashed")
+    print(f"\n{'dashboard render':<18}{'renders':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for label, timings in (("idle", idle), ("during burst", busy)):
+        print(f"{label:<18}{len(timings):>9}{percentile(timings, 50):>10.1f}{percentile(timings, 95):>10.1f}")
+
+if __name__ == "__main__":
+    main()
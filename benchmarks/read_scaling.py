@@ -0,0 +1,113 @@
+"""Read throughput as app worker processes are added, with writes going through the writer.
+
+Each worker process loops over the dashboard's read path (summary plus
+a page of transactions) for random users. Every --write-every reads, it
+adds a transaction. The writes go through a writer service (writer.py)
+or, with --direct, straight to the database as a single-process
+deployment would. The run reports reads/sec per worker count, the
+efficiency of that against linear scaling from the first row (1.00 means
+linear), and failed writes.
+
+    python -m benchmarks.read_scaling --workers 1 2 4 --users 200 --per-user 500
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import database as db
+
+CATEGORIES = ["Food", "Transport", "Rent", "Entertainment", "Health", "Shopping", "Other"]
+
+def build(users, per_user):
+    db.init_db()
+    start = date.today() - timedelta(days=730)
+    sql = "INSERT INTO transactions (username, date, amount, category, type, description) VALUES (?, ?, ?, ?, ?, ?)"
+    with db.get_connection() as conn:
+        for u in range(users):
+            conn.executemany(sql, [(f"user{u}@example.com", (start + timedelta(days=random.randrange(730))).isoformat(),
+                                    round(random.uniform(10, 5000), 2), random.choice(CATEGORIES),
+                                    "Income" if random.random() < 0.1 else "Expense", "bench")
+                                   for _ in range(per_user)])
+
+def worker(db_name, writer_address, users, seconds, write_every, seed, results):
+    import aggregates
+    db.DB_NAME = db_name
+    db.WRITER_ADDRESS = writer_address
+    rng = random.Random(seed)
+    month = date.today().strftime("%Y-%m")
+    reads = writes = failed = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        username = f"user{rng.randrange(users)}@example.com"
+        aggregates.summarize.uncached(username, month)
+        db.query_transactions(username, limit=50)
+        reads += 1
+        if write_every and reads % write_every == 0:
+            try:
+                db.add_transaction(username, date.today(), 10.0, "Food", "Expense", "load test")
+                writes += 1
+            except Exception:
+                failed += 1
+    results.put((reads, writes, failed))
+
+def run(workers, args, db_name, writer_address):
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(db_name, writer_address, args.users, args.seconds,
+                                              args.write_every, i, results)) for i in range(workers)]
+    for p in procs:
+        p.start()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return [sum(t[i] for t in totals) for i in range(3)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-every", type=int, default=10, help="reads per write (0: read only)")
+    parser.add_argument("--direct", action="store_true", help="write without the writer service")
+    args = parser.parse_args()
+
+    random.seed(42)
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    build(args.users, args.per_user)
+
+    service = None
+    writer_address = None
+    if not args.direct:
+        writer_address = os.path.join(os.path.dirname(db.DB_NAME), "writer.sock")
+        os.environ["BUDGET_WRITER_AUTHKEY"] = secrets.token_hex(16)
+        import writer
+        writer.AUTHKEY = os.environ["BUDGET_WRITER_AUTHKEY"].encode("utf-8")
+        service = subprocess.Popen([sys.executable, writer.__file__, "--db", db.DB_NAME, "--address", writer_address],
+                                   stderr=subprocess.DEVNULL)
+        writer.wait_ready(writer_address)
+
+    print(f"{args.users * args.per_user:,} transactions, {os.cpu_count()} CPUs, "
+          f"writes {'direct' if args.direct else 'through writer service'}\n")
+    print(f"{'workers':>8}{'reads/s':>10}{'per worker':>12}{'efficiency':>12}{'writes':>8}{'failed':>8}")
+    base = None
+    try:
+        for n in args.workers:
+            reads, writes, failed = run(n, args, db.DB_NAME, writer_address)
+            rate = reads / args.seconds
+            base = base or rate / n
+            print(f"{n:>8}{rate:>10.1f}{rate / n:>12.1f}{rate / n / base:>12.2f}{writes:>8}{failed:>8}")
+    finally:
+        if service:
+            service.terminate()
+            service.wait()
+
+if __name__ == "__main__":
+    main()
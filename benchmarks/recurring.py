@@ -0,0 +1,83 @@
+"""Month-start posting of recurring transactions for many users.
+
+Creates --users users with --rules rules each, all due on the first of
+the month, and times:
+- month_start: database.post_recurring() posting that day's occurrences;
+- rerun: the same call again, which finds nothing due;
+- catch_up: posting after --catch-up months without a run;
+- per_row: db.add_transaction() for --sample rows, one write and commit
+  each, the way the rows were entered before, extrapolated to the
+  month-start row count.
+
+    python -m benchmarks.recurring --users 100000 --out recurring.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+import database as db
+from benchmarks import synthetic
+
+RULES = [("Salary", "Income", 50_000.0, "Monthly Salary"), ("Rent", "Expense", 15_000.0, "House Rent"),
+         ("Entertainment", "Expense", 499.0, "Streaming"), ("Utilities", "Expense", 1_200.0, "Phone")]
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--rules", type=int, default=2, choices=range(1, len(RULES) + 1), help="per user")
+    parser.add_argument("--catch-up", type=int, default=3, help="months missed before the catch-up run")
+    parser.add_argument("--sample", type=int, default=2_000, help="rows timed through add_transaction")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    start = date(2026, 1, 1)
+    t0 = time.perf_counter()
+    users = synthetic.generate(args.users, 0, bcrypt_rounds=4, end=start)
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO recurring_rules (username, amount, category, type, description, "
+                         "interval_months, day, next_date) VALUES (?, ?, ?, ?, ?, 1, 1, ?)",
+                         [(user, amount, category, kind, description, start.isoformat())
+                          for user in users for category, kind, amount, description in RULES[:args.rules]])
+    print(f"Created {args.users:,} users with {args.users * args.rules:,} rules in {time.perf_counter() - t0:.1f}s",
+          file=sys.stderr)
+
+    results = {"params": {k: getattr(args, k) for k in ("users", "rules", "catch_up", "sample")}}
+    (rules, rows), seconds = _timed(lambda: db.post_recurring(start))
+    results["month_start"] = {"rules": rules, "rows": rows, "seconds": seconds}
+    (rules, rows), seconds = _timed(lambda: db.post_recurring(start))
+    results["rerun"] = {"rules": rules, "rows": rows, "seconds": seconds}
+    later = date(2026, 1 + args.catch_up, 1)
+    (rules, rows), seconds = _timed(lambda: db.post_recurring(later))
+    results["catch_up"] = {"rules": rules, "rows": rows, "seconds": seconds}
+
+    _, seconds = _timed(lambda: [db.add_transaction(users[i % len(users)], start, 1.0, "Other", "Expense", "row")
+                                 for i in range(args.sample)])
+    per_row = seconds / args.sample
+    results["per_row"] = {"rows": args.sample, "seconds": seconds,
+                          "extrapolated_seconds": per_row * results["month_start"]["rows"]}
+
+    print(f"\n{'case':<16}{'rules':>10}{'rows':>12}{'seconds':>10}{'rows/s':>12}")
+    for name in ("month_start", "rerun", "catch_up"):
+        r = results[name]
+        print(f"{name:<16}{r['rules']:>10,}{r['rows']:>12,}{r['seconds']:>10.2f}"
+              f"{r['rows'] / r['seconds'] if r['rows'] else 0:>12,.0f}")
+    r = results["per_row"]
+    print(f"{'per_row':<16}{'':>10}{r['rows']:>12,}{r['seconds']:>10.2f}{1 / per_row:>12,.0f}"
+          f"   ({r['extrapolated_seconds']:,.0f}s for the month-start rows)")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
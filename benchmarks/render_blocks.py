@@ -0,0 +1,77 @@
+"""Elements sent to the browser, and rerun times, per page of the app.
+
+Every element a run of app.py creates (each st.markdown call, column and
+container) is one delta message on the session's websocket. Seeds a user
+with --categories expense categories, each with a budget this month,
+runs each page through Streamlit's AppTest and reports, per page, the
+delta count, how many of them are markdown, the bytes of markdown sent,
+and the median time of --reruns reruns.
+
+    python -m benchmarks.render_blocks --categories 40 --out render_blocks.json
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import database as db
+from benchmarks import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["Dashboard", "Add Transaction", "Budget Planner"]
+
+def _nodes(node):
+    yield node
+    for child in getattr(node, "children", {}).values():
+        yield from _nodes(child)
+
+def count(at):
+    """(deltas, markdown deltas, markdown bytes) of the last run, the page root excluded."""
+    nodes = [n for n in _nodes(at._tree) if n is not at._tree and getattr(n, "type", None) != "main"
+             and n is not at.sidebar]
+    markdown = [n for n in nodes if getattr(n, "type", None) == "markdown"]
+    return len(nodes), len(markdown), sum(len(n.value.encode("utf-8")) for n in markdown)
+
+def main():
+    from streamlit.testing.v1 import AppTest
+    import auth
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--categories", type=int, default=40, help="expense categories, each with a budget")
+    parser.add_argument("--per-user", type=int, default=5_000)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    categories = {f"Category {i:02d}": 1.0 for i in range(args.categories)}
+    user = synthetic.generate(1, args.per_user, categories=categories, bcrypt_rounds=4)[0]
+    token = auth.create_session(user, "User 0")
+
+    results = {"params": {k: getattr(args, k) for k in ("categories", "per_user", "reruns")}}
+    print(f"{'page':<20}{'deltas':>8}{'markdown':>10}{'md bytes':>10}{'rerun ms':>10}")
+    for page in PAGES:
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+        at.session_state["token"] = token
+        at.run()
+        at.sidebar.radio[0].set_value(page).run()
+        timings = []
+        for _ in range(args.reruns):
+            t0 = time.perf_counter()
+            at.run()
+            timings.append((time.perf_counter() - t0) * 1000)
+        if at.exception:
+            raise SystemExit(f"{page}: {at.exception[0].value}")
+        deltas, markdown, size = count(at)
+        results[page] = {"deltas": deltas, "markdown": markdown, "markdown_bytes": size,
+                         "rerun_ms": statistics.median(timings)}
+        print(f"{page:<20}{deltas:>8}{markdown:>10}{size:>10,}{statistics.median(timings):>10.1f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
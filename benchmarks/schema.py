@@ -0,0 +1,90 @@
+"""Query latency before and after the schema migrations.
+
+Builds an unindexed (version 0) database, times the per-user queries the
+app issues on every rerun, applies database.migrate() and times them again.
+
+    python -m benchmarks.schema --users 10000 --per-user 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+import database as db
+
+CATEGORIES = ["Food", "Transport", "Rent", "Entertainment", "Health", "Shopping", "Other"]
+
+def build(conn, users, per_user, batch=100_000):
+    db._create_tables(conn)
+    start = date.today() - timedelta(days=730)
+    rows = []
+    for u in range(users):
+        username = f"user{u}@example.com"
+        for _ in range(per_user):
+            day = start + timedelta(days=random.randrange(730))
+            kind = "Income" if random.random() < 0.1 else "Expense"
+            rows.append((username, day.isoformat(), round(random.uniform(10, 5000), 2),
+                         random.choice(CATEGORIES), kind, "bench"))
+            if len(rows) >= batch:
+                conn.executemany("INSERT INTO transactions (username, date, amount, category, type, description) "
+                                 "VALUES (?, ?, ?, ?, ?, ?)", rows)
+                rows.clear()
+        conn.executemany("INSERT INTO budgets (username, category, limit_amount, month) VALUES (?, ?, ?, ?)",
+                         [(username, c, 5000, date.today().strftime("%Y-%m")) for c in CATEGORIES[:4]])
+    if rows:
+        conn.executemany("INSERT INTO transactions (username, date, amount, category, type, description) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+
+QUERIES = {
+    "get_user_data": ("SELECT * FROM transactions WHERE username = ?", lambda u, m: (u,)),
+    "seed_data count": ("SELECT count(*) FROM transactions WHERE username = ?", lambda u, m: (u,)),
+    "month range": ("SELECT * FROM transactions WHERE username = ? AND date >= ? AND date < ?",
+                    lambda u, m: (u, f"{m}-01", f"{m}-32")),
+    "get_budgets": ("SELECT category, limit_amount FROM budgets WHERE username = ? AND month = ?",
+                    lambda u, m: (u, m)),
+}
+
+def measure(conn, users, samples):
+    month = date.today().strftime("%Y-%m")
+    picks = [f"user{random.randrange(users)}@example.com" for _ in range(samples)]
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        timings = []
+        for username in picks:
+            t0 = time.perf_counter()
+            conn.execute(sql, params(username, month)).fetchall()
+            timings.append((time.perf_counter() - t0) * 1000)
+        results[name] = statistics.median(timings)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--per-user", type=int, default=10,
+                        help="transactions per user (10000 for the full-scale run)")
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(42)
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    with db.get_connection() as conn:
+        t0 = time.perf_counter()
+        build(conn, args.users, args.per_user)
+        print(f"Built {args.users * args.per_user:,} transactions in {time.perf_counter() - t0:.1f}s")
+
+        before = measure(conn, args.users, args.samples)
+        t0 = time.perf_counter()
+        db.migrate(conn)
+        print(f"Migrated to version {db.schema_version(conn)} in {time.perf_counter() - t0:.1f}s")
+        after = measure(conn, args.users, args.samples)
+
+    print(f"\n{'query':<18}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name in QUERIES:
+        print(f"{name:<18}{before[name]:>14.3f}{after[name]:>14.3f}{before[name] / max(after[name], 1e-9):>9.0f}x")
+
+if __name__ == "__main__":
+    main()
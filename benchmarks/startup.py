@@ -0,0 +1,114 @@
+"""Cold start and per-rerun cost of the Streamlit app.
+
+Two measurements, each in fresh interpreter processes so nothing is
+already imported:
+
+- Imports: the modules app.py imports at the top of the script, which
+  every process pays for before its first page, timed with
+  `python -X importtime`. The slowest top-level packages are listed.
+- Renders: app.py run through Streamlit's AppTest against a seeded
+  database. The first run of a process is cold (the login page, or the
+  dashboard for a logged-in session), and reruns after it show the
+  overhead every interaction pays.
+
+    python -m benchmarks.startup --repeat 5 --out startup.json
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+# Run in a child process: AppTest timings of app.py, printed as JSON
+RENDER_SCRIPT = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+token, reruns = sys.argv[1] or None, int(sys.argv[2])
+at = AppTest.from_file(sys.argv[3], default_timeout=120)
+if token:
+    at.session_state["token"] = token
+timings = []
+for _ in range(1 + reruns):
+    t0 = time.perf_counter()
+    at.run()
+    timings.append((time.perf_counter() - t0) * 1000)
+    if at.exception:
+        sys.exit(at.exception[0].value)
+print(json.dumps(timings))
+"""
+
+SEED_SCRIPT = """
+import auth
+from benchmarks import synthetic
+users = synthetic.generate(1, 5000, bcrypt_rounds=4)
+print(auth.create_session(users[0], "User 0"))
+"""
+
+def top_level_imports(path=APP):
+    """Import statements at module level of `path`, as source lines."""
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+def import_times(env):
+    """(total ms, [(package, cumulative ms)]) for importing what app.py imports up front."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "\n".join(top_level_imports())],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    packages = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Nested imports are indented under the module that triggered them
+        if not name[1:].startswith(" "):
+            packages.append((name.strip(), int(cumulative) / 1000))
+    return sum(ms for _, ms in packages), sorted(packages, key=lambda p: p[1], reverse=True)
+
+def render_times(env, token, reruns):
+    result = subprocess.run([sys.executable, "-c", RENDER_SCRIPT, token or "", str(reruns), APP],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return json.loads(result.stdout.splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="fresh processes per cold measurement")
+    parser.add_argument("--reruns", type=int, default=10, help="reruns timed after each cold render")
+    parser.add_argument("--top", type=int, default=12, help="packages listed in the import breakdown")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, BUDGET_DB=os.path.join(tempfile.mkdtemp(), "bench.db"), PYTHONPATH=ROOT)
+    env.pop("BUDGET_WRITER_ADDRESS", None)
+    token = subprocess.run([sys.executable, "-c", SEED_SCRIPT], cwd=ROOT, env=env, capture_output=True,
+                           text=True, check=True).stdout.splitlines()[-1]
+
+    imports = [import_times(env) for _ in range(args.repeat)]
+    totals = [total for total, _ in imports]
+    print(f"Top-level imports of app.py: {statistics.median(totals):.0f} ms (median of {args.repeat})\n")
+    print(f"{'package':<32}{'cumulative ms':>14}")
+    for name, ms in imports[-1][1][:args.top]:
+        print(f"{name:<32}{ms:>14.1f}")
+
+    results = {"imports_ms": statistics.median(totals), "imports": dict(imports[-1][1][:args.top])}
+    print(f"\n{'render':<32}{'cold ms':>10}{'rerun ms':>10}")
+    for page, session in (("login page", None), ("dashboard", token)):
+        runs = [render_times(env, session, args.reruns) for _ in range(args.repeat)]
+        cold = statistics.median(r[0] for r in runs)
+        rerun = statistics.median(t for r in runs for t in r[1:])
+        results[page] = {"cold_ms": cold, "rerun_ms": rerun}
+        print(f"{page:<32}{cold:>10.0f}{rerun:>10.1f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+if __name__ == "__main__":
+    main()
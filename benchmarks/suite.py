@@ -0,0 +1,201 @@
+"""Benchmark suite over synthetic data, with JSON results comparable across commits.
+
+Generates a database with benchmarks.synthetic, then times each case
+--repeat times after one warm-up call. Cases time the uncached
+computation the app does on a cache miss. Results (median, p95 and min
+in ms, plus the data parameters, commit and library versions) are
+printed as a table and written as JSON with --out.
+
+With --baseline, each case's median is compared to the same case in an
+earlier results file. A case regresses when it is slower by more than
+its threshold (THRESHOLDS, else --threshold) and by more than --min-ms.
+Any regression makes the exit status 1. Compare only results produced
+with the same parameters on the same machine.
+
+    python -m benchmarks.suite --out results.json
+    python -m benchmarks.suite --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+import pandas as pd
+
+import aggregates
+import auth
+import charts
+import database as db
+import optimizer
+from benchmarks import synthetic
+
+# Allowed median slowdown per case before it counts as a regression
+THRESHOLDS = {"login": 0.5}     # Includes a round trip to the hashing pool
+
+# --- Cases ---
+# A case takes the benchmark context and returns the zero-argument callable to time
+
+CASES = {}
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+@case("get_user_data")
+def _get_user_data(ctx):
+    return lambda: db.get_user_data(ctx["user"])
+
+@case("get_budgets")
+def _get_budgets(ctx):
+    return lambda: db.get_budgets(ctx["user"], ctx["month"])
+
+@case("search_text")
+def _search_text(ctx):
+    # One page of the Reports explorer; "merchant" is in every synthetic description
+    return lambda: db.query_transactions(ctx["user"], text="food merchant", limit=51)
+
+@case("search_filters")
+def _search_filters(ctx):
+    return lambda: db.query_transactions(ctx["user"], text="salary", type="Income", min_amount=30_000,
+                                         start=f"{ctx['month'][:4]}-01-01", limit=51)
+
+@case("summarize")
+def _summarize(ctx):
+    return lambda: aggregates.summarize.uncached(ctx["user"], ctx["month"])
+
+@case("generate_suggestions")
+def _generate_suggestions(ctx):
+    summary = aggregates.summarize.uncached(ctx["user"], ctx["month"])
+    return lambda: optimizer.generate_suggestions(summary)
+
+@case("plot_income_expense_trend")
+def _plot_trend(ctx):
+    summary = aggregates.summarize.uncached(ctx["user"], ctx["month"])
+    return lambda: charts.plot_income_expense_trend(summary.monthly).to_json()
+
+@case("plot_expense_pie")
+def _plot_pie(ctx):
+    summary = aggregates.summarize.uncached(ctx["user"], ctx["month"])
+    return lambda: charts.plot_expense_pie(summary.by_category).to_json()
+
+@case("plot_budget_vs_actual")
+def _plot_budget(ctx):
+    summary = aggregates.summarize.uncached(ctx["user"], ctx["month"])
+    return lambda: charts.plot_budget_vs_actual(summary.budgets).to_json()
+
+@case("generate_pdf_report")
+def _generate_pdf_report(ctx):
+    def run():
+        income, expense, total_rows = aggregates.lifetime_totals(ctx["user"])
+        chunks = db.iter_transactions(ctx["user"], columns=["date", "category", "type", "amount"], order="desc",
+                                      limit=optimizer.PDF_MAX_ROWS)
+        optimizer.generate_pdf_report(chunks, "Bench User", income, expense, total_rows=total_rows)
+    return run
+
+@case("login")
+def _login(ctx):
+    # Rotate accounts so the per-user rate limit never triggers
+    attempts = iter(range(10**9))
+    users = ctx["users"]
+    def run():
+        if auth.login_user(users[next(attempts) % len(users)], synthetic.PASSWORD) is None:
+            raise RuntimeError("Benchmark login failed")
+    return run
+
+# --- Runner ---
+
+def measure(fn, repeat):
+    fn()    # Warm-up: imports, connections, statement cache
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t0) * 1000)
+    ordered = sorted(timings)
+    return {"median_ms": statistics.median(ordered),
+            "p95_ms": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+            "min_ms": ordered[0],
+            "runs": repeat}
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, threshold, min_ms):
+    """[(case, baseline ms, current ms, change)] for every case slower than allowed."""
+    regressions = []
+    for name, current in results["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if before is None:
+            continue
+        old, new = before["median_ms"], current["median_ms"]
+        if new - old > min_ms and new > old * (1 + THRESHOLDS.get(name, threshold)):
+            regressions.append((name, old, new, new / old - 1))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--per-user", type=int, default=20_000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--out", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed median slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), "bench.db")
+    # A fixed end date keeps the generated data identical from run to run
+    end = date(2026, 6, 30)
+    t0 = time.perf_counter()
+    users = synthetic.generate(args.users, args.per_user, args.years, seed=args.seed,
+                               bcrypt_rounds=args.bcrypt_rounds, end=end)
+    print(f"Generated {args.users * args.per_user:,} transactions in {time.perf_counter() - t0:.1f}s\n",
+          file=sys.stderr)
+    ctx = {"user": users[0], "users": users, "month": end.strftime("%Y-%m")}
+
+    results = {
+        "commit": commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {k: getattr(args, k) for k in ("users", "per_user", "years", "seed", "repeat", "bcrypt_rounds")},
+        "environment": {"python": platform.python_version(), "pandas": pd.__version__,
+                        "machine": platform.machine(), "cpus": os.cpu_count()},
+        "cases": {},
+    }
+    print(f"{'case':<28}{'median ms':>11}{'p95 ms':>10}{'min ms':>10}")
+    for name in args.cases:
+        result = results["cases"][name] = measure(CASES[name](ctx), args.repeat)
+        print(f"{name:<28}{result['median_ms']:>11.2f}{result['p95_ms']:>10.2f}{result['min_ms']:>10.2f}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if baseline.get("params") != results["params"]:
+            print("\nWarning: baseline was run with different parameters", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold, args.min_ms)
+        print(f"\nAgainst {args.baseline} ({baseline.get('commit')}): "
+              f"{len(regressions)} regression{'s' * (len(regressions) != 1)}")
+        for name, old, new, change in regressions:
+            print(f"  {name}: {old:.2f} -> {new:.2f} ms (+{change:.0%})")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Synthetic users, transactions and budgets at realistic volumes.
+
+Rows are generated with numpy, one vectorized draw per user, and written
+through the backend's bulk insert (executemany on SQLite, COPY on
+PostgreSQL). The same arguments and seed always produce the same data.
+
+    python -m benchmarks.synthetic --db bench.db --users 100 --per-user 5000
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+import database as db
+import hashing
+
+# Share of expense rows per category
+CATEGORIES = {"Food": 0.30, "Shopping": 0.18, "Transport": 0.15, "Entertainment": 0.10, "Utilities": 0.10,
+              "Health": 0.06, "Rent": 0.04, "Other": 0.07}
+INCOME_CATEGORIES = {"Salary": 0.8, "Freelance": 0.2}
+INCOME_SHARE = 0.05
+MERCHANTS = 40          # Distinct descriptions per category
+PASSWORD = "password"
+BATCH_ROWS = 100_000
+
+def username(i):
+    return f"user{i:06d}@example.com"
+
+def _draw(rng, weights, size):
+    names = list(weights)
+    p = np.array([weights[n] for n in names], dtype=float)
+    return np.array(names, dtype=object)[rng.choice(len(names), size=size, p=p / p.sum())]
+
+def user_rows(rng, user, per_user, start, days, categories, income_share):
+    """One user's transaction rows as (username, date, amount, category, type, description, dedupe_key)."""
+    income = rng.random(per_user) < income_share
+    dates = (np.datetime64(start) + rng.integers(0, days, per_user)).astype(str)
+    category = np.where(income, _draw(rng, INCOME_CATEGORIES, per_user), _draw(rng, categories, per_user))
+    # Log-normal amounts: many small expenses, a few large ones; income larger still
+    amount = np.round(np.where(income, rng.lognormal(10.5, 0.4, per_user), rng.lognormal(6.0, 1.1, per_user)), 2)
+    merchant = rng.integers(0, MERCHANTS, per_user)
+    kinds = np.where(income, "Income", "Expense")
+    return [(user, d, a, c, k, f"{c.upper()} MERCHANT {m}", None)
+            for d, a, c, k, m in zip(dates.tolist(), amount.tolist(), category.tolist(), kinds.tolist(),
+                                     merchant.tolist())]
+
+def generate(users, per_user, years=3, categories=None, income_share=INCOME_SHARE, seed=0,
+             bcrypt_rounds=None, end=None):
+    """Fills the configured database; returns the usernames created.
+
+    Every user gets `per_user` transactions spread over the `years` before
+    `end` (default today), a budget per expense category for the current
+    month, and the password PASSWORD. All users share one hash, so bcrypt
+    runs once whatever the user count.
+    """
+    categories = categories or CATEGORIES
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    start = end - timedelta(days=365 * years)
+    days = (end - start).days + 1
+    month = end.strftime("%Y-%m")
+    password_hash = hashing.hash_password(PASSWORD, bcrypt_rounds)
+    names = [username(i) for i in range(users)]
+
+    db.init_db()
+    backend = db.get_backend()
+    with db.get_connection() as conn:
+        conn.executemany("INSERT INTO users (username, password, name) VALUES (?, ?, ?) ON CONFLICT DO NOTHING",
+                         [(name, password_hash, f"User {i}") for i, name in enumerate(names)])
+        conn.executemany("INSERT INTO budgets (username, category, limit_amount, month) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT DO NOTHING",
+                         [(name, category, 5_000.0, month) for name in names for category in categories])
+    batch = []
+    for name in names:
+        batch.extend(user_rows(rng, name, per_user, start, days, categories, income_share))
+        if len(batch) >= BATCH_ROWS:
+            with db.get_connection() as conn:
+                backend.insert_transactions(conn, batch)
+            batch = []
+    if batch:
+        with db.get_connection() as conn:
+            backend.insert_transactions(conn, batch)
+    return names
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--per-user", type=int, default=5_000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--income-share", type=float, default=INCOME_SHARE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bcrypt-rounds", type=int, default=None)
+    args = parser.parse_args()
+
+    db.DB_NAME = args.db
+    t0 = time.perf_counter()
+    generate(args.users, args.per_user, args.years, income_share=args.income_share, seed=args.seed,
+             bcrypt_rounds=args.bcrypt_rounds)
+    seconds = time.perf_counter() - t0
+    rows = args.users * args.per_user
+    print(f"{rows:,} transactions for {args.users:,} users in {seconds:.1f}s ({rows / seconds:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
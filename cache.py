@@ -0,0 +1,161 @@
+"""Process-wide cache for per-user derived data, shared by all Streamlit sessions.
+
+Entries are keyed on (username, data version, kind, args). The version
+comes from database.data_version(), which triggers bump on every write to
+the user's transactions or budgets, so a write invalidates everything
+derived from it without any explicit purge. Cached values are shared
+between sessions and must be treated as read-only.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from functools import wraps
+
+import database as db
+
+MAX_BYTES = int(os.environ.get("BUDGET_CACHE_MB", "128")) * 1024 * 1024
+
+def sizeof(value):
+    """Approximate memory held by a cached value, in bytes."""
+    if hasattr(value, 'memory_usage'):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if is_dataclass(value):
+        return sys.getsizeof(value) + sum(sizeof(getattr(value, f.name)) for f in fields(value))
+    return sys.getsizeof(value)
+
+class LRUCache:
+    """Thread-safe LRU map bounded by the total size of its values."""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, size)
+        self._bytes = 0
+        self._versions = {}             # username -> newest version seen
+        self._lock = threading.Lock()
+        self._counters = {}             # kind -> {"hits": n, "misses": n}
+        self.evictions = 0
+
+    def _count(self, kind, outcome):
+        counter = self._counters.setdefault(kind, {"hits": 0, "misses": 0})
+        counter[outcome] += 1
+
+    def get(self, key):
+        kind = key[2]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._count(kind, "misses")
+                return False, None
+            self._entries.move_to_end(key)
+            self._count(kind, "hits")
+            return True, entry[0]
+
+    def put(self, key, value):
+        username, version = key[:2]
+        size = sizeof(value)
+        with self._lock:
+            if version > self._versions.get(username, -1):
+                # The user's data moved on: entries for older versions can never hit again
+                self._versions[username] = version
+                self._drop(lambda k: k[0] == username and k[1] < version)
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def entries(self, username, version, kind):
+        """[(args, value)] cached for `kind` at exactly this version, without counting hits."""
+        with self._lock:
+            return [(k[3], v) for k, (v, _) in self._entries.items()
+                    if k[0] == username and k[1] == version and k[2] == kind]
+
+    def _drop(self, predicate):
+        for key in [k for k in self._entries if predicate(k)]:
+            self._bytes -= self._entries.pop(key)[1]
+
+    def invalidate(self, username=None):
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+                self._bytes = 0
+                self._versions.clear()
+            else:
+                self._drop(lambda k: k[0] == username)
+                self._versions.pop(username, None)
+
+    def stats(self):
+        with self._lock:
+            hits = sum(c["hits"] for c in self._counters.values())
+            misses = sum(c["misses"] for c in self._counters.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "by_kind": {kind: dict(c) for kind, c in self._counters.items()},
+            }
+
+_cache = LRUCache()
+
+def get_or_compute(username, kind, args, compute):
+    """Returns the cached `kind` value for the user's current data, computing it on a miss."""
+    key = (username, db.data_version(username), kind, tuple(args))
+    hit, value = _cache.get(key)
+    if not hit:
+        # The version is read again in the snapshot the computation reads, so
+        # a write committed in between cannot end up in a value cached under
+        # the version before it (carry_forward would then apply it twice)
+        with db.read_snapshot():
+            key = (username, db.data_version(username), kind, tuple(args))
+            value = compute()
+        _cache.put(key, value)
+    return value
+
+def cached(kind):
+    """Decorator memoizing fn(username, *args) per (username, data version)."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(username, *args):
+            return get_or_compute(username, kind, args, lambda: fn(username, *args))
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+def carry_forward(username, version, updates):
+    """Caches updates[kind](args, value) at `version` for each entry of those kinds at version - 1.
+
+    For writes whose effect on a cached value is known: the value for the
+    new version is derived from the old one instead of recomputed. An
+    update returns None when it cannot derive the new value; that entry is
+    then recomputed on its next read as usual.
+    """
+    # Collected first: the first put drops every entry at the older version
+    previous = [(kind, args, value) for kind in updates for args, value in _cache.entries(username, version - 1, kind)]
+    for kind, args, value in previous:
+        updated = updates[kind](args, value)
+        if updated is not None:
+            _cache.put((username, version, kind, args), updated)
+
+def invalidate(username=None):
+    _cache.invalidate(username)
+
+def stats():
+    return _cache.stats()
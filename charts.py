@@ -1,6 +1,9 @@
+import numpy as np
+import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import pandas as pd
+
+import perf
 
 # Define a consistent vibrant color palette
 COLORS = {
@@ -11,25 +14,74 @@ COLORS = {
     'Background': 'rgba(0,0,0,0)' # Transparent backgrounds
 }
 
-def plot_income_expense_trend(df):
-    if df.empty:
+# Figures are serialized once per data version and cached, so their size is
+# what every browser downloads. Inputs are bounded before plotting and the
+# default plotly template (~7 KB, replaced by st.plotly_chart's theme in the
+# browser anyway) is left out.
+TEMPLATE = "none"
+TOP_CATEGORIES = 8          # Pie slices, including "Other"
+MAX_TREND_POINTS = 120      # Points kept per trend series
+
+# --- Input reduction ---
+
+def top_categories(by_category, n=TOP_CATEGORIES):
+    """The n-1 largest categories plus everything else folded into "Other"."""
+    if len(by_category) <= n:
+        return by_category
+    ranked = by_category.sort_values('amount', ascending=False)
+    head, tail = ranked.iloc[:n - 1], ranked.iloc[n - 1:]
+    other = pd.DataFrame({'category': ['Other'], 'amount': [tail['amount'].sum()]})
+    return pd.concat([head[['category', 'amount']], other], ignore_index=True)
+
+def lttb(y, threshold):
+    """Indices of the `threshold` points Largest-Triangle-Three-Buckets keeps from series y."""
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    y = np.asarray(y, dtype=float)
+    x = np.arange(n, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+@perf.timed('charts.plot_income_expense_trend')
+def plot_income_expense_trend(monthly):
+    """`monthly` is Summary.monthly: one row per (month, type)."""
+    if monthly.empty:
         # Return empty figure with message
         fig = go.Figure()
         fig.add_annotation(text="No data available", xref="paper", yref="paper",
                           x=0.5, y=0.5, showarrow=False, font=dict(size=20, color="gray"))
-        fig.update_layout(title="Income vs Expenses Trend", paper_bgcolor=COLORS['Background'])
+        fig.update_layout(title="Income vs Expenses Trend", template=TEMPLATE, paper_bgcolor=COLORS['Background'])
         return fig
     
-    df['date'] = pd.to_datetime(df['date'])
-    # Group by date and type
-    monthly = df.groupby([pd.Grouper(key='date', freq='M'), 'type'])['amount'].sum().reset_index()
-    
-    fig = px.area(monthly, x='date', y='amount', color='type', 
-                  title="📈 Income vs Expenses Trend",
-                  markers=True,
-                  color_discrete_map={"Income": COLORS['Income'], "Expense": COLORS['Expense']})
-    
+    series = monthly.pivot_table(index='month', columns='type', values='amount', aggfunc='sum', fill_value=0,
+                                 observed=True)
+    if len(series) > MAX_TREND_POINTS:
+        # Keep each series' own extremes on a shared set of months so the areas still stack
+        keep = set()
+        for kind in series.columns:
+            keep.update(lttb(series[kind].to_numpy(), MAX_TREND_POINTS // len(series.columns)))
+        series = series.iloc[sorted(keep)]
+
+    fig = go.Figure([
+        go.Scatter(x=series.index, y=series[kind], name=kind, mode='lines+markers', stackgroup='trend',
+                   line=dict(color=COLORS[kind]), hovertemplate='%{y:,.2f}')
+        for kind in ("Income", "Expense") if kind in series.columns
+    ])
     fig.update_layout(
+        title="📈 Income vs Expenses Trend",
+        template=TEMPLATE,
         paper_bgcolor=COLORS['Background'],
         plot_bgcolor=COLORS['Background'],
         hovermode="x unified",
@@ -39,41 +91,38 @@ def plot_income_expense_trend(df):
     )
     return fig
 
-def plot_expense_pie(df):
-    expenses = df[df['type'] == 'Expense']
-    if expenses.empty:
+@perf.timed('charts.plot_expense_pie')
+def plot_expense_pie(by_category):
+    """`by_category` is Summary.by_category: expense totals per category."""
+    if by_category.empty:
         fig = go.Figure()
         fig.add_annotation(text="No expense data", xref="paper", yref="paper",
                           x=0.5, y=0.5, showarrow=False, font=dict(size=20, color="gray"))
-        fig.update_layout(title="Expense Breakdown", paper_bgcolor=COLORS['Background'])
+        fig.update_layout(title="Expense Breakdown", template=TEMPLATE, paper_bgcolor=COLORS['Background'])
         return fig
     
-    fig = px.pie(expenses, values='amount', names='category', 
-                 title="🍩 Expense Breakdown",
-                 hole=0.5,
-                 color_discrete_sequence=COLORS['Pie'])
-    
-    fig.update_traces(textposition='inside', textinfo='percent+label')
+    slices = top_categories(by_category)
+    fig = go.Figure(go.Pie(labels=slices['category'], values=slices['amount'], hole=0.5, sort=False,
+                           marker=dict(colors=COLORS['Pie']), textposition='inside', textinfo='percent+label'))
     fig.update_layout(
+        title="🍩 Expense Breakdown",
+        template=TEMPLATE,
         paper_bgcolor=COLORS['Background'],
         showlegend=False
     )
     return fig
 
-def plot_budget_vs_actual(budget_df, expense_df):
-    if budget_df.empty:
+@perf.timed('charts.plot_budget_vs_actual')
+def plot_budget_vs_actual(budgets):
+    """`budgets` is Summary.budgets: limits joined with this month's spend."""
+    if budgets.empty:
         fig = go.Figure()
         fig.add_annotation(text="No budgets set", xref="paper", yref="paper",
                           x=0.5, y=0.5, showarrow=False, font=dict(size=20, color="gray"))
+        fig.update_layout(template=TEMPLATE)
         return fig
 
-    # Merge budget limits with actual expenses
-    expense_sum = expense_df[expense_df['type'] == 'Expense'].groupby('category')['amount'].sum().reset_index()
-    merged = pd.merge(budget_df, expense_sum, on='category', how='left').fillna(0)
-    merged.rename(columns={'amount': 'Spent', 'limit_amount': 'Limit'}, inplace=True)
-    
-    # Calculate colors based on percentage used
-    merged['usage'] = merged['Spent'] / merged['Limit']
+    merged = budgets.rename(columns={'amount': 'Spent', 'limit_amount': 'Limit'})
     
     # Dynamic colors: Green (<80%), Yellow (80-100%), Red (>100%)
     bar_colors = [
@@ -92,16 +141,11 @@ def plot_budget_vs_actual(budget_df, expense_df):
     fig.update_layout(
         barmode='overlay', 
         title="🎯 Budget Health (Spent vs Limit)",
+        template=TEMPLATE,
         paper_bgcolor=COLORS['Background'],
         plot_bgcolor=COLORS['Background'],
         xaxis=dict(showgrid=False),
         yaxis=dict(showgrid=False),
         showlegend=True
     )
-<<<<<<< HEAD
-    return fig tyr
-
-=======
-    return figfgr
->>>>>>> 02a67402bb8ba142aebb7672cdf5e76c300a4703
-
+    return fig
@@ -1,16 +1,250 @@
+import os
+import re
 import sqlite3
-import pandas as pd
+import threading
+import time
 import datetime
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
 from datetime import date
 
-DB_NAME = "budget.db"
+import perf
+
+DB_NAME = os.environ.get("BUDGET_DB", "budget.db")
+# postgresql://... stores everything in PostgreSQL (see postgres.py); unset means SQLite at DB_NAME
+DATABASE_URL = os.environ.get("BUDGET_DATABASE_URL")
+# host:port or socket path of the writer service (writer.py); unset means this process writes directly
+WRITER_ADDRESS = os.environ.get("BUDGET_WRITER_ADDRESS")
+# pandas is imported inside the functions that build frames, so processes
+# and pages that only touch users and sessions (the login page) never load it
+
+# --- Storage Engine ---
+
+POOL_SIZE = 8           # Max open connections per database file
+POOL_TIMEOUT = 10.0     # Seconds to wait for a free connection
+STATEMENT_CACHE = 256   # Prepared statements kept per connection
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",       # Readers never block the writer
+    "PRAGMA synchronous=NORMAL",     # Safe with WAL, skips fsync per commit
+    "PRAGMA cache_size=-16000",      # 16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+]
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of SQLite connections shared by all sessions."""
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {"checkouts": 0, "created": 0, "waits": 0, "wait_time": 0.0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        if perf.ENABLED:
+            conn.set_trace_callback(perf.count_query)
+        return conn
+
+    def acquire(self):
+        start = time.perf_counter()
+        with self._cond:
+            waited = False
+            while not self._idle and self._open >= self.size:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    raise TimeoutError(f"No free database connection after {self.timeout}s")
+                self._cond.wait(remaining)
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                conn = None
+                self._open += 1
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += time.perf_counter() - start
+                perf.record("db.pool_wait", time.perf_counter() - start)
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            for conn in self._idle:
+                conn.close()
+            self._open -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats,
+                        size=self.size,
+                        open=self._open,
+                        idle=len(self._idle),
+                        in_use=self._open - len(self._idle))
+
+class SQLiteBackend:
+    """Default storage backend: one SQLite file behind a ConnectionPool.
+
+    A backend provides pooled connections with sqlite3's calling
+    conventions (execute/executemany/cursor, "?" placeholders), creates
+    and migrates the schema, and implements the few operations whose
+    efficient form differs between engines. postgres.PostgresBackend is
+    the other implementation.
+    """
+    name = "sqlite"
+    schema_ready = False        # Set by init_db() once the schema is current
+    duplicate_errors = (sqlite3.IntegrityError,)    # Raised by a unique-key conflict; writes raise DuplicateError
+
+    def __init__(self, path):
+        self.pool = ConnectionPool(path)
+
+    @contextmanager
+    def connection(self):
+        conn = self.pool.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.release(conn)
+
+    def init_schema(self, conn):
+        _create_tables(conn)
+        migrate(conn)
+
+    def schema_version(self, conn):
+        return schema_version(conn)
+
+    def begin_read(self, conn):
+        # A deferred transaction in WAL mode reads one snapshot, taken at its first SELECT
+        conn.execute("BEGIN")
+
+    def insert_transactions(self, conn, rows):
+        # Staged in a temp table, then moved in one statement: FTS5 flushes its
+        # pending index at every statement that writes to it, so executemany
+        # straight into transactions wrote one index segment per row
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS import_rows "
+                     "(username, date, amount, category, type, description, dedupe_key)")
+        conn.executemany("INSERT INTO import_rows VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        # "WHERE true" tells the parser ON CONFLICT belongs to the INSERT, not a join
+        inserted = conn.execute("INSERT INTO transactions (username, date, amount, category, type, description, "
+                                "dedupe_key) SELECT * FROM import_rows WHERE true ON CONFLICT DO NOTHING").rowcount
+        conn.execute("DELETE FROM import_rows")
+        return inserted
+
+    def read_chunks(self, conn, sql, params, chunksize):
+        import pandas as pd
+        yield from pd.read_sql_query(sql, conn, params=params, chunksize=chunksize)
+
+    def text_filter(self, username, words):
+        """SQL condition on transactions: rows of `username` whose description or category has every word.
+
+        Whole words are looked up directly. A prefix ("groc*") of two or three
+        characters is read from the prefix index; longer ones merge every term
+        they match, across all users, so they cost more on a large table.
+        """
+        phrases = " ".join('"' + word.rstrip("*") + '"' + "*" * word.endswith("*") for word in words)
+        query = f'owner : "{owner_token(username)}" AND {{description category}} : ({phrases})'
+        return "id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)", [query]
+
+    def stats(self):
+        return self.pool.stats()
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend():
+    """Returns the process-wide backend for DATABASE_URL, or for the SQLite file DB_NAME."""
+    key = DATABASE_URL or DB_NAME
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                if DATABASE_URL:
+                    import postgres
+                    backend = postgres.PostgresBackend(DATABASE_URL)
+                else:
+                    backend = SQLiteBackend(DB_NAME)
+                _backends[key] = backend
+    return backend
+
+def get_pool():
+    """The SQLite connection pool for DB_NAME."""
+    return get_backend().pool
+
+_snapshot = threading.local()
 
 def get_connection():
-    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-    return conn
+    """Checks a pooled connection out, commits on success and returns it to the pool.
+
+    Inside read_snapshot() it is that block's connection instead.
+    """
+    conn = getattr(_snapshot, "conn", None)
+    return nullcontext(conn) if conn is not None else get_backend().connection()
+
+@contextmanager
+def read_snapshot():
+    """Runs every read in the block, on this thread, on one connection and one snapshot of the data.
+
+    Values derived from several queries, such as a data version and the
+    summary cached under it, then describe the same state even while other
+    sessions write. Writes made through _write() use their own connection.
+    Nested blocks share the outer snapshot.
+    """
+    if getattr(_snapshot, "conn", None) is not None:
+        yield _snapshot.conn
+        return
+    backend = get_backend()
+    with backend.connection() as conn:
+        backend.begin_read(conn)
+        _snapshot.conn = conn
+        try:
+            yield conn
+        finally:
+            _snapshot.conn = None
+
+def pool_stats():
+    return get_backend().stats()
 
 def init_db():
-    conn = get_connection()
+    """Creates or migrates the schema; after the first call per database in a process, a no-op."""
+    backend = get_backend()
+    if backend.schema_ready:
+        return
+    with get_connection() as conn:
+        backend.init_schema(conn)
+    backend.schema_ready = True
+
+def _create_tables(conn):
     c = conn.cursor()
     
     # Users Table
@@ -41,18 +275,265 @@ def init_db():
                     month TEXT, -- Format YYYY-MM
                     FOREIGN KEY(username) REFERENCES users(username)
                 )''')
-    conn.commit()
-    conn.close()
+
+# --- Schema Migrations ---
+# MIGRATIONS[n] upgrades the schema to version n + 1; PRAGMA user_version
+# records the last version applied to the file.
+
+MIGRATIONS = [
+    # 1: Store every date as ISO-8601 text (YYYY-MM-DD) so range scans compare correctly
+    [
+        "UPDATE transactions SET date = date(date) WHERE date(date) IS NOT NULL AND date <> date(date)",
+    ],
+    # 2: Per-user indexes; budgets become unique per (username, category, month)
+    [
+        "CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(username, date)",
+        "DELETE FROM budgets WHERE id NOT IN (SELECT max(id) FROM budgets GROUP BY username, category, month)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_budgets_user_category_month ON budgets(username, category, month)",
+    ],
+    # 3: Monthly rollup kept in step with transactions by triggers
+    [
+        """CREATE TABLE IF NOT EXISTS monthly_summary (
+               username TEXT NOT NULL,
+               month TEXT NOT NULL, -- Format YYYY-MM
+               type TEXT NOT NULL,
+               category TEXT NOT NULL,
+               total REAL NOT NULL,
+               count INTEGER NOT NULL,
+               PRIMARY KEY (username, month, type, category)
+           ) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rollup_insert AFTER INSERT ON transactions
+           WHEN NEW.username IS NOT NULL BEGIN
+               INSERT INTO monthly_summary (username, month, type, category, total, count)
+               VALUES (NEW.username, substr(NEW.date, 1, 7), IFNULL(NEW.type, ''), IFNULL(NEW.category, ''),
+                       IFNULL(NEW.amount, 0), 1)
+               ON CONFLICT(username, month, type, category)
+               DO UPDATE SET total = total + excluded.total, count = count + 1;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rollup_delete AFTER DELETE ON transactions
+           WHEN OLD.username IS NOT NULL BEGIN
+               UPDATE monthly_summary SET total = total - IFNULL(OLD.amount, 0), count = count - 1
+               WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+                 AND type = IFNULL(OLD.type, '') AND category = IFNULL(OLD.category, '');
+               DELETE FROM monthly_summary
+               WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+                 AND type = IFNULL(OLD.type, '') AND category = IFNULL(OLD.category, '') AND count <= 0;
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_rollup_update AFTER UPDATE OF username, date, amount, category, type ON transactions
+           BEGIN
+               UPDATE monthly_summary SET total = total - IFNULL(OLD.amount, 0), count = count - 1
+               WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+                 AND type = IFNULL(OLD.type, '') AND category = IFNULL(OLD.category, '');
+               DELETE FROM monthly_summary
+               WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+                 AND type = IFNULL(OLD.type, '') AND category = IFNULL(OLD.category, '') AND count <= 0;
+               INSERT INTO monthly_summary (username, month, type, category, total, count)
+               SELECT NEW.username, substr(NEW.date, 1, 7), IFNULL(NEW.type, ''), IFNULL(NEW.category, ''),
+                      IFNULL(NEW.amount, 0), 1
+               WHERE NEW.username IS NOT NULL
+               ON CONFLICT(username, month, type, category)
+               DO UPDATE SET total = total + excluded.total, count = count + 1;
+           END""",
+        lambda conn: rebuild_monthly_summary(conn=conn, archived=False),
+    ],
+    # 4: Per-user data version, bumped by every write that changes what a user sees
+    [
+        """CREATE TABLE IF NOT EXISTS data_versions (
+               username TEXT PRIMARY KEY,
+               version INTEGER NOT NULL
+           ) WITHOUT ROWID""",
+    ] + [
+        f"""CREATE TRIGGER IF NOT EXISTS trg_version_{table}_{event.lower()} AFTER {event} ON {table}
+            WHEN {row}.username IS NOT NULL BEGIN
+                INSERT INTO data_versions (username, version) VALUES ({row}.username, 1)
+                ON CONFLICT(username) DO UPDATE SET version = version + 1;
+            END"""
+        for table in ("transactions", "budgets")
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+    ],
+    # 5: Content hash of imported rows so re-importing a statement skips what is already there
+    [
+        "ALTER TABLE transactions ADD COLUMN dedupe_key TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_user_dedupe ON transactions(username, dedupe_key)",
+    ],
+    # 6: Login sessions, so reruns and other workers can trust a token instead of re-checking passwords
+    [
+        """CREATE TABLE IF NOT EXISTS sessions (
+               token_hash TEXT PRIMARY KEY,
+               username TEXT NOT NULL,
+               expires_at REAL NOT NULL,
+               FOREIGN KEY(username) REFERENCES users(username)
+           )""",
+    ],
+    # 7: Full-text index over description and category. Contentless, so it
+    # stores only the index; each row also carries its owner as one token
+    # (see owner_token) so a search walks one user's entries, not everyone's.
+    [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+               owner, description, category, content='',
+               tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+           )""",
+        """CREATE TRIGGER IF NOT EXISTS trg_fts_insert AFTER INSERT ON transactions BEGIN
+               INSERT INTO transactions_fts (rowid, owner, description, category)
+               VALUES (NEW.id, 'u' || hex(NEW.username), NEW.description, NEW.category);
+           END""",
+        # A contentless table forgets the text, so removing a row repeats the values it was indexed with
+        """CREATE TRIGGER IF NOT EXISTS trg_fts_delete AFTER DELETE ON transactions BEGIN
+               INSERT INTO transactions_fts (transactions_fts, rowid, owner, description, category)
+               VALUES ('delete', OLD.id, 'u' || hex(OLD.username), OLD.description, OLD.category);
+           END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_fts_update AFTER UPDATE OF username, description, category
+           ON transactions BEGIN
+               INSERT INTO transactions_fts (transactions_fts, rowid, owner, description, category)
+               VALUES ('delete', OLD.id, 'u' || hex(OLD.username), OLD.description, OLD.category);
+               INSERT INTO transactions_fts (rowid, owner, description, category)
+               VALUES (NEW.id, 'u' || hex(NEW.username), NEW.description, NEW.category);
+           END""",
+        """INSERT INTO transactions_fts (rowid, owner, description, category)
+           SELECT id, 'u' || hex(username), description, category FROM transactions""",
+    ],
+    # 8: Archived history (see archive.py): the Parquet files holding each
+    # user's archived months, the rollup totals of the rows moved there, and
+    # their dedupe keys, so re-importing an archived statement still skips it
+    [
+        """CREATE TABLE IF NOT EXISTS archive_parts (
+               username TEXT NOT NULL,
+               month TEXT NOT NULL, -- Format YYYY-MM
+               path TEXT NOT NULL, -- Relative to the archive directory
+               rows INTEGER NOT NULL,
+               total REAL NOT NULL,
+               created REAL NOT NULL,
+               PRIMARY KEY (username, month, path)
+           ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS archived_summary (
+               username TEXT NOT NULL,
+               month TEXT NOT NULL,
+               type TEXT NOT NULL,
+               category TEXT NOT NULL,
+               total REAL NOT NULL,
+               count INTEGER NOT NULL,
+               PRIMARY KEY (username, month, type, category)
+           ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS archived_keys (
+               username TEXT NOT NULL,
+               dedupe_key TEXT NOT NULL,
+               PRIMARY KEY (username, dedupe_key)
+           ) WITHOUT ROWID""",
+        """CREATE TRIGGER IF NOT EXISTS trg_archived_dedupe BEFORE INSERT ON transactions
+           WHEN NEW.dedupe_key IS NOT NULL BEGIN
+               SELECT RAISE(IGNORE) WHERE EXISTS (
+                   SELECT 1 FROM archived_keys WHERE username = NEW.username AND dedupe_key = NEW.dedupe_key);
+           END""",
+    ],
+    # 9: Recurring transactions (see post_recurring). next_date is the
+    # first occurrence not yet posted, NULL once the rule has ended; the
+    # partial index finds the rules due without scanning finished ones
+    [
+        """CREATE TABLE IF NOT EXISTS recurring_rules (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               username TEXT NOT NULL,
+               amount REAL NOT NULL,
+               category TEXT,
+               type TEXT, -- 'Income' or 'Expense'
+               description TEXT,
+               interval_months INTEGER NOT NULL,
+               day INTEGER NOT NULL, -- Day of month; shorter months use their last day
+               end_date TEXT, -- Last date an occurrence may fall on, NULL for no end
+               next_date TEXT,
+               FOREIGN KEY(username) REFERENCES users(username)
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_recurring_rules_user ON recurring_rules(username)",
+        "CREATE INDEX IF NOT EXISTS idx_recurring_rules_due ON recurring_rules(next_date) WHERE next_date IS NOT NULL",
+    ],
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, target=None):
+    """Applies pending migrations up to `target` (default: latest) in one transaction."""
+    target = len(MIGRATIONS) if target is None else target
+    if schema_version(conn) >= target:
+        return
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Re-read under the write lock in case another process migrated first
+        for version in range(schema_version(conn), target):
+            for step in MIGRATIONS[version]:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def _iso_date(value):
+    """Normalizes dates, datetimes and date-like strings to YYYY-MM-DD."""
+    if hasattr(value, 'strftime'):
+        return value.strftime("%Y-%m-%d")
+    return date.fromisoformat(str(value)[:10]).isoformat()
+
+# --- Writes ---
+# Every write is a function of an open connection registered in WRITES.
+# Normally it runs here on a pooled connection. In a multi-process
+# deployment (BUDGET_WRITER_ADDRESS set) it is sent to the writer service
+# instead, which applies writes from all app workers one batch per
+# transaction, so workers never compete for SQLite's write lock.
+#
+# Single-row writes return a Change: the user, the data version the write
+# produced (read in the same transaction, so it is exactly this write's)
+# and the row written or deleted. Functions in WRITE_LISTENERS get
+# (op, change) after each write made from this process; aggregates.py uses
+# them to update cached summaries without rereading the database.
+
+WRITES = {}
+WRITE_LISTENERS = []
+
+Change = namedtuple("Change", "username version row")
+
+class DuplicateError(Exception):
+    """A write would duplicate a unique key, such as a username already taken. Raised the same way by every backend."""
+
+def _writes(op):
+    def register(fn):
+        WRITES[op] = fn
+        return fn
+    return register
+
+def _write(op, *args):
+    with perf.span(f"db.write.{op}"):
+        if WRITER_ADDRESS:
+            import writer
+            result = writer.call(op, *args)
+        else:
+            # Not get_connection(): a write never joins a read_snapshot()
+            with get_backend().connection() as conn:
+                result = WRITES[op](conn, *args)
+    if isinstance(result, Change):
+        for listener in WRITE_LISTENERS:
+            listener(op, result)
+    return result
+
+def _version(conn, username):
+    row = conn.execute("SELECT version FROM data_versions WHERE username = ?", (username,)).fetchone()
+    return row[0] if row else 0
 
 def seed_data(username):
     """Injects sample data for a new user."""
-    conn = get_connection()
+    _write("seed_data", username)
+
+@_writes("seed_data")
+def _seed_data(conn, username):
     c = conn.cursor()
     
     # Check if data exists
     c.execute("SELECT count(*) FROM transactions WHERE username=?", (username,))
     if c.fetchone()[0] > 0:
-        conn.close()
         return
 
     today = date.today()
@@ -60,12 +541,12 @@ def seed_data(username):
     
     # Sample Transactions
     data = [
-        (username, today, 50000, 'Salary', 'Income', 'Monthly Salary'),
-        (username, today, 5000, 'Freelance', 'Income', 'Side Project'),
-        (username, today, 2000, 'Food', 'Expense', 'Grocery'),
-        (username, today, 1500, 'Transport', 'Expense', 'Fuel'),
-        (username, today, 5000, 'Rent', 'Expense', 'House Rent'),
-        (username, today, 3000, 'Entertainment', 'Expense', 'Weekend Party'),
+        (username, today.isoformat(), 50000, 'Salary', 'Income', 'Monthly Salary'),
+        (username, today.isoformat(), 5000, 'Freelance', 'Income', 'Side Project'),
+        (username, today.isoformat(), 2000, 'Food', 'Expense', 'Grocery'),
+        (username, today.isoformat(), 1500, 'Transport', 'Expense', 'Fuel'),
+        (username, today.isoformat(), 5000, 'Rent', 'Expense', 'House Rent'),
+        (username, today.isoformat(), 3000, 'Entertainment', 'Expense', 'Weekend Party'),
     ]
     
     c.executemany("INSERT INTO transactions (username, date, amount, category, type, description) VALUES (?, ?, ?, ?, ?, ?)", data)
@@ -79,49 +560,507 @@ def seed_data(username):
     ]
     
     c.executemany("INSERT INTO budgets (username, category, limit_amount, month) VALUES (?, ?, ?, ?)", budgets)
-    
-    conn.commit()
-    conn.close()
 
 # --- CRUD Operations ---
 
+# Row of a transaction Change: the columns in this order
+CHANGE_COLUMNS = ("id", "date", "amount", "category", "type", "description")
+
 def add_transaction(username, date, amount, category, type, description):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO transactions (username, date, amount, category, type, description) VALUES (?, ?, ?, ?, ?, ?)",
-              (username, date, amount, category, type, description))
-    conn.commit()
-    conn.close()
+    return _write("add_transaction", username, _iso_date(date), amount, category, type, description)
+
+@_writes("add_transaction")
+def _add_transaction(conn, username, date, amount, category, type, description):
+    row = conn.execute("INSERT INTO transactions (username, date, amount, category, type, description) "
+                       "VALUES (?, ?, ?, ?, ?, ?) RETURNING " + ", ".join(CHANGE_COLUMNS),
+                       (username, date, amount, category, type, description)).fetchone()
+    return Change(username, _version(conn, username), tuple(row))
 
 def delete_transaction(trans_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM transactions WHERE id=?", (trans_id,))
-    conn.commit()
-    conn.close()
+    """Deletes the transaction; returns its Change, or None if there was no such row."""
+    return _write("delete_transaction", int(trans_id))
+
+@_writes("delete_transaction")
+def _delete_transaction(conn, trans_id):
+    row = conn.execute("DELETE FROM transactions WHERE id=? RETURNING username, " + ", ".join(CHANGE_COLUMNS),
+                       (trans_id,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return Change(row[0], _version(conn, row[0]), tuple(row[1:]))
+
+def insert_transactions(rows):
+    """Bulk-inserts (username, date, amount, category, type, description, dedupe_key) rows.
+
+    Rows whose dedupe_key the user already has are skipped; returns how many were inserted.
+    """
+    return _write("insert_transactions", rows)
+
+@_writes("insert_transactions")
+def _insert_transactions(conn, rows):
+    return get_backend().insert_transactions(conn, rows)
+
+def create_user(username, password_hash, name):
+    """Adds a user row; raises DuplicateError if the username is taken."""
+    _write("create_user", username, password_hash, name)
+
+@_writes("create_user")
+def _create_user(conn, username, password_hash, name):
+    try:
+        conn.execute("INSERT INTO users (username, password, name) VALUES (?, ?, ?)", (username, password_hash, name))
+    except get_backend().duplicate_errors as exc:
+        raise DuplicateError(f"Username {username!r} is already registered") from exc
+
+def add_session(token_hash, username, expires_at):
+    _write("add_session", token_hash, username, expires_at)
+
+@_writes("add_session")
+def _add_session(conn, token_hash, username, expires_at):
+    conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+    conn.execute("INSERT INTO sessions (token_hash, username, expires_at) VALUES (?, ?, ?)",
+                 (token_hash, username, expires_at))
+
+def delete_session(token_hash):
+    _write("delete_session", token_hash)
+
+@_writes("delete_session")
+def _delete_session(conn, token_hash):
+    conn.execute("DELETE FROM sessions WHERE token_hash = ?", (token_hash,))
 
 def get_user_data(username):
-    conn = get_connection()
-    df = pd.read_sql_query(f"SELECT * FROM transactions WHERE username = '{username}'", conn)
-    conn.close()
-    return df
+    return query_transactions(username, order="asc")
+
+NO_LIMIT = 2 ** 63 - 1     # "LIMIT -1" and "LIMIT ALL" are each understood by only one engine
+TRANSACTION_COLUMNS = ("id", "username", "date", "amount", "category", "type", "description")
+# The username is implied by every query, so frames leave it out unless asked for
+DEFAULT_COLUMNS = tuple(c for c in TRANSACTION_COLUMNS if c != "username")
+
+# --- Frame dtypes ---
+# Transaction frames are compact: dates parsed once to datetime64, type and
+# category as categoricals (one small int code per row instead of a string),
+# amounts float64. Comparisons like frame['type'] == 'Expense' then compare
+# integer codes.
+
+TYPE_CATEGORIES = ["Income", "Expense"]
+
+def _parse_dates(values):
+    import pandas as pd
+    # A history repeats each day many times: parse the distinct dates only
+    codes, uniques = pd.factorize(values)
+    parsed = pd.to_datetime(uniques, format="ISO8601")
+    return pd.Series(parsed.take(codes, allow_fill=True, fill_value=pd.NaT), index=values.index)
+
+def compact(frame):
+    """Converts a transactions frame to the compact dtypes in place; returns it."""
+    import pandas as pd
+    if "date" in frame:
+        frame["date"] = _parse_dates(frame["date"])
+    if "type" in frame:
+        frame["type"] = frame["type"].astype(pd.CategoricalDtype(TYPE_CATEGORIES))
+    for column in ("category", "username"):
+        if column in frame:
+            frame[column] = frame[column].astype("category")
+    if "amount" in frame:
+        frame["amount"] = frame["amount"].astype("float64")
+    return frame
+
+def memory_report(frame):
+    """Bytes held by each column of `frame` (deep), plus a 'total' entry."""
+    usage = frame.memory_usage(deep=True, index=True)
+    report = {column: int(size) for column, size in usage.items()}
+    report["total"] = int(usage.sum())
+    return report
+
+def month_range(month):
+    """Returns the [start, end) ISO date bounds of a YYYY-MM month."""
+    year, mon = map(int, month.split("-"))
+    start = date(year, mon, 1)
+    end = date(year + mon // 12, mon % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+@perf.timed("db.query_transactions")
+def query_transactions(username, start=None, end=None, columns=None, order="desc",
+                       limit=None, offset=None, after=None, **filters):
+    """Loads a slice of a user's transactions, newest first by default.
+
+    `start`/`end` bound the date range (end exclusive) and `columns` projects
+    the result. Pages are ordered by (date, id); pass the (date, id) of the
+    last row of the previous page as `after` to seek past it through the
+    (username, date) index instead of counting rows with `offset`. The frame
+    has the compact dtypes described above.
+
+    Keyword filters narrow the rows further: `text` (every word must be a
+    word of the description or category, or start one when written "word*";
+    matched through the full-text index), `type`, and
+    `min_amount`/`max_amount` (inclusive).
+
+    Months moved to the archive are read from their Parquet files and merged
+    in, so callers see one history.
+    """
+    import pandas as pd
+    sql, params = _transactions_sql(username, start, end, columns, order, limit, offset, after, **filters)
+    with get_connection() as conn:
+        months = _archived_months(conn, username, start, end)
+        if not months:
+            return compact(pd.read_sql_query(sql, conn, params=params))
+    frames = list(_with_archive(username, months, start, end, columns, order, limit, offset, after,
+                                QUERY_CHUNK, filters))
+    if not frames:
+        return compact(pd.DataFrame(columns=list(columns or DEFAULT_COLUMNS)))
+    return compact(pd.concat(frames, ignore_index=True))
+
+def iter_transactions(username, start=None, end=None, columns=None, order="asc",
+                      limit=None, chunksize=5_000, **filters):
+    """Streams the same slices as query_transactions() as DataFrame chunks.
+
+    Rows are fetched from one cursor `chunksize` at a time, so exporting a long
+    history never holds more than one chunk in memory. The pooled connection is
+    held until the generator is exhausted or closed.
+    """
+    with get_connection() as conn:
+        months = _archived_months(conn, username, start, end)
+    if months:
+        for chunk in _with_archive(username, months, start, end, columns, order, limit, None, None,
+                                   chunksize, filters):
+            yield compact(chunk)
+        return
+    sql, params = _transactions_sql(username, start, end, columns, order, limit, None, None, **filters)
+    with get_connection() as conn:
+        for chunk in get_backend().read_chunks(conn, sql, params, chunksize):
+            yield compact(chunk)
+
+def owner_token(username):
+    """The single full-text token standing for `username`: what 'u' || hex(username) gives in SQL."""
+    return "u" + username.encode("utf-8").hex().upper()
+
+def search_words(text):
+    """The words of a search box entry, as the full-text index tokenizes them; "word*" marks a prefix."""
+    return re.findall(r"\w+\*?", text or "")
+
+def _transactions_sql(username, start, end, columns, order, limit, offset, after,
+                      text=None, type=None, min_amount=None, max_amount=None):
+    columns = list(columns or DEFAULT_COLUMNS)
+    unknown = set(columns) - set(TRANSACTION_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown transaction columns: {sorted(unknown)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+
+    sql = f"SELECT {', '.join(columns)} FROM transactions WHERE username = ?"
+    params = [username]
+    if start is not None:
+        sql += " AND date >= ?"
+        params.append(_iso_date(start))
+    if end is not None:
+        sql += " AND date < ?"
+        params.append(_iso_date(end))
+    if type is not None:
+        sql += " AND type = ?"
+        params.append(type)
+    if min_amount is not None:
+        sql += " AND amount >= ?"
+        params.append(float(min_amount))
+    if max_amount is not None:
+        sql += " AND amount <= ?"
+        params.append(float(max_amount))
+    words = search_words(text)
+    if words:
+        condition, extra = get_backend().text_filter(username, words)
+        sql += f" AND {condition}"
+        params.extend(extra)
+    if after is not None:
+        sql += f" AND (date, id) {'<' if order == 'desc' else '>'} (?, ?)"
+        params.extend([_iso_date(after[0]), int(after[1])])
+    sql += f" ORDER BY date {order}, id {order}"
+    if limit is not None or offset is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([NO_LIMIT if limit is None else int(limit), int(offset or 0)])
+    return sql, params
+
+# --- Archived History ---
+# archive.py moves closed months of transactions into Parquet files listed
+# in archive_parts. A read whose date range touches archived months walks
+# the range in order: stretches between archived months are plain table
+# scans, and each run of consecutive archived months, up to about a chunk
+# of rows, is one scan of their files merged with any rows dated in them
+# that were written after they were archived.
+
+QUERY_CHUNK = 50_000
+
+def _archived_months(conn, username, start, end):
+    """[(month, [file paths], rows)] for the user's archived months overlapping [start, end), oldest first."""
+    sql = "SELECT month, path, rows FROM archive_parts WHERE username = ?"
+    params = [username]
+    if start is not None:
+        sql += " AND month >= ?"
+        params.append(_iso_date(start)[:7])
+    if end is not None:
+        sql += " AND month || '-01' < ?"
+        params.append(_iso_date(end))
+    months = {}
+    for month, path, rows in conn.execute(sql + " ORDER BY month", params):
+        paths, total = months.get(month, ([], 0))
+        months[month] = (paths + [path], total + rows)
+    return [(month, paths, rows) for month, (paths, rows) in months.items()]
+
+def _segments(months, start, end, chunksize):
+    """[lo, hi) date ranges covering start..end in ascending order, with the archive files of each, if any."""
+    segments = []
+    lo = None if start is None else _iso_date(start)
+    end = None if end is None else _iso_date(end)
+    rows = 0
+    for month, paths, count in months:
+        month_start, month_end = month_range(month)
+        if lo is None or lo < month_start:
+            segments.append((lo, month_start, None))
+        elif segments and segments[-1][2] is not None and rows + count <= chunksize:
+            # Extends the previous archived run
+            segments[-1] = (segments[-1][0], min(end or month_end, month_end), segments[-1][2] + paths)
+            rows += count
+            lo = month_end
+            continue
+        segments.append((max(lo or month_start, month_start), min(end or month_end, month_end), list(paths)))
+        rows = count
+        lo = month_end
+    if end is None or lo < end:
+        segments.append((lo, end, None))
+    return segments
+
+def _with_archive(username, months, start, end, columns, order, limit, offset, after, chunksize, filters):
+    """Uncompacted frames of the table and archive together in (date, id) order; limit and offset apply to both."""
+    import pandas as pd
+    import archive
+
+    columns = list(columns or DEFAULT_COLUMNS)
+    # Merging needs the sort key even when the caller did not ask for it
+    read_columns = columns + [c for c in ("date", "id") if c not in columns]
+    skip, remaining = int(offset or 0), NO_LIMIT if limit is None else int(limit)
+    if after is not None:
+        after = (_iso_date(after[0]), int(after[1]))
+    segments = _segments(months, start, end, chunksize)
+    if order == "desc":
+        segments.reverse()
+    for lo, hi, paths in segments:
+        if remaining <= 0:
+            return
+        sql, params = _transactions_sql(username, lo, hi, read_columns, order,
+                                        None if limit is None else skip + remaining, None, after, **filters)
+        if paths is None:
+            with get_connection() as conn:
+                frames = list(get_backend().read_chunks(conn, sql, params, chunksize))
+        else:
+            with get_connection() as conn:
+                hot = pd.read_sql_query(sql, conn, params=params)
+            cold = archive.read(username, paths, read_columns, lo, hi, after, order, **filters)
+            merged = pd.concat([cold, hot], ignore_index=True) if len(hot) else cold
+            merged = merged.sort_values(["date", "id"], ascending=order == "asc", ignore_index=True)
+            frames = [merged.iloc[i:i + chunksize] for i in range(0, len(merged), chunksize)]
+        for frame in frames:
+            if skip:
+                dropped = min(skip, len(frame))
+                frame, skip = frame.iloc[dropped:], skip - dropped
+            frame = frame.iloc[:remaining]
+            remaining -= len(frame)
+            if len(frame):
+                yield frame[columns].reset_index(drop=True)
+            if remaining <= 0:
+                return
 
 def set_budget(username, category, limit, month):
-    conn = get_connection()
-    c = conn.cursor()
-    # Check if exists, if so update, else insert
-    c.execute("SELECT id FROM budgets WHERE username=? AND category=? AND month=?", (username, category, month))
-    data = c.fetchone()
-    if data:
-        c.execute("UPDATE budgets SET limit_amount=? WHERE id=?", (limit, data[0]))
-    else:
-        c.execute("INSERT INTO budgets (username, category, limit_amount, month) VALUES (?, ?, ?, ?)", 
-                  (username, category, limit, month))
-    conn.commit()
-    conn.close()
+    return _write("set_budget", username, category, limit, month)
 
+@_writes("set_budget")
+def _set_budget(conn, username, category, limit, month):
+    conn.execute("""INSERT INTO budgets (username, category, limit_amount, month) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(username, category, month) DO UPDATE SET limit_amount = excluded.limit_amount""",
+                     (username, category, limit, month))
+    return Change(username, _version(conn, username), (category, limit, month))
+
+@perf.timed("db.data_version")
+def data_version(username):
+    """Counter bumped by triggers whenever the user's transactions or budgets change."""
+    with get_connection() as conn:
+        return _version(conn, username)
+
+@perf.timed("db.get_budgets")
 def get_budgets(username, month):
-    conn = get_connection()
-    df = pd.read_sql_query(f"SELECT category, limit_amount FROM budgets WHERE username = '{username}' AND month = '{month}'", conn)
-    conn.close()
-    return df
\ No newline at end of file
+    import pandas as pd
+    with get_connection() as conn:
+        return pd.read_sql_query("SELECT category, limit_amount FROM budgets WHERE username = ? AND month = ?",
+                                 conn, params=(username, month))
+
+# --- Recurring Transactions ---
+# A rule posts `amount` every `interval_months` months on day `day`.
+# post_recurring() posts every occurrence due up to today, for all users,
+# including any missed while nothing ran, a batch of rules per
+# transaction: a bulk insert of the rows and one update advancing each
+# rule's next_date. Each row's dedupe_key names its rule and date, so an
+# occurrence is posted at most once even when two processes run the
+# same batch, and deleting a posted row does not bring it back.
+
+RECURRING_BATCH = 20_000    # Rules posted per transaction
+
+def occurrence_key(rule_id, day):
+    return f"recurring:{rule_id}:{day}"
+
+def _occurrence(year, month, day):
+    """Day `day` of the month, or its last day if the month is shorter."""
+    month_end = date(year + month // 12, month % 12 + 1, 1) - datetime.timedelta(days=1)
+    return date(year, month, min(day, month_end.day))
+
+def _advance(current, day, months):
+    month = current.month - 1 + months
+    return _occurrence(current.year + month // 12, month % 12 + 1, day)
+
+def add_recurring_rule(username, amount, category, type, description, start, interval_months=1, day=None,
+                       end=None):
+    """Adds a rule posting from `start` (on `day`, default start's day) until `end`; returns its id.
+
+    Occurrences already due are posted by the next post_recurring().
+    """
+    start = date.fromisoformat(_iso_date(start))
+    day = day or start.day
+    if interval_months < 1 or not 1 <= day <= 31:
+        raise ValueError("A rule repeats every 1 or more months, on a day from 1 to 31")
+    first = _occurrence(start.year, start.month, day)
+    if first < start:
+        first = _advance(first, day, 1)
+    end = _iso_date(end) if end else None
+    return _write("add_recurring_rule", username, amount, category, type, description, interval_months, day,
+                  end, first.isoformat() if end is None or first.isoformat() <= end else None)
+
+@_writes("add_recurring_rule")
+def _add_recurring_rule(conn, username, amount, category, type, description, interval_months, day, end,
+                        next_date):
+    return conn.execute("INSERT INTO recurring_rules (username, amount, category, type, description, "
+                        "interval_months, day, end_date, next_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING id",
+                        (username, amount, category, type, description, interval_months, day, end,
+                         next_date)).fetchone()[0]
+
+def delete_recurring_rule(username, rule_id):
+    """Stops the rule; the transactions it posted stay. Returns False if the user has no such rule."""
+    return _write("delete_recurring_rule", username, int(rule_id))
+
+@_writes("delete_recurring_rule")
+def _delete_recurring_rule(conn, username, rule_id):
+    return conn.execute("DELETE FROM recurring_rules WHERE id = ? AND username = ?",
+                        (rule_id, username)).rowcount > 0
+
+def get_recurring_rules(username):
+    import pandas as pd
+    with get_connection() as conn:
+        return pd.read_sql_query("SELECT id, amount, category, type, description, interval_months, day, end_date, "
+                                 "next_date FROM recurring_rules WHERE username = ? ORDER BY id",
+                                 conn, params=(username,))
+
+def post_recurring(today=None, username=None):
+    """Posts the occurrences due by `today` (default: today); returns (rules posted, rows inserted)."""
+    today = _iso_date(today or date.today())
+    rules = inserted = 0
+    while True:
+        batch, rows = _write("post_recurring", today, username, RECURRING_BATCH)
+        rules += batch
+        inserted += rows
+        if batch < RECURRING_BATCH:
+            return rules, inserted
+
+@_writes("post_recurring")
+def _post_recurring(conn, today, username, limit):
+    where, params = ("AND username = ?", [username]) if username is not None else ("", [])
+    due = conn.execute(f"""SELECT id, username, amount, category, type, description, interval_months, day,
+                                  end_date, next_date
+                           FROM recurring_rules WHERE next_date <= ? {where} ORDER BY next_date LIMIT ?""",
+                       [today, *params, limit]).fetchall()
+    rows, updates = [], []
+    for rule_id, user, amount, category, type, description, months, day, end, next_date in due:
+        last = min(today, end) if end else today
+        current = date.fromisoformat(next_date)
+        while current.isoformat() <= last:
+            rows.append((user, current.isoformat(), amount, category, type, description,
+                         occurrence_key(rule_id, current.isoformat())))
+            current = _advance(current, day, months)
+        updates.append((current.isoformat() if end is None or current.isoformat() <= end else None, rule_id))
+    inserted = get_backend().insert_transactions(conn, rows) if rows else 0
+    conn.executemany("UPDATE recurring_rules SET next_date = ? WHERE id = ?", updates)
+    return len(due), inserted
+
+# --- Monthly Rollup ---
+
+_ROLLUP_SOURCE = """
+    SELECT username, substr(date, 1, 7) AS month, COALESCE(type, '') AS type, COALESCE(category, '') AS category,
+           SUM(COALESCE(amount, 0)) AS total, COUNT(*) AS count
+    FROM transactions
+    WHERE username IS NOT NULL {where}
+    GROUP BY 1, 2, 3, 4
+"""
+
+def _rollup_filter(username):
+    return ("AND username = ?", (username,)) if username is not None else ("", ())
+
+def rebuild_monthly_summary(username=None, conn=None, archived=True):
+    """Recomputes monthly_summary from transactions and archived_summary, for one user or everyone."""
+    if conn is None:
+        with get_connection() as conn:
+            return rebuild_monthly_summary(username, conn, archived)
+    where, params = _rollup_filter(username)
+    conn.execute(f"DELETE FROM monthly_summary WHERE 1 = 1 {where}", params)
+    conn.execute(f"INSERT INTO monthly_summary (username, month, type, category, total, count) "
+                 f"{_ROLLUP_SOURCE.format(where=where)}", params)
+    if archived:
+        add_rollup_rows(conn, "monthly_summary", f"SELECT username, month, type, category, total, count "
+                                                 f"FROM archived_summary WHERE 1 = 1 {where}", params)
+
+def add_rollup_rows(conn, table, source, params=()):
+    """Adds the (username, month, type, category, total, count) rows `source` selects to a rollup table."""
+    conn.execute(f"""INSERT INTO {table} (username, month, type, category, total, count) {source}
+                     ON CONFLICT(username, month, type, category) DO UPDATE SET
+                         total = {table}.total + excluded.total,
+                         count = {table}.count + excluded.count""", params)
+
+def verify_monthly_summary(username=None, tolerance=0.005):
+    """Returns the rollup rows that disagree with transactions plus archived_summary (empty when consistent)."""
+    import pandas as pd
+    where, params = _rollup_filter(username)
+    keys = ['username', 'month', 'type', 'category']
+    with get_connection() as conn:
+        expected = pd.concat([
+            pd.read_sql_query(_ROLLUP_SOURCE.format(where=where), conn, params=params),
+            pd.read_sql_query(f"SELECT username, month, type, category, total, count "
+                              f"FROM archived_summary WHERE 1 = 1 {where}", conn, params=params),
+        ]).groupby(keys, as_index=False).sum()
+        actual = pd.read_sql_query(f"SELECT * FROM monthly_summary WHERE 1 = 1 {where}", conn, params=params)
+    merged = expected.merge(actual, on=keys, how='outer', suffixes=('_expected', '_actual'))
+    merged = merged.fillna({'total_expected': 0, 'total_actual': 0, 'count_expected': 0, 'count_actual': 0})
+    bad = ((merged['total_expected'] - merged['total_actual']).abs() > tolerance) | \
+          (merged['count_expected'] != merged['count_actual'])
+    return merged[bad].reset_index(drop=True)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Budget Optimizer database maintenance")
+    parser.add_argument("--db", default=DB_NAME, help="database file (default: %(default)s)")
+    parser.add_argument("--url", default=DATABASE_URL, help="postgresql:// URL, instead of --db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="create tables and apply pending migrations")
+    for name, text in [("verify-rollup", "compare monthly_summary with transactions"),
+                       ("rebuild-rollup", "recompute monthly_summary from transactions")]:
+        cmd = commands.add_parser(name, help=text)
+        cmd.add_argument("--user", help="limit to one username")
+    args = parser.parse_args()
+
+    DB_NAME = args.db
+    DATABASE_URL = args.url
+    init_db()
+    if args.command == "migrate":
+        with get_connection() as conn:
+            print(f"{get_backend().name} schema at version {get_backend().schema_version(conn)}")
+    elif args.command == "verify-rollup":
+        mismatches = verify_monthly_summary(args.user)
+        if mismatches.empty:
+            print("monthly_summary is consistent")
+        else:
+            print(mismatches.to_string(index=False))
+            raise SystemExit(1)
+    elif args.command == "rebuild-rollup":
+        rebuild_monthly_summary(args.user)
+        print("monthly_summary rebuilt")
@@ -0,0 +1,118 @@
+"""CSV and PDF exports built on demand in background worker processes.
+
+Nothing is generated while the Reports page renders. The download buttons
+hand Streamlit a callable that runs on click and asks request() for the
+file. request() starts a job in a small process pool, or reuses the one
+already built for the user's current data version. Workers stream rows
+from a database cursor in chunks and write the file atomically into
+EXPORT_DIR, so a long history neither inflates the server process nor holds
+the GIL that other sessions need. EXPORT_DIR and the files in it are
+accessible to the server's user only.
+"""
+import glob
+import hashlib
+import multiprocessing
+import os
+import stat
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import aggregates
+import database as db
+import optimizer
+import perf
+
+EXPORT_DIR = os.environ.get("BUDGET_EXPORT_DIR", os.path.join(tempfile.gettempdir(), "budget-exports"))
+EXPORT_WORKERS = 2
+CHUNK_ROWS = 5_000
+
+KINDS = {"csv": "text/csv", "pdf": "application/pdf"}
+
+def _private_dir(path):
+    """Creates `path` readable by this user only, or checks that an existing one is theirs and makes it so."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # The default lives in the shared temp directory, where anyone could have created it first
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{path} is not a directory owned by this user; set BUDGET_EXPORT_DIR")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+def export_path(username, version, kind):
+    digest = hashlib.sha1(username.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(EXPORT_DIR, f"{digest}-v{version}.{kind}")
+
+# --- Writers (run inside worker processes) ---
+
+def write_csv(username, name, path):
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        for i, chunk in enumerate(db.iter_transactions(username, chunksize=CHUNK_ROWS)):
+            chunk.to_csv(fh, header=(i == 0), index=False)
+    return path
+
+def write_pdf(username, name, path):
+    income, expense, total_rows = aggregates.lifetime_totals(username)
+    chunks = db.iter_transactions(username, columns=["date", "category", "type", "amount"], order="desc",
+                                  limit=optimizer.PDF_MAX_ROWS, chunksize=CHUNK_ROWS)
+    return optimizer.generate_pdf_report(chunks, name, income, expense, total_rows=total_rows, path=path)
+
+WRITERS = {"csv": write_csv, "pdf": write_pdf}
+
+def _build(kind, db_name, username, name, path):
+    db.DB_NAME = db_name
+    # Exports hold a user's whole history: owner-only files in an owner-only directory
+    os.umask(0o077)     # This process only ever writes exports
+    _private_dir(os.path.dirname(path))
+    partial = f"{path}.{os.getpid()}.part"
+    try:
+        WRITERS[kind](username, name, partial)
+        os.chmod(partial, 0o600)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    # Older versions of this export can no longer be requested
+    stem, _ = path.rsplit("-v", 1)
+    for stale in glob.glob(f"{stem}-v*.{kind}"):
+        if stale != path:
+            os.remove(stale)
+    return path
+
+# --- Job management (server process) ---
+
+_executor = None
+_jobs = {}          # (username, version, kind) -> Future resolving to the file path
+_lock = threading.Lock()
+
+def _pool():
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the Streamlit server is multi-threaded
+        _executor = ProcessPoolExecutor(EXPORT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def request(username, kind, name=""):
+    """Returns a Future for the user's `kind` export at the current data version."""
+    version = db.data_version(username)
+    key = (username, version, kind)
+    with _lock:
+        job = _jobs.get(key)
+        if job is None or (job.done() and job.exception() is not None):
+            path = export_path(username, version, kind)
+            _private_dir(EXPORT_DIR)    # Also closes off files left by earlier versions
+            if os.path.exists(path):
+                job = Future()
+                job.set_result(path)
+            else:
+                job = _pool().submit(_build, kind, db.DB_NAME, username, name, path)
+            for old in [k for k in _jobs if k[0] == username and k[2] == kind and k[1] < version]:
+                del _jobs[old]
+            _jobs[key] = job
+    return job
+
+@perf.timed('exports.read_export')
+def read_export(username, kind, name="", timeout=None):
+    """Waits for the export to finish and returns its bytes."""
+    with open(request(username, kind, name).result(timeout), "rb") as fh:
+        return fh.read()
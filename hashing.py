@@ -0,0 +1,52 @@
+"""bcrypt password hashing on a bounded pool of worker processes.
+
+Hashing is deliberately slow. Running it in at most HASH_WORKERS
+processes keeps a burst of logins from taking every core the Streamlit
+server needs to render dashboards. This module imports nothing heavy, so
+pool workers start quickly.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import perf
+
+BCRYPT_ROUNDS = int(os.environ.get("BUDGET_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("BUDGET_HASH_WORKERS", "2"))
+HASH_NICE = int(os.environ.get("BUDGET_HASH_NICE", "10"))     # Rendering wins when the CPU is contended
+
+def _init_worker():
+    if HASH_NICE and hasattr(os, "nice"):
+        os.nice(HASH_NICE)
+
+# bcrypt is only imported by the worker processes that run these
+
+def _hashpw(password, rounds):
+    import bcrypt
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _checkpw(password, stored):
+    import bcrypt
+    return bcrypt.checkpw(password, stored)
+
+_executor = None
+_lock = threading.Lock()
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker)
+        return _executor
+
+@perf.timed('hashing.hash_password')
+def hash_password(password, rounds=None):
+    return _pool().submit(_hashpw, password.encode('utf-8'), rounds or BCRYPT_ROUNDS).result()
+
+@perf.timed('hashing.check_password')
+def check_password(password, stored):
+    if isinstance(stored, str):
+        stored = stored.encode('utf-8')
+    return _pool().submit(_checkpw, password.encode('utf-8'), stored).result()
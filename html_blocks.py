@@ -0,0 +1,230 @@
+"""HTML blocks the pages render with st.markdown(unsafe_allow_html=True).
+
+Each st.markdown call is one delta message to the browser, and every
+rerun sends all of them again. Lists that grow with the user's data
+(suggestions, budget progress bars, recent activity) are therefore built
+here as one block each, from whole columns at a time, with styling in
+STYLESHEET rather than repeated inline on every row. Text that comes
+from user data is escaped.
+
+Streamlit rebuilds the page on every rerun, so the stylesheet has to be
+sent every time too; css() minifies it once per process.
+
+Only the standard library is imported at module level: the login page
+renders css() and must not load pandas.
+"""
+import functools
+import html
+import re
+
+STYLESHEET = """
+@import url('https://fonts.googleapis.com/css2?family=Poppins:wght@300;500;700&display=swap');
+
+html, body, [class*="css"] {
+    font-family: 'Poppins', sans-serif;
+}
+
+/* App Background */
+.stApp {
+    background: linear-gradient(135deg, #fdfbfb 0%, #ebedee 100%);
+}
+
+/* Sidebar Background */
+section[data-testid="stSidebar"] {
+    background: linear-gradient(180deg, #1A237E 0%, #0D47A1 100%);
+}
+
+/* --- FIX: Force Sidebar Text to White --- */
+section[data-testid="stSidebar"] * {
+    color: #ffffff !important;
+}
+
+/* Specific fix for Radio Button Text (Navigation) */
+div[data-testid="stSidebar"] label p {
+    font-size: 16px; 
+    font-weight: 500;
+}
+
+/* Custom Metric Cards */
+.metric-container {
+    background: linear-gradient(135deg, #ffffff, #f0f2f5);
+    border-radius: 15px;
+    padding: 20px;
+    box-shadow: 0 10px 20px rgba(0,0,0,0.05);
+    text-align: center;
+    transition: transform 0.3s ease;
+    border: 1px solid rgba(255,255,255,0.5);
+}
+.metric-container:hover {
+    transform: translateY(-5px);
+    box-shadow: 0 15px 25px rgba(0,0,0,0.1);
+}
+
+/* Specific Card Gradients */
+.card-income { border-bottom: 5px solid #00C853; }
+.card-expense { border-bottom: 5px solid #FF3D00; }
+.card-balance { border-bottom: 5px solid #2979FF; }
+
+.metric-label { font-size: 14px; font-weight: 500; color: #546E7A; text-transform: uppercase; letter-spacing: 1px; }
+.metric-value { font-size: 32px; font-weight: 700; color: #263238; margin: 10px 0; }
+.metric-delta { font-size: 14px; font-weight: 600; padding: 4px 8px; border-radius: 8px; display: inline-block;}
+
+.delta-pos { background-color: #E8F5E9; color: #2E7D32; }
+.delta-neg { background-color: #FFEBEE; color: #C62828; }
+
+/* Form & Container Styling */
+.form-container {
+    background-color: white;
+    padding: 30px;
+    border-radius: 20px;
+    box-shadow: 0 4px 15px rgba(0,0,0,0.05);
+}
+
+/* Styled Buttons */
+div.stButton > button {
+    background: linear-gradient(90deg, #2979FF 0%, #1565C0 100%);
+    color: white;
+    border: none;
+    padding: 10px 24px;
+    border-radius: 50px;
+    font-weight: 600;
+    box-shadow: 0 4px 10px rgba(41, 121, 255, 0.3);
+    transition: all 0.3s;
+}
+div.stButton > button:hover {
+    transform: scale(1.05);
+    box-shadow: 0 6px 15px rgba(41, 121, 255, 0.4);
+}
+
+/* Budget Progress Bar Styling */
+.progress-bar-bg {
+    background-color: #eee;
+    border-radius: 10px;
+    height: 20px;
+    width: 100%;
+    overflow: hidden;
+}
+.progress-bar-fill {
+    height: 100%;
+    text-align: center;
+    color: white;
+    font-size: 12px;
+    line-height: 20px;
+    transition: width 0.5s ease-in-out;
+}
+
+/* Lists built by the functions below: one block each, cards stacked inside */
+.suggestions, .budget-list, .recent-activity {
+    display: block;
+    margin: 0;
+}
+
+/* Dashboard suggestions */
+.suggestion {
+    padding: 15px;
+    border-radius: 10px;
+    margin-bottom: 10px;
+    border-left: 5px solid rgba(0,0,0,0.1);
+}
+.suggestion-icon { font-size: 18px; margin-right: 10px; }
+
+/* Budget Planner progress cards */
+.budget-card {
+    margin-bottom: 15px;
+    background: white;
+    padding: 15px;
+    border-radius: 10px;
+    box-shadow: 0 2px 5px rgba(0,0,0,0.05);
+}
+.budget-head {
+    display: flex;
+    justify-content: space-between;
+    margin-bottom: 5px;
+}
+
+/* Recent activity */
+.activity {
+    padding: 10px;
+    border-radius: 8px;
+    margin-bottom: 8px;
+    font-size: 14px;
+}
+.activity-income { background-color: #e8f5e9; }
+.activity-expense { background-color: #ffebee; }
+.activity-date { color: #666; }
+.activity-amount { float: right; font-weight: bold; }
+"""
+
+@functools.cache
+def css():
+    """STYLESHEET as a minified <style> block (comments and layout whitespace removed)."""
+    text = re.sub(r"/\*.*?\*/", "", STYLESHEET, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    # Spaces before ":" stay: in a selector "a :hover" differs from "a:hover"
+    text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+    text = re.sub(r":\s+", ":", text).replace(";}", "}")
+    return f"<style>{text.strip()}</style>"
+
+def _text(values):
+    """Escaped, single-line text of each value: a blank line would end the HTML block."""
+    return values.astype(str).map(html.escape).astype(str).str.replace(r"\s+", " ", regex=True)
+
+def _money(values):
+    return values.astype(float).map("₹{:,.0f}".format).astype(str)
+
+def _block(cells, css_class):
+    return f'<div class="{css_class}">' + "".join(cells) + "</div>"
+
+# --- Dashboard ---
+
+SUGGESTION_STYLES = [   # (word in the message, background, icon), first match wins
+    ("Insight", "#D1C4E9", "💡"),
+    ("Breach", "#FFCDD2", "🚨"),
+    ("Forecast", "#FFCDD2", "📈"),
+    ("Warning", "#FFCDD2", "✅"),
+]
+SUGGESTION_DEFAULT = ("#C8E6C9", "✅")
+_EMOJI = re.compile("⚠️|🚨|✅|💡|📈")
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+
+def suggestions(messages):
+    """The optimizer's suggestions as one block of colored cards."""
+    cells = []
+    for message in messages:
+        color, icon = next(((color, icon) for word, color, icon in SUGGESTION_STYLES if word in message),
+                           SUGGESTION_DEFAULT)
+        text = _BOLD.sub(r"<strong>\1</strong>", html.escape(_EMOJI.sub("", message)).strip())
+        cells.append(f'<div class="suggestion" style="background-color: {color};">'
+                     f'<span class="suggestion-icon">{icon}</span> {text}</div>')
+    return _block(cells, "suggestions")
+
+# --- Budget Planner ---
+
+BAR_COLORS = [(100, "#F44336"), (75, "#FFC107")]    # (above % of the limit, color), checked in order
+BAR_DEFAULT = "#4CAF50"
+
+def budget_progress(budgets):
+    """A progress bar per row of aggregates.Summary.budgets (category, limit_amount, amount)."""
+    import numpy as np
+
+    limit = budgets['limit_amount'].astype(float)
+    spent = budgets['amount'].astype(float)
+    pct = (spent * 100 / limit.where(limit > 0)).fillna(0)
+    color = np.select([pct > threshold for threshold, _ in BAR_COLORS], [c for _, c in BAR_COLORS], BAR_DEFAULT)
+    cells = ('<div class="budget-card"><div class="budget-head"><strong>' + _text(budgets['category'])
+             + '</strong><span>' + _money(spent) + ' / ' + _money(limit) + '</span></div>'
+             + '<div class="progress-bar-bg"><div class="progress-bar-fill" style="width: '
+             + pct.clip(upper=100).round(1).astype(str) + '%; background-color: ' + color + ';">'
+             + pct.round().astype(int).astype(str) + '%</div></div></div>')
+    return _block(cells, "budget-list")
+
+# --- Add Transaction ---
+
+def recent_activity(recent):
+    """One card per row of aggregates.recent_transactions()."""
+    income = recent['type'] == "Income"
+    cells = ('<div class="activity ' + income.map({True: "activity-income", False: "activity-expense"})
+             + '"><strong>' + income.map({True: "💰", False: "🛒"}) + ' ' + _text(recent['category'])
+             + '</strong><br><span class="activity-date">' + recent['date'].dt.strftime("%Y-%m-%d")
+             + '</span><span class="activity-amount">₹' + recent['amount'].astype(str) + '</span></div>')
+    return _block(cells, "recent-activity")
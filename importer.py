@@ -0,0 +1,305 @@
+"""Streaming import of bank exports (CSV and OFX/QFX) into the transactions table.
+
+Files are read incrementally and written in chunks of CHUNK_SIZE rows, one
+database.insert_transactions() call and one commit per chunk, so memory
+stays flat regardless of file size. Every row gets a dedupe_key (a hash of its normalized content
+plus its occurrence number, or the bank's FITID for OFX); the unique
+(username, dedupe_key) index makes re-importing an overlapping statement a
+no-op for rows already present.
+
+    python importer.py statement.csv --user someone@example.com
+"""
+import csv
+import functools
+import hashlib
+import io
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import database as db
+
+CHUNK_SIZE = 50_000
+MAX_ERRORS = 20                 # Rejected rows reported back in detail
+ORDINAL_WINDOW = 100_000        # Distinct rows remembered when numbering identical ones
+
+TYPES = ("Income", "Expense")
+DEFAULT_CATEGORY = "Other"
+DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d %b %Y", "%d-%b-%Y", "%Y/%m/%d", "%Y%m%d")
+
+# Lower-cased header names recognised for each field
+COLUMN_ALIASES = {
+    "date": ("date", "transaction date", "txn date", "posted date", "posting date", "value date"),
+    "amount": ("amount", "transaction amount", "amount (inr)", "value"),
+    "debit": ("debit", "withdrawal", "withdrawals", "withdrawal amt.", "debit amount", "dr"),
+    "credit": ("credit", "deposit", "deposits", "deposit amt.", "credit amount", "cr"),
+    "description": ("description", "narration", "details", "particulars", "memo", "payee", "remarks"),
+    "category": ("category",),
+    "type": ("type", "transaction type"),
+}
+
+@dataclass
+class ImportResult:
+    read: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)   # (line, message) for the first MAX_ERRORS rejects
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.seconds if self.seconds else 0.0
+
+# --- Normalization ---
+
+@functools.lru_cache(maxsize=65536)
+def parse_date(value, formats=DATE_FORMATS):
+    value = value.strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    # OFX timestamps: YYYYMMDD[HHMMSS[.XXX]][[TZ]]
+    if len(value) >= 8 and value[:8].isdigit():
+        return datetime.strptime(value[:8], "%Y%m%d").date().isoformat()
+    raise ValueError(f"unrecognised date {value!r}")
+
+_NUMBER_JUNK = re.compile(r"[^\d.\-()]")
+
+def parse_amount(value):
+    try:
+        amount = float(value)
+    except ValueError:
+        text = _NUMBER_JUNK.sub("", value.strip())
+        if text.startswith("(") and text.endswith(")"):
+            text = "-" + text[1:-1]
+        if text in ("", "-", "."):
+            raise ValueError(f"unrecognised amount {value!r}")
+        amount = float(text)
+    # float() also accepts "nan", "inf" and overflows like "1e400"
+    if not math.isfinite(amount):
+        raise ValueError(f"unrecognised amount {value!r}")
+    return amount
+
+def normalize(record):
+    """Turns a raw {field: text} record into (date, amount, category, type, description)."""
+    if record.get("amount"):
+        amount = parse_amount(record["amount"])
+    else:
+        debit = parse_amount(record["debit"]) if record.get("debit") else 0.0
+        credit = parse_amount(record["credit"]) if record.get("credit") else 0.0
+        if not debit and not credit:
+            raise ValueError("missing amount")
+        amount = credit - abs(debit)
+    if not record.get("date"):
+        raise ValueError("missing date")
+
+    kind = (record.get("type") or "").strip().title()
+    if kind not in TYPES:
+        kind = "Income" if amount > 0 else "Expense"
+    category = (record.get("category") or "").strip() or DEFAULT_CATEGORY
+    description = " ".join((record.get("description") or "").split())
+    return parse_date(record["date"]), round(abs(amount), 2), category, kind, description
+
+class _Ordinals:
+    """Numbers identical rows 0, 1, 2... so genuine repeats get distinct keys.
+
+    Only the most recent ORDINAL_WINDOW distinct rows are remembered, which
+    covers statements exported in date order without growing with file size.
+    """
+
+    def __init__(self, window=ORDINAL_WINDOW):
+        self.window = window
+        self._seen = OrderedDict()
+
+    def next(self, content):
+        n = self._seen.pop(content, -1) + 1
+        self._seen[content] = n
+        if len(self._seen) > self.window:
+            self._seen.popitem(last=False)
+        return n
+
+def dedupe_key(row, ordinal=0, external_id=None):
+    """Stable identity of an imported row: its date followed by a content hash.
+
+    Leading with the date keeps the unique index's inserts clustered for
+    date-ordered statements instead of scattered across the whole B-tree.
+    """
+    if external_id:
+        content = f"id|{external_id}"
+    else:
+        content = "|".join([f"{row[1]:.2f}", row[2], row[3], row[4].lower(), str(ordinal)])
+    return f"{row[0]}:{hashlib.blake2b(content.encode('utf-8'), digest_size=10).hexdigest()}"
+
+# --- Readers ---
+# Each reader yields (line_number, record) with record keys from COLUMN_ALIASES.
+
+class _CountingReader(io.RawIOBase):
+    """Wraps a binary stream and counts bytes consumed, for progress reporting."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.bytes_read += len(data)
+        return len(data)
+
+def _header_map(header):
+    mapping = {}
+    for index, name in enumerate(header):
+        name = name.strip().lower()
+        for key, aliases in COLUMN_ALIASES.items():
+            if name in aliases and key not in mapping:
+                mapping[key] = index
+    if "date" not in mapping or not ({"amount", "debit", "credit"} & mapping.keys()):
+        raise ValueError(f"CSV header needs a date and an amount (or debit/credit) column, got {header}")
+    return mapping
+
+def read_csv(text_stream, delimiter=None):
+    sample = text_stream.read(4096)
+    dialect = csv.excel
+    if delimiter is None:
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            pass
+    reader = csv.reader(_chain(sample, text_stream), dialect, **({"delimiter": delimiter} if delimiter else {}))
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("empty file")
+    mapping = list(_header_map(header).items())
+    width = max(i for _, i in mapping) + 1
+    for row in reader:
+        if len(row) < width:
+            if not any(cell.strip() for cell in row):
+                continue
+            row += [""] * (width - len(row))
+        yield reader.line_num, {key: row[i] for key, i in mapping}
+
+def _chain(head, stream):
+    """Re-attaches the sniffed sample to the front of a line iterator."""
+    yield from io.StringIO(head + stream.readline(), newline="")
+    yield from stream
+
+_OFX_BLOCK = re.compile(r"<STMTTRN>(.*?)</STMTTRN>", re.S | re.I)
+_OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+
+def read_ofx(text_stream, block_size=1 << 16):
+    buffer = ""
+    count = 0
+    while True:
+        data = text_stream.read(block_size)
+        buffer += data
+        last = 0
+        for match in _OFX_BLOCK.finditer(buffer):
+            count += 1
+            fields = {tag.upper(): value.strip() for tag, value in _OFX_FIELD.findall(match.group(1))}
+            record = {
+                "date": fields.get("DTPOSTED", ""),
+                "amount": fields.get("TRNAMT", ""),
+                "description": " ".join(filter(None, [fields.get("NAME"), fields.get("MEMO")])),
+                "fitid": fields.get("FITID", ""),
+            }
+            yield count, record
+            last = match.end()
+        buffer = buffer[last:]
+        if not data:
+            return
+
+READERS = {"csv": read_csv, "ofx": read_ofx, "qfx": read_ofx}
+
+def detect_format(filename):
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Unsupported file type .{extension} (expected CSV, OFX or QFX)")
+    return extension
+
+# --- Import ---
+
+def _flush(batch, result):
+    inserted = db.insert_transactions(batch)
+    result.inserted += inserted
+    result.duplicates += len(batch) - inserted
+    batch.clear()
+
+def import_file(binary_stream, username, fmt="csv", chunk_size=CHUNK_SIZE,
+                encoding="utf-8-sig", total_bytes=None, progress=None):
+    """Streams a CSV/OFX file into `username`'s transactions.
+
+    `progress(fraction, result)` is called after every chunk; `fraction` is
+    the share of `total_bytes` consumed, or None when the size is unknown.
+    """
+    start = time.perf_counter()
+    result = ImportResult()
+    counter = _CountingReader(binary_stream)
+    text = io.TextIOWrapper(io.BufferedReader(counter, 1 << 20), encoding=encoding, errors="replace", newline="")
+    ordinals = _Ordinals()
+    batch = []
+
+    for line, record in READERS[fmt](text):
+        result.read += 1
+        try:
+            row = normalize(record)
+        except ValueError as exc:
+            result.rejected += 1
+            if len(result.errors) < MAX_ERRORS:
+                result.errors.append((line, str(exc)))
+            continue
+        fitid = record.get("fitid")
+        key = dedupe_key(row, 0 if fitid else ordinals.next(row), fitid)
+        batch.append((username, *row, key))
+        if len(batch) >= chunk_size:
+            _flush(batch, result)
+            if progress:
+                progress(counter.bytes_read / total_bytes if total_bytes else None, result)
+
+    if batch:
+        _flush(batch, result)
+    result.seconds = time.perf_counter() - start
+    if progress:
+        progress(1.0, result)
+    return result
+
+def import_path(path, username, fmt=None, **kwargs):
+    fmt = fmt or detect_format(path)
+    with open(path, "rb") as fh:
+        return import_file(fh, username, fmt, total_bytes=os.path.getsize(path), **kwargs)
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Import a bank export into Budget Optimizer")
+    parser.add_argument("path", help="CSV, OFX or QFX file")
+    parser.add_argument("--user", required=True, help="username to import into")
+    parser.add_argument("--format", choices=sorted(READERS), help="override detection by file extension")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    args = parser.parse_args()
+
+    db.DB_NAME = args.db
+    db.init_db()
+
+    def report(fraction, result):
+        done = f"{fraction:6.1%}" if fraction is not None else "   ..."
+        print(f"\r{done}  read {result.read:,}  inserted {result.inserted:,}  "
+              f"duplicates {result.duplicates:,}  rejected {result.rejected:,}", end="", file=sys.stderr)
+
+    result = import_path(args.path, args.user, args.format, chunk_size=args.chunk_size, progress=report)
+    print(file=sys.stderr)
+    for line, message in result.errors:
+        print(f"line {line}: {message}", file=sys.stderr)
+    print(f"Imported {result.inserted:,} of {result.read:,} rows in {result.seconds:.2f}s "
+          f"({result.rows_per_second:,.0f} rows/s)")
@@ -0,0 +1,78 @@
+"""Runs the app as several Streamlit workers sharing one database.
+
+Starts the writer service (writer.py) and then --workers Streamlit
+servers on consecutive ports, all pointed at the same database file and
+writer. Workers share nothing but the database:
+- login sessions are validated from the sessions table;
+- cached aggregates are keyed on the per-user data version that every
+  write bumps, so a write made through one worker invalidates the others;
+- reads go straight to SQLite (WAL), so they scale with the worker count.
+
+Put a load balancer with sticky sessions in front of the ports. A
+Streamlit session lives on one websocket, and so on one worker. The
+workers take the client address from the X-Forwarded-For header the
+balancer appends (BUDGET_TRUSTED_PROXIES, 1 by default here), so the
+per-address login limit is not shared by every user.
+
+The writer's key (BUDGET_WRITER_AUTHKEY) is generated for each run
+unless set. A --writer-address other machines can reach requires
+setting it explicitly.
+
+    python launcher.py --workers 4 --port 8501
+"""
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+import writer
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--port", type=int, default=8501, help="first worker port")
+    parser.add_argument("--db", default=os.environ.get("BUDGET_DB", "budget.db"))
+    parser.add_argument("--writer-address", default="127.0.0.1:8500")
+    args = parser.parse_args()
+    if not writer.is_local(args.writer_address) and not os.environ.get("BUDGET_WRITER_AUTHKEY"):
+        parser.error(f"--writer-address {args.writer_address} is reachable from other machines; "
+                     "set BUDGET_WRITER_AUTHKEY to a random secret first")
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ,
+               BUDGET_DB=os.path.abspath(args.db),
+               BUDGET_WRITER_ADDRESS=args.writer_address,
+               BUDGET_WRITER_AUTHKEY=os.environ.get("BUDGET_WRITER_AUTHKEY") or secrets.token_hex(16),
+               # The load balancer below sets X-Forwarded-For; the login limits read the client from it
+               BUDGET_TRUSTED_PROXIES=os.environ.get("BUDGET_TRUSTED_PROXIES", "1"))
+    writer.AUTHKEY = env["BUDGET_WRITER_AUTHKEY"].encode("utf-8")
+
+    processes = [subprocess.Popen([sys.executable, os.path.join(here, "writer.py"),
+                                   "--db", env["BUDGET_DB"], "--address", args.writer_address], env=env, cwd=here)]
+    try:
+        writer.wait_ready(args.writer_address)
+        for i in range(args.workers):
+            port = args.port + i
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "streamlit", "run", os.path.join(here, "app.py"),
+                 "--server.port", str(port), "--server.headless", "true"], env=env, cwd=here))
+            print(f"worker {i + 1}: http://localhost:{port}", file=sys.stderr)
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+        print("A process exited; shutting down", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in reversed(processes):
+            p.terminate()
+        for p in processes:
+            try:
+                p.wait(10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+    return max((p.returncode or 0) for p in processes)
+
+if __name__ == "__main__":
+    sys.exit(main())
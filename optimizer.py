@@ -1,50 +1,394 @@
+import calendar
+import functools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, timedelta
+import numpy as np
 import pandas as pd
-from fpdf import FPDF
-import base64
 
-def generate_suggestions(df, budget_df):
+import aggregates
+import cache
+import perf
+
+# --- Suggestion Rules ---
+# A rule reads the shared aggregates.Summary and returns a list of messages.
+# Rules never touch raw transactions, so adding one adds no pass over them.
+
+RULES = []
+RULE_TIMINGS = {}   # rule name -> {"calls": n, "seconds": total, "last": seconds}
+_timings_lock = threading.Lock()
+
+SAVINGS_TARGET = 20         # % of income
+NEAR_LIMIT = 0.9            # Share of a budget that triggers a warning
+SPIKE_RATIO = 1.5           # This month vs the trailing average
+SPIKE_MIN_AMOUNT = 1000     # Ignore spikes smaller than this (₹)
+SPIKE_HISTORY = 3           # Months in the trailing average
+ANOMALY_Z = 3.5             # Robust z-score (median/MAD) for an unusual day
+ANOMALY_RECENT_DAYS = 7
+
+def rule(fn):
+    """Registers a suggestion rule; rules run in registration order."""
+    RULES.append(fn)
+    return fn
+
+@rule
+def savings_rate(summary):
+    rate = summary.savings_rate
+    if rate < SAVINGS_TARGET:
+        return [f"⚠️ **Low Savings Rate**: You are saving only {rate:.1f}%. Aim for at least {SAVINGS_TARGET}%."]
+    return [f"✅ **Good Job**: Your savings rate is healthy at {rate:.1f}%."]
+
+@rule
+def budget_breach(summary):
+    b = summary.budgets
+    over = b[b['amount'] > b['limit_amount']]
+    return [f"🚨 **Budget Breach**: You exceeded your **{cat}** budget by ₹{excess:,.2f}."
+            for cat, excess in zip(over['category'], over['amount'] - over['limit_amount'])]
+
+@rule
+def near_limit(summary):
+    b = summary.budgets
+    near = b[(b['amount'] <= b['limit_amount']) & (b['amount'] > b['limit_amount'] * NEAR_LIMIT)]
+    return [f"⚠️ **Warning**: You are near the limit for **{cat}**." for cat in near['category']]
+
+@rule
+def top_category(summary):
+    if summary.by_category.empty:
+        return []
+    top_cat = summary.by_category.iloc[0]
+    return [f"💡 **Insight**: Your highest spending is on **{top_cat['category']}** (₹{top_cat['amount']:,.2f}). Try to reduce this by 10% to save ₹{top_cat['amount']*0.1:,.2f}."]
+
+@rule
+def month_over_month(summary):
+    expenses = summary.rollup[summary.rollup['type'] == 'Expense']
+    if expenses.empty:
+        return []
+    by_month = expenses.pivot_table(index='category', columns='month', values='amount', aggfunc='sum', fill_value=0,
+                                    observed=True)
+    previous = [m for m in by_month.columns if m < summary.month][-SPIKE_HISTORY:]
+    if summary.month not in by_month.columns or not previous:
+        return []
+    current = by_month[summary.month]
+    baseline = by_month[previous].mean(axis=1)
+    spikes = by_month[(current > baseline * SPIKE_RATIO) & (current - baseline > SPIKE_MIN_AMOUNT) & (baseline > 0)]
+    change = (current[spikes.index] / baseline[spikes.index] - 1) * 100
+    return [f"⚠️ **Warning**: **{cat}** spending is up {pct:.0f}% on your {len(previous)}-month average."
+            for cat, pct in change.sort_values(ascending=False).items()]
+
+@rule
+def recurring_charges(summary):
+    recurring = summary.recurring.head(3)
+    return [f"💡 **Insight**: **{desc}** (₹{amount:,.0f}) was charged in each of {months} recent months. Make sure you still need it."
+            for desc, amount, months in zip(recurring['description'], recurring['amount'], recurring['months'])]
+
+@rule
+def daily_anomaly(summary):
+    daily = summary.daily
+    if len(daily) < 14:
+        return []
+    amounts = daily['amount']
+    median = amounts.median()
+    mad = (amounts - median).abs().median()
+    if mad == 0:
+        return []
+    z = 0.6745 * (amounts - median) / mad
+    cutoff = (date.fromisoformat(daily['date'].iloc[-1]) - timedelta(days=ANOMALY_RECENT_DAYS - 1)).isoformat()
+    recent = daily['date'] >= cutoff
+    unusual = daily[(z > ANOMALY_Z) & recent]
+    return [f"⚠️ **Warning**: Unusual spending of ₹{amount:,.2f} on {day}, against a typical day of ₹{median:,.2f}."
+            for day, amount in zip(unusual['date'], unusual['amount'])]
+
+@perf.timed('optimizer.generate_suggestions')
+def generate_suggestions(summary):
+    """Runs every registered rule over an aggregates.Summary in one pass."""
     suggestions = []
-    
-    expenses = df[df['type'] == 'Expense']
-    income = df[df['type'] == 'Income']['amount'].sum()
-    total_expense = expenses['amount'].sum()
-    
-    # 1. Savings Rate Check
-    savings_rate = (income - total_expense) / income * 100 if income > 0 else 0
-    if savings_rate < 20:
-        suggestions.append(f"⚠️ **Low Savings Rate**: You are saving only {savings_rate:.1f}%. Aim for at least 20%.")
+    for fn in RULES:
+        start = time.perf_counter()
+        suggestions.extend(fn(summary))
+        elapsed = time.perf_counter() - start
+        with _timings_lock:
+            stats = RULE_TIMINGS.setdefault(fn.__name__, {"calls": 0, "seconds": 0.0, "last": 0.0})
+            stats["calls"] += 1
+            stats["seconds"] += elapsed
+            stats["last"] = elapsed
+        perf.record(f"optimizer.rule.{fn.__name__}", elapsed)
+    return suggestions
+
+# --- Forecasting ---
+# Month-end spend per category from the monthly rollup. Every category is
+# fitted at once: the history is a (categories x months) matrix and damped
+# Holt smoothing steps through its columns, so a fit costs one vectorized
+# pass per month of history whatever the number of categories. A seasonal
+# index (same calendar month vs the category's mean) scales the forecast
+# once two years of history exist.
+
+HISTORY_MONTHS = 36
+ALPHA = 0.5             # Level smoothing
+BETA = 0.2              # Trend smoothing
+PHI = 0.9               # Trend damping
+SEASONAL_MIN_MONTHS = 24
+SEASONAL_SHRINK = 0.5   # Pull seasonal factors halfway to 1 to damp noise
+INCOME = "Income"       # Row of the fit holding total income
+PACE_MIN_ROWS = 4       # Rows this month before a category with no history is projected at its pace
+
+@dataclass
+class HoltFit:
+    """Smoothing state after each month of `history`; rows are `labels`, columns `months`."""
+    labels: list
+    months: list
+    history: np.ndarray
+    level: np.ndarray
+    trend: np.ndarray
+
+    def resume(self, labels, months, history):
+        """Refits for new history, reusing every step before the first month that changed."""
+        if labels != self.labels or months[:1] != self.months[:1]:
+            return fit_holt(labels, months, history)
+        common = min(len(months), len(self.months))
+        changed = np.flatnonzero((history[:, :common] != self.history[:, :common]).any(axis=0))
+        start = int(changed[0]) if len(changed) else common
+        if start == len(months) == len(self.months):
+            return self
+        return fit_holt(labels, months, history, self, start)
+
+def fit_holt(labels, months, history, previous=None, start=0):
+    level = np.empty_like(history)
+    trend = np.empty_like(history)
+    if start == 0:
+        level[:, 0], trend[:, 0] = history[:, 0], 0.0
+        start = 1
     else:
-        suggestions.append(f"✅ **Good Job**: Your savings rate is healthy at {savings_rate:.1f}%.")
-
-    # 2. Budget Overrun Check
-    expense_sum = expenses.groupby('category')['amount'].sum().reset_index()
-    if not budget_df.empty:
-        merged = pd.merge(budget_df, expense_sum, on='category', how='left').fillna(0)
-        for _, row in merged.iterrows():
-            if row['amount'] > row['limit_amount']:
-                over = row['amount'] - row['limit_amount']
-                suggestions.append(f"🚨 **Budget Breach**: You exceeded your **{row['category']}** budget by ₹{over:,.2f}.")
-            elif row['amount'] > (row['limit_amount'] * 0.9):
-                suggestions.append(f"⚠️ **Warning**: You are near the limit for **{row['category']}**.")
-
-    # 3. High Spending Categories
-    if not expense_sum.empty:
-        top_cat = expense_sum.sort_values(by='amount', ascending=False).iloc[0]
-        suggestions.append(f"💡 **Insight**: Your highest spending is on **{top_cat['category']}** (₹{top_cat['amount']:,.2f}). Try to reduce this by 10% to save ₹{top_cat['amount']*0.1:,.2f}.")
+        level[:, :start], trend[:, :start] = previous.level[:, :start], previous.trend[:, :start]
+    for t in range(start, history.shape[1]):
+        expected = level[:, t - 1] + PHI * trend[:, t - 1]
+        level[:, t] = ALPHA * history[:, t] + (1 - ALPHA) * expected
+        trend[:, t] = BETA * (level[:, t] - level[:, t - 1]) + (1 - BETA) * PHI * trend[:, t - 1]
+    return HoltFit(list(labels), list(months), history, level, trend)
 
-    return suggestions
+def _months_before(month, count):
+    year, mon = map(int, month.split('-'))
+    index = year * 12 + mon - 1
+    return [f"{i // 12}-{i % 12 + 1:02d}" for i in range(index - count, index)]
 
-def generate_pdf_report(df, username):
-    pdf = FPDF()
+def _history(summary):
+    """(labels, months, matrix) of complete months before summary.month: income first, then expense categories."""
+    rollup = summary.rollup
+    past = rollup[rollup['month'] < summary.month]
+    if past.empty:
+        return [], [], np.zeros((0, 0))
+    first = max(past['month'].min(), _months_before(summary.month, HISTORY_MONTHS)[0])
+    months = [m for m in _months_before(summary.month, HISTORY_MONTHS) if m >= first]
+    past = past[past['month'] >= first]
+    label = past['category'].astype(str).where(past['type'] == 'Expense', INCOME)
+    matrix = (past[past['type'].isin(['Income', 'Expense'])]
+              .assign(label=label)
+              .pivot_table(index='label', columns='month', values='amount', aggfunc='sum', fill_value=0.0)
+              .reindex(columns=months, fill_value=0.0))
+    labels = [INCOME] + sorted(l for l in matrix.index if l != INCOME)
+    matrix = matrix.reindex(labels, fill_value=0.0)
+    return labels, months, matrix.to_numpy(dtype=float)
+
+def _seasonal(months, history, target):
+    if len(months) < SEASONAL_MIN_MONTHS:
+        return np.ones(len(history))
+    month_of_year = np.array([int(m[5:]) for m in months])
+    mean = history.mean(axis=1)
+    same = history[:, month_of_year == int(target[5:])]
+    if same.shape[1] == 0:
+        return np.ones(len(history))
+    ratio = np.divide(same.mean(axis=1), mean, out=np.ones(len(history)), where=mean > 0)
+    return 1 + SEASONAL_SHRINK * (ratio - 1)
+
+@dataclass
+class Forecast:
+    month: str
+    elapsed: float              # Share of the month already past, 0..1
+    income: float               # Expected income for the whole month
+    by_category: pd.DataFrame   # category, spent, forecast: expected month-end expense, largest first
+
+    @property
+    def expense(self):
+        return float(self.by_category['forecast'].sum())
+
+def forecast(summary, today=None, fit=None):
+    """Forecasts month-end income and spend per category for summary.month.
+
+    The model predicts each category's month total, so the forecast is
+    that total, or the month-to-date amount once spending has passed it.
+    A rent or salary paid on the 1st is then not counted again for the
+    rest of the month. A category with no history is projected at its
+    month-to-date pace only when PACE_MIN_ROWS rows make up that pace;
+    fewer, likely one-off payments are taken as the month's total.
+    `fit` is an earlier HoltFit to resume from. Returns (Forecast, HoltFit).
+    """
+    today = today or date.today()
+    year, mon = map(int, summary.month.split('-'))
+    days = calendar.monthrange(year, mon)[1]
+    if (year, mon) < (today.year, today.month):
+        elapsed = 1.0
+    elif (year, mon) > (today.year, today.month):
+        elapsed = 0.0
+    else:
+        elapsed = today.day / days
+
+    labels, months, history = _history(summary)
+    if labels:
+        fit = fit.resume(labels, months, history) if fit is not None else fit_holt(labels, months, history)
+        model = np.maximum(fit.level[:, -1] + PHI * fit.trend[:, -1], 0) * _seasonal(months, history, summary.month)
+    else:
+        fit, model = None, np.zeros(0)
+    expected = dict(zip(labels, model))
+
+    current = summary.rollup[summary.rollup['month'] == summary.month]
+    label = current['category'].astype(str).where(current['type'] == 'Expense', INCOME)
+    rows = current.groupby(label)['count'].sum()
+
+    def month_total(labels, spent):
+        modelled = np.array([expected.get(l, np.nan) for l in labels], dtype=float)
+        paced = rows.reindex(labels, fill_value=0).to_numpy() >= PACE_MIN_ROWS
+        pace = np.where(paced, spent / elapsed, spent) if elapsed > 0 else spent
+        return np.maximum(spent, np.where(np.isnan(modelled), pace, modelled))
+
+    spent = summary.by_category.set_index(summary.by_category['category'].astype(str))['amount']
+    categories = sorted(set(spent.index) | (set(labels) - {INCOME}))
+    spent = spent.reindex(categories, fill_value=0.0).to_numpy(dtype=float)
+    by_category = pd.DataFrame({'category': categories, 'spent': spent,
+                                'forecast': month_total(categories, spent)})
+    income = month_total([INCOME], np.array([summary.income], dtype=float))[0]
+    return Forecast(summary.month, elapsed,
+                    float(income),
+                    by_category.sort_values('forecast', ascending=False, ignore_index=True)), fit
+
+MAX_FITS = 1024
+_fits = OrderedDict()       # username -> latest HoltFit, refitted incrementally
+_fits_lock = threading.Lock()
+
+@cache.cached('forecast')
+@perf.timed('optimizer.forecast_for')
+def forecast_for(username, month):
+    """forecast() for the user's current data, resuming from their previous fit."""
+    summary = aggregates.summarize(username, month)
+    with _fits_lock:
+        previous = _fits.get(username)
+    result, fit = forecast(summary, fit=previous)
+    if fit is not None:
+        with _fits_lock:
+            _fits[username] = fit
+            _fits.move_to_end(username)
+            while len(_fits) > MAX_FITS:
+                _fits.popitem(last=False)
+    return result
+
+# --- Budget Allocation ---
+# Limits that leave a target share of income unspent. Each category's limit
+# is its forecast scaled by one common factor s and clipped to its
+# [min, max] range. Cuts then fall in proportion to expected spend, which
+# minimizes sum((limit - forecast)^2 / forecast) subject to the total. The
+# clipped total is piecewise linear in s and changes slope only where a
+# category hits a bound, so s is found exactly by interpolating between
+# those breakpoints. This is a handful of array operations, even for
+# hundreds of categories.
+
+@dataclass
+class BudgetPlan:
+    target_rate: float          # Savings rate asked for, %
+    savings_rate: float         # Savings rate the limits give if spending follows them, %
+    feasible: bool              # False when the minimums alone exceed the allowed spend
+    allowed: float              # Income minus the targeted savings
+    limits: pd.DataFrame        # category, forecast, spent, min, max, limit
+
+@perf.timed('optimizer.allocate')
+def allocate(forecast, target_rate=SAVINGS_TARGET, minimums=None, maximums=None):
+    """Solves for per-category limits meeting `target_rate` (% of forecast income).
+
+    `minimums`/`maximums` map categories to bounds. A limit never goes
+    below what is already spent this month, and a category with no
+    maximum can be given up to its forecast.
+    """
+    frame = forecast.by_category
+    need = frame['forecast'].to_numpy(dtype=float)
+    spent = frame['spent'].to_numpy(dtype=float)
+    low = np.maximum(frame['category'].map(minimums or {}).fillna(0).to_numpy(dtype=float), spent)
+    high = frame['category'].map(maximums or {}).fillna(np.inf).to_numpy(dtype=float)
+    high = np.maximum(np.minimum(high, np.maximum(need, low)), low)
+    allowed = max(forecast.income * (1 - target_rate / 100), 0.0)
+
+    def total(scale):
+        return np.clip(np.multiply.outer(scale, need), low, high).sum(axis=-1)
+
+    if low.sum() >= allowed:
+        limits = low
+    elif high.sum() <= allowed:
+        limits = high
+    else:
+        positive = need > 0
+        breakpoints = np.unique(np.concatenate([[0.0], low[positive] / need[positive],
+                                                high[positive & np.isfinite(high)] / need[positive & np.isfinite(high)]]))
+        totals = total(breakpoints)
+        scale = np.interp(allowed, totals, breakpoints)
+        limits = np.clip(scale * need, low, high)
+
+    income = forecast.income
+    rate = (income - limits.sum()) / income * 100 if income > 0 else 0.0
+    return BudgetPlan(target_rate, float(rate), bool(low.sum() <= allowed + 0.005), float(allowed),
+                      frame.assign(min=low, max=high, limit=limits))
+
+@rule
+def forecast_overrun(summary):
+    result, _ = forecast(summary)
+    if result.elapsed >= 1 or summary.budgets.empty:
+        return []
+    b = summary.budgets.merge(result.by_category[['category', 'forecast']], on='category')
+    over = b[(b['forecast'] > b['limit_amount']) & (b['amount'] <= b['limit_amount'])]
+    return [f"📈 **Forecast**: **{cat}** is on course to reach ₹{fc:,.0f} by month end, over its ₹{limit:,.0f} budget."
+            for cat, fc, limit in zip(over['category'], over['forecast'], over['limit_amount'])]
+
+PDF_MAX_ROWS = 20_000  # Longer histories list the latest rows; the CSV export carries everything
+PDF_COLUMNS = [("Date", "date", 40), ("Category", "category", 40), ("Type", "type", 30), ("Amount", "amount", 40)]
+
+@functools.cache
+def _report_pdf_class():
+    # fpdf is imported with the first report, not by every page that shows suggestions
+    from fpdf import FPDF
+
+    class ReportPDF(FPDF):
+        """Repeats the transaction table header at the top of every page it spills onto."""
+        table_started = False
+
+        def table_header(self):
+            self.set_fill_color(200, 220, 255)
+            for i, (title, _, width) in enumerate(PDF_COLUMNS):
+                self.cell(width, 10, title, 1, int(i == len(PDF_COLUMNS) - 1), 'C', 1)
+
+        def header(self):
+            if self.table_started:
+                self.table_header()
+
+    return ReportPDF
+
+def _latin1(values):
+    """Vectorized str() of a column, made safe for FPDF's core fonts."""
+    if values.dtype.kind == 'M':
+        values = values.dt.strftime('%Y-%m-%d')
+    return values.astype(str).str.encode('latin-1', errors='replace').str.decode('latin-1')
+
+@perf.timed('optimizer.generate_pdf_report')
+def generate_pdf_report(chunks, username, income, expense, total_rows=None, path=None):
+    """Renders the report from an iterable of transaction DataFrame chunks.
+
+    Returns the PDF as bytes, or writes it to `path` when one is given.
+    """
+    pdf = _report_pdf_class()()
     pdf.add_page()
     pdf.set_font("Arial", size=12)
     
-    pdf.cell(200, 10, txt=f"Financial Report for {username}", ln=True, align='C')
+    title = f"Financial Report for {username}".encode('latin-1', errors='replace').decode('latin-1')
+    pdf.cell(200, 10, txt=title, ln=True, align='C')
     pdf.ln(10)
     
     # Summary
-    income = df[df['type'] == 'Income']['amount'].sum()
-    expense = df[df['type'] == 'Expense']['amount'].sum()
     savings = income - expense
     
     pdf.cell(200, 10, txt=f"Total Income: INR {income}", ln=True)
@@ -55,17 +399,26 @@ def generate_pdf_report(df, username):
     pdf.cell(200, 10, txt="Transaction History:", ln=True)
     
     # Table Header
-    pdf.set_fill_color(200, 220, 255)
-    pdf.cell(40, 10, "Date", 1, 0, 'C', 1)
-    pdf.cell(40, 10, "Category", 1, 0, 'C', 1)
-    pdf.cell(30, 10, "Type", 1, 0, 'C', 1)
-    pdf.cell(40, 10, "Amount", 1, 1, 'C', 1)
+    pdf.table_header()
+    pdf.table_started = True
     
-    # Rows
-    for _, row in df.iterrows():
-        pdf.cell(40, 10, str(row['date']), 1)
-        pdf.cell(40, 10, str(row['category']), 1)
-        pdf.cell(30, 10, str(row['type']), 1)
-        pdf.cell(40, 10, str(row['amount']), 1, 1)
+    # Rows: each chunk's columns are formatted in one vectorized pass
+    shown = 0
+    widths = [width for _, _, width in PDF_COLUMNS]
+    for chunk in chunks:
+        columns = [_latin1(chunk[key]) for _, key, _ in PDF_COLUMNS]
+        for values in zip(*columns):
+            for i, (width, value) in enumerate(zip(widths, values)):
+                pdf.cell(width, 10, value, 1, int(i == len(widths) - 1))
+        shown += len(chunk)
+    pdf.table_started = False
+
+    if total_rows is not None and total_rows > shown:
+        pdf.ln(5)
+        pdf.cell(200, 10, txt=f"Showing the latest {shown:,} of {total_rows:,} transactions. "
+                              f"Download the CSV report for the full history.", ln=True)
         
-    return pdf.output(dest='S').encode('latin-1')
\ No newline at end of file
+    if path is not None:
+        pdf.output(path, 'F')
+        return path
+    return pdf.output(dest='S').encode('latin-1')
@@ -0,0 +1,237 @@
+"""Timing spans, per-render query counts and metrics export.
+
+Spans are named durations recorded with the `span` context manager or
+the `timed` decorator: database calls, aggregations, charts, PDFs and
+password hashing. Each span name keeps its count, total and the last
+SAMPLES durations, which give its p50/p95/p99.
+
+A render is one run of app.py. start_render() at the top of the script
+and finish_render() at the bottom bracket it, and section() splits it
+into named parts. Statements SQLite executes on the rendering thread are
+counted through the connection trace callback (database.py installs
+count_query), so every render records its query count too. A session
+can ask start_render() to profile the render with cProfile.
+
+metrics_text() renders all spans in the Prometheus text format. When
+BUDGET_METRICS_FILE is set, finish_render() rewrites that file at most
+every METRICS_INTERVAL seconds, for node_exporter's textfile collector.
+A "{pid}" in the path gives each worker process its own file.
+
+Nothing here imports more than the standard library, so worker
+processes that record spans stay light.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+ENABLED = os.environ.get("BUDGET_PERF", "1") != "0"
+METRICS_FILE = os.environ.get("BUDGET_METRICS_FILE")
+METRICS_INTERVAL = 15.0     # Seconds between metrics file rewrites
+SAMPLES = 2048              # Recent durations kept per span for percentiles
+RECENT_RENDERS = 200
+QUANTILES = (0.5, 0.95, 0.99)
+PROFILE_LINES = 40
+
+class _Span:
+    __slots__ = ("count", "total", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=SAMPLES)
+
+_spans = {}             # name -> _Span
+_renders = deque(maxlen=RECENT_RENDERS)
+_lock = threading.Lock()
+_local = threading.local()
+_profiling = {}         # thread ident -> profiler its current render enabled
+_metrics_written = 0.0
+
+def record(name, seconds):
+    with _lock:
+        span = _spans.get(name)
+        if span is None:
+            span = _spans[name] = _Span()
+        span.count += 1
+        span.total += seconds
+        span.samples.append(seconds)
+
+@contextmanager
+def span(name):
+    """Times the block as `name`."""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def timed(name):
+    """Decorator timing every call as the span `name`."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def count_query(statement):
+    """sqlite3 trace callback: counts statements run by the current render's thread."""
+    render = getattr(_local, "render", None)
+    # Statements run by triggers are reported too, prefixed with "--"
+    if render is not None and not statement.startswith("--"):
+        render["queries"] += 1
+
+# --- Renders ---
+
+def _stop_abandoned_profilers():
+    """Disables profilers of renders that never reached finish_render.
+
+    st.stop() and st.rerun() end a run early. A rerun starts the script
+    again on the same thread, and a stopped run's thread exits, either way
+    with its profiler still enabled.
+    """
+    current = threading.get_ident()
+    alive = {thread.ident for thread in threading.enumerate()}
+    with _lock:
+        abandoned = [_profiling.pop(ident) for ident in list(_profiling) if ident == current or ident not in alive]
+    for profiler in abandoned:
+        profiler.disable()
+
+def start_render(profile=False):
+    """Begins recording a run of app.py on this thread, discarding one cut short before it."""
+    _stop_abandoned_profilers()
+    now = time.perf_counter()
+    render = {"started": time.time(), "page": None, "queries": 0, "seconds": 0.0,
+              "sections": {}, "profile": None, "_start": now, "_section": None, "_section_start": now,
+              "_profiler": None}
+    if profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            render["_profiler"] = profiler
+            with _lock:
+                _profiling[threading.get_ident()] = profiler
+        except ValueError:
+            pass    # Another profiler is active on this interpreter
+    _local.render = render
+    return render
+
+def section(name):
+    """Ends the current section of the render, if any, and starts `name`."""
+    render = getattr(_local, "render", None)
+    if render is None:
+        return
+    now = time.perf_counter()
+    _close_section(render, now)
+    render["_section"], render["_section_start"] = name, now
+
+def _close_section(render, now):
+    if render["_section"] is not None:
+        elapsed = now - render["_section_start"]
+        render["sections"][render["_section"]] = elapsed
+        record(f"section.{render['_section']}", elapsed)
+
+def finish_render(page):
+    """Ends the render and returns its record: page, seconds, queries, sections and profile text.
+
+    Runs cut short by st.stop() or st.rerun() never get here and are not
+    recorded; the next start_render() stops their profilers.
+    """
+    render = getattr(_local, "render", None)
+    if render is None:
+        return None
+    _local.render = None
+    now = time.perf_counter()
+    _close_section(render, now)
+    profiler = render.pop("_profiler")
+    if profiler is not None:
+        with _lock:
+            _profiling.pop(threading.get_ident(), None)
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        render["profile"] = out.getvalue()
+    render["page"] = page
+    render["seconds"] = now - render.pop("_start")
+    for key in ("_section", "_section_start"):
+        render.pop(key)
+    record(f"render.{page}", render["seconds"])
+    with _lock:
+        _renders.append({k: v for k, v in render.items() if k != "profile"})
+    if METRICS_FILE:
+        write_metrics_file()
+    return render
+
+def recent_renders():
+    with _lock:
+        return list(_renders)
+
+# --- Reporting ---
+
+def _quantile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def snapshot():
+    """Per-span stats as a list of dicts, slowest total first. Durations in milliseconds."""
+    with _lock:
+        spans = [(name, s.count, s.total, sorted(s.samples)) for name, s in _spans.items()]
+    rows = []
+    for name, count, total, ordered in spans:
+        row = {"span": name, "count": count, "total_ms": total * 1000, "mean_ms": total / count * 1000}
+        for q in QUANTILES:
+            row[f"p{round(q * 100)}_ms"] = _quantile(ordered, q) * 1000
+        rows.append(row)
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def metrics_text():
+    """All spans as a Prometheus summary, in the text exposition format."""
+    lines = ["# HELP budget_span_seconds Time spent in instrumented code.",
+             "# TYPE budget_span_seconds summary"]
+    for row in sorted(snapshot(), key=lambda r: r["span"]):
+        label = f'span="{_label(row["span"])}"'
+        for q in QUANTILES:
+            lines.append(f'budget_span_seconds{{{label},quantile="{q}"}} {row[f"p{round(q * 100)}_ms"] / 1000:.6f}')
+        lines.append(f"budget_span_seconds_sum{{{label}}} {row['total_ms'] / 1000:.6f}")
+        lines.append(f"budget_span_seconds_count{{{label}}} {row['count']}")
+    renders = recent_renders()
+    if renders:
+        lines += ["# HELP budget_render_queries Statements per render, over recent renders.",
+                  "# TYPE budget_render_queries gauge",
+                  f"budget_render_queries {sum(r['queries'] for r in renders) / len(renders):.2f}"]
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path=None, force=False):
+    """Rewrites the metrics file atomically, at most every METRICS_INTERVAL seconds unless forced."""
+    global _metrics_written
+    now = time.monotonic()
+    if not force and now - _metrics_written < METRICS_INTERVAL:
+        return
+    _metrics_written = now
+    path = (path or METRICS_FILE).replace("{pid}", str(os.getpid()))
+    partial = f"{path}.{os.getpid()}.part"
+    with open(partial, "w", encoding="utf-8") as fh:
+        fh.write(metrics_text())
+    os.replace(partial, path)
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _renders.clear()
@@ -0,0 +1,311 @@
+"""PostgreSQL storage backend, selected with BUDGET_DATABASE_URL=postgresql://...
+
+Implements database.SQLiteBackend's interface on psycopg 3:
+- pooled connections (psycopg_pool);
+- an adapter that accepts the app's sqlite3-style calls and "?"
+  placeholders, so the SQL in database.py and aggregates.py runs
+  unchanged and stays parameterized;
+- server-side cursors for streaming reads;
+- COPY for bulk imports.
+
+The schema, including the rollup and data-version triggers, is created
+natively. Its version numbers match database.MIGRATIONS.
+
+psycopg is optional and only imported when this backend is configured:
+
+    pip install "psycopg[binary,pool]"
+
+A unique-key conflict raises database.DuplicateError, as on SQLite. The
+tests in tests/ run against both backends:
+
+    python -m pytest tests
+"""
+import functools
+import itertools
+import re
+import warnings
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    from psycopg.errors import UniqueViolation
+    from psycopg.pq import TransactionStatus
+    from psycopg_pool import ConnectionPool
+except ImportError as exc:
+    raise ImportError('BUDGET_DATABASE_URL selects PostgreSQL, which needs: pip install "psycopg[binary,pool]"') from exc
+
+import database as db
+
+# pandas accepts any DB-API connection, but warns for everything except
+# sqlite3 and SQLAlchemy
+warnings.filterwarnings("ignore", message="pandas only supports SQLAlchemy", category=UserWarning)
+
+# --- Schema ---
+# The baseline is the SQLite schema as of migration 6 in one step. Later
+# versions go in MIGRATIONS, keyed like database.MIGRATIONS.
+
+BASELINE_VERSION = 6
+
+BASELINE = [
+    """CREATE TABLE IF NOT EXISTS users (
+           username TEXT PRIMARY KEY,
+           password BYTEA,
+           name TEXT
+       )""",
+    # Dates stay ISO-8601 text, so range filters and substr(date, 1, 7) behave as on SQLite
+    """CREATE TABLE IF NOT EXISTS transactions (
+           id BIGSERIAL PRIMARY KEY,
+           username TEXT REFERENCES users(username),
+           date TEXT,
+           amount DOUBLE PRECISION,
+           category TEXT,
+           type TEXT,
+           description TEXT,
+           dedupe_key TEXT
+       )""",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(username, date)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_user_dedupe ON transactions(username, dedupe_key)",
+    """CREATE TABLE IF NOT EXISTS budgets (
+           id BIGSERIAL PRIMARY KEY,
+           username TEXT REFERENCES users(username),
+           category TEXT,
+           limit_amount DOUBLE PRECISION,
+           month TEXT
+       )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_budgets_user_category_month ON budgets(username, category, month)",
+    """CREATE TABLE IF NOT EXISTS monthly_summary (
+           username TEXT NOT NULL,
+           month TEXT NOT NULL,
+           type TEXT NOT NULL,
+           category TEXT NOT NULL,
+           total DOUBLE PRECISION NOT NULL,
+           count BIGINT NOT NULL,
+           PRIMARY KEY (username, month, type, category)
+       )""",
+    """CREATE OR REPLACE FUNCTION rollup_apply() RETURNS trigger LANGUAGE plpgsql AS $$
+       BEGIN
+           IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.username IS NOT NULL THEN
+               UPDATE monthly_summary SET total = total - COALESCE(OLD.amount, 0), count = count - 1
+               WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+                 AND type = COALESCE(OLD.type, '') AND category = COALESCE(OLD.category, '');
+               DELETE FROM monthly_summary
+               WHERE username = OLD.username AND month = substr(OLD.date, 1, 7)
+                 AND type = COALESCE(OLD.type, '') AND category = COALESCE(OLD.category, '') AND count <= 0;
+           END IF;
+           IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.username IS NOT NULL THEN
+               INSERT INTO monthly_summary (username, month, type, category, total, count)
+               VALUES (NEW.username, substr(NEW.date, 1, 7), COALESCE(NEW.type, ''), COALESCE(NEW.category, ''),
+                       COALESCE(NEW.amount, 0), 1)
+               ON CONFLICT (username, month, type, category)
+               DO UPDATE SET total = monthly_summary.total + excluded.total, count = monthly_summary.count + 1;
+           END IF;
+           RETURN NULL;
+       END $$""",
+    "DROP TRIGGER IF EXISTS trg_rollup ON transactions",
+    """CREATE TRIGGER trg_rollup AFTER INSERT OR DELETE OR UPDATE OF username, date, amount, category, type
+       ON transactions FOR EACH ROW EXECUTE FUNCTION rollup_apply()""",
+    """CREATE TABLE IF NOT EXISTS data_versions (
+           username TEXT PRIMARY KEY,
+           version BIGINT NOT NULL
+       )""",
+    """CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger LANGUAGE plpgsql AS $$
+       DECLARE
+           changed TEXT := CASE WHEN TG_OP = 'DELETE' THEN OLD.username ELSE NEW.username END;
+       BEGIN
+           IF changed IS NOT NULL THEN
+               INSERT INTO data_versions (username, version) VALUES (changed, 1)
+               ON CONFLICT (username) DO UPDATE SET version = data_versions.version + 1;
+           END IF;
+           RETURN NULL;
+       END $$""",
+] + [
+    statement
+    for table in ("transactions", "budgets")
+    for statement in (
+        f"DROP TRIGGER IF EXISTS trg_version_{table} ON {table}",
+        f"""CREATE TRIGGER trg_version_{table} AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION bump_data_version()""",
+    )
+] + [
+    """CREATE TABLE IF NOT EXISTS sessions (
+           token_hash TEXT PRIMARY KEY,
+           username TEXT NOT NULL REFERENCES users(username),
+           expires_at DOUBLE PRECISION NOT NULL
+       )""",
+]
+
+# The text the full-text filter searches, as an expression the GIN index is built on
+SEARCH_DOCUMENT = "to_tsvector('simple', coalesce(description, '') || ' ' || coalesce(category, ''))"
+
+MIGRATIONS = {     # version -> statements upgrading the schema to it
+    7: [f"CREATE INDEX IF NOT EXISTS idx_transactions_search ON transactions USING GIN ({SEARCH_DOCUMENT})"],
+    # Archiving itself is SQLite-only (archive.py), but reads and rollup
+    # rebuilds consult these tables, which stay empty here
+    8: [
+        """CREATE TABLE IF NOT EXISTS archive_parts (
+               username TEXT NOT NULL,
+               month TEXT NOT NULL,
+               path TEXT NOT NULL,
+               rows BIGINT NOT NULL,
+               total DOUBLE PRECISION NOT NULL,
+               created DOUBLE PRECISION NOT NULL,
+               PRIMARY KEY (username, month, path)
+           )""",
+        """CREATE TABLE IF NOT EXISTS archived_summary (
+               username TEXT NOT NULL,
+               month TEXT NOT NULL,
+               type TEXT NOT NULL,
+               category TEXT NOT NULL,
+               total DOUBLE PRECISION NOT NULL,
+               count BIGINT NOT NULL,
+               PRIMARY KEY (username, month, type, category)
+           )""",
+        """CREATE TABLE IF NOT EXISTS archived_keys (
+               username TEXT NOT NULL,
+               dedupe_key TEXT NOT NULL,
+               PRIMARY KEY (username, dedupe_key)
+           )""",
+    ],
+    9: [
+        """CREATE TABLE IF NOT EXISTS recurring_rules (
+               id BIGSERIAL PRIMARY KEY,
+               username TEXT NOT NULL REFERENCES users(username),
+               amount DOUBLE PRECISION NOT NULL,
+               category TEXT,
+               type TEXT,
+               description TEXT,
+               interval_months INTEGER NOT NULL,
+               day INTEGER NOT NULL,
+               end_date TEXT,
+               next_date TEXT
+           )""",
+        "CREATE INDEX IF NOT EXISTS idx_recurring_rules_user ON recurring_rules(username)",
+        "CREATE INDEX IF NOT EXISTS idx_recurring_rules_due ON recurring_rules(next_date) WHERE next_date IS NOT NULL",
+    ],
+}
+
+# --- Connections ---
+
+# Quoted text the placeholder rewrite skips: string literals, quoted
+# identifiers, dollar-quoted bodies and comments, then a bare "?"
+_SQL_TOKENS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$\$.*?\$\$|--[^\n]*|/\*.*?\*/|\?", re.DOTALL)
+
+@functools.lru_cache(maxsize=1024)
+def _translate(sql):
+    """sqlite3 paramstyle to psycopg's: a "?" outside quotes becomes %s, and every literal % is escaped."""
+    # psycopg reads %s and %% anywhere in the query, quoted or not
+    return _SQL_TOKENS.sub(lambda m: "%s" if m.group() == "?" else m.group(), sql.replace("%", "%%"))
+
+class _Cursor:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def execute(self, sql, params=()):
+        # Always pass params, even empty, so psycopg unescapes %% consistently
+        self.raw.execute(_translate(sql), tuple(params or ()))
+        return self
+
+    def executemany(self, sql, seq):
+        self.raw.executemany(_translate(sql), seq)
+        return self
+
+    def __iter__(self):
+        return iter(self.raw)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)     # fetch*, description, rowcount, close
+
+class _Connection:
+    """Gives a psycopg connection the sqlite3 calls the rest of the app makes."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self):
+        return _Cursor(self.raw.cursor())
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    @property
+    def in_transaction(self):
+        return self.raw.info.transaction_status != TransactionStatus.IDLE
+
+class PostgresBackend:
+    name = "postgresql"
+    schema_ready = False
+    duplicate_errors = (UniqueViolation,)
+
+    def __init__(self, url, size=db.POOL_SIZE, timeout=db.POOL_TIMEOUT):
+        self.pool = ConnectionPool(url, min_size=1, max_size=size, timeout=timeout, open=True)
+        self._cursor_names = itertools.count()
+
+    @contextmanager
+    def connection(self):
+        # The pool commits when the block succeeds and rolls back when it raises
+        with self.pool.connection() as raw:
+            yield _Connection(raw)
+
+    def schema_version(self, conn):
+        row = conn.execute("SELECT max(version) FROM schema_version").fetchone()
+        return row[0] or 0
+
+    def begin_read(self, conn):
+        # READ COMMITTED, the default, takes a new snapshot per statement
+        conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+
+    def init_schema(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+        # Serializes workers starting at the same time; released at commit
+        conn.execute("SELECT pg_advisory_xact_lock(hashtext('budget-optimizer-schema'))")
+        version = self.schema_version(conn)
+        pending = ([(BASELINE_VERSION, BASELINE)] if version < BASELINE_VERSION else []) + \
+                  [(v, MIGRATIONS[v]) for v in sorted(MIGRATIONS) if v > max(version, BASELINE_VERSION)]
+        for target, statements in pending:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("INSERT INTO schema_version (version) VALUES (?)", (target,))
+
+    def insert_transactions(self, conn, rows):
+        # COPY into a session-local staging table, then one set-based insert
+        # that skips rows already present
+        conn.execute("""CREATE TEMP TABLE IF NOT EXISTS import_rows (
+                            username TEXT, date TEXT, amount DOUBLE PRECISION, category TEXT,
+                            type TEXT, description TEXT, dedupe_key TEXT
+                        ) ON COMMIT DELETE ROWS""")
+        conn.execute("DELETE FROM import_rows")
+        with conn.raw.cursor() as cur:
+            with cur.copy("COPY import_rows (username, date, amount, category, type, description, dedupe_key) "
+                          "FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+            cur.execute("INSERT INTO transactions (username, date, amount, category, type, description, dedupe_key) "
+                        "SELECT * FROM import_rows ON CONFLICT DO NOTHING")
+            return cur.rowcount
+
+    def read_chunks(self, conn, sql, params, chunksize):
+        # A named cursor keeps the result set on the server; rows arrive chunksize at a time
+        with conn.raw.cursor(name=f"stream_{next(self._cursor_names)}") as cur:
+            cur.itersize = chunksize
+            cur.execute(_translate(sql), tuple(params))
+            columns = [column.name for column in cur.description]
+            while rows := cur.fetchmany(chunksize):
+                yield pd.DataFrame(rows, columns=columns)
+
+    def text_filter(self, username, words):
+        # Rows are narrowed to the user by the query's own username condition
+        query = " & ".join(f"'{word.rstrip('*')}'" + ":*" * word.endswith("*") for word in words)
+        return f"{SEARCH_DOCUMENT} @@ to_tsquery('simple', ?)", [query]
+
+    def stats(self):
+        return self.pool.get_stats()
@@ -0,0 +1,89 @@
+"""Background posting of recurring transactions (salary, rent, subscriptions).
+
+Rules are stored in recurring_rules and posted by
+database.post_recurring(), which catches up on every occurrence due since
+the last run, for all users, in a few bulk transactions. This module runs
+it on a schedule: `start` does so on a daemon thread, once per process,
+every BUDGET_RECURRING_INTERVAL seconds (0 disables it). The app starts it
+when it writes to the database itself; with a writer service
+(launcher.py) the writer runs it instead, so workers do not all post the
+same rules. Posting is idempotent either way.
+
+Without a long-running process, run `post` from cron:
+
+    python recurring.py post
+    python recurring.py run --interval 600
+    python recurring.py list --user alice
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import database as db
+import perf
+
+INTERVAL = float(os.environ.get("BUDGET_RECURRING_INTERVAL", "3600"))
+
+def post_due(today=None):
+    """Posts everything due by `today`; returns (rules, rows, seconds)."""
+    t0 = time.perf_counter()
+    with perf.span("recurring.post"):
+        rules, rows = db.post_recurring(today)
+    return rules, rows, time.perf_counter() - t0
+
+def run(interval=INTERVAL, stop=None, log=None):
+    """Posts due occurrences now and then every `interval` seconds until `stop` is set."""
+    stop = stop or threading.Event()
+    while True:
+        try:
+            rules, rows, seconds = post_due()
+            if log and rules:
+                log(f"Posted {rows:,} recurring transactions for {rules:,} rules in {seconds:.2f}s")
+        except Exception as exc:
+            # Retried on the next run; nothing was posted by the failed batch
+            print(f"Recurring transactions not posted: {exc!r}", file=sys.stderr)
+        if stop.wait(interval):
+            return
+
+_started = None
+_lock = threading.Lock()
+
+def start(interval=INTERVAL):
+    """Starts posting on a daemon thread, once per process; returns the Event that stops it."""
+    global _started
+    with _lock:
+        if _started is None and interval > 0:
+            _started = threading.Event()
+            threading.Thread(target=run, args=(interval, _started), name="recurring", daemon=True).start()
+        return _started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    post = commands.add_parser("post", help="post every occurrence due, then exit")
+    post.add_argument("--today", help="post as of this date, YYYY-MM-DD (default: today)")
+    loop = commands.add_parser("run", help="post now and then every --interval seconds")
+    loop.add_argument("--interval", type=float, default=INTERVAL or 3600, help="seconds (default: %(default)s)")
+    listing = commands.add_parser("list", help="show a user's rules")
+    listing.add_argument("--user", required=True)
+    args = parser.parse_args()
+
+    db.DB_NAME = args.db
+    db.init_db()
+    if args.command == "post":
+        rules, rows, seconds = post_due(args.today)
+        print(f"Posted {rows:,} transactions for {rules:,} rules in {seconds:.2f}s")
+    elif args.command == "run":
+        try:
+            run(args.interval, log=lambda message: print(message, file=sys.stderr))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "list":
+        rules = db.get_recurring_rules(args.user)
+        print(rules.to_string(index=False) if not rules.empty else f"{args.user} has no recurring rules")
+
+if __name__ == "__main__":
+    main()
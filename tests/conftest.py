@@ -0,0 +1,64 @@
+"""Fixtures running each test on a fresh database of every storage backend.
+
+`backend` is parameterized over SQLite and PostgreSQL. PostgreSQL tests
+use the server at BUDGET_DATABASE_URL, or else a throwaway local server
+started with pgserver, which bundles the PostgreSQL binaries. They are
+skipped when psycopg or both of those are unavailable:
+
+    pip install pytest "psycopg[binary,pool]" pgserver
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+import database as db
+
+SERVER_URL = os.environ.get("BUDGET_DATABASE_URL")
+
+def pytest_configure(config):
+    # postgres.py silences this at import, but pytest resets warning filters per test
+    config.addinivalue_line("filterwarnings", "ignore:pandas only supports SQLAlchemy:UserWarning")
+
+@pytest.fixture(scope="session")
+def postgres_server():
+    """URL of a PostgreSQL server the tests may create databases on."""
+    pytest.importorskip("psycopg", reason='PostgreSQL tests need: pip install "psycopg[binary,pool]"')
+    if SERVER_URL:
+        return SERVER_URL
+    pgserver = pytest.importorskip("pgserver", reason="set BUDGET_DATABASE_URL or pip install pgserver")
+    return pgserver.get_server(tempfile.mkdtemp(), cleanup_mode="delete").get_uri()
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def backend(request, monkeypatch, tmp_path):
+    """Points database.py at a new, empty database of the parameter's backend; returns the backend."""
+    monkeypatch.setattr(db, "WRITER_ADDRESS", None)
+    if request.param == "sqlite":
+        monkeypatch.setattr(db, "DATABASE_URL", None)
+        monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "test.db"))
+        name = None
+    else:
+        import psycopg
+        from psycopg.conninfo import make_conninfo
+        server = request.getfixturevalue("postgres_server")
+        name = f"test_{os.getpid()}_{request.node.name.translate(str.maketrans('[]-', '___'))}".lower()
+        with psycopg.connect(server, autocommit=True) as conn:
+            conn.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+            conn.execute(f"CREATE DATABASE {name}")
+        monkeypatch.setattr(db, "DATABASE_URL", make_conninfo(server, dbname=name))
+    # Versions restart in every new database, so cached values must not carry over
+    cache.invalidate()
+    db.init_db()
+    yield db.get_backend()
+
+    cache.invalidate()
+    with db._backends_lock:
+        db._backends.pop(db.DATABASE_URL or db.DB_NAME).pool.close()
+    if name is not None:
+        with psycopg.connect(server, autocommit=True) as conn:
+            conn.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
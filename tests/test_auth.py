@@ -0,0 +1,31 @@
+"""Login rate limits and the in-process session cache."""
+import time
+
+import auth
+import database as db
+
+def test_client_address_without_proxies_is_the_peer():
+    assert auth.client_address("10.0.0.5", "1.2.3.4", proxies=0) == "10.0.0.5"
+
+def test_client_address_behind_proxies_is_read_from_forwarded_for():
+    # The client can prepend anything; only the entry the trusted proxy appended counts
+    assert auth.client_address("10.0.0.1", "6.6.6.6, 203.0.113.7", proxies=1) == "203.0.113.7"
+    assert auth.client_address("10.0.0.1", "203.0.113.7, 10.0.0.2", proxies=2) == "203.0.113.7"
+    assert auth.client_address("10.0.0.1", None, proxies=1) is None
+
+def test_expired_sessions_are_pruned_on_insert(backend, monkeypatch):
+    db.create_user("a@example.com", "-", "A")
+    monkeypatch.setattr(auth, "_sessions", {f"old{i}": ("a@example.com", "A", time.time() - 1) for i in range(50)})
+    monkeypatch.setattr(auth, "_swept", 0.0)
+    token = auth.create_session("a@example.com", "A")
+    assert list(auth._sessions) == [auth._token_hash(token)]
+    assert auth.validate_session(token) == ("a@example.com", "A")
+
+def test_session_cache_is_bounded(backend, monkeypatch):
+    db.create_user("a@example.com", "-", "A")
+    monkeypatch.setattr(auth, "_sessions", {})
+    monkeypatch.setattr(auth, "MAX_SESSIONS", 3)
+    tokens = [auth.create_session("a@example.com", "A") for _ in range(5)]
+    assert len(auth._sessions) == 3
+    # Dropped from the cache, still valid from the sessions table
+    assert auth.validate_session(tokens[0]) == ("a@example.com", "A")
@@ -0,0 +1,131 @@
+"""Correctness of the forecasting engine, the incremental summaries and the storage backends.
+
+Every test runs on SQLite and on PostgreSQL (see conftest.py).
+"""
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import aggregates
+import auth
+import cache
+import database as db
+import optimizer
+from benchmarks import synthetic
+
+USER = "check@example.com"
+SUMMARY_FRAMES = ["by_category", "monthly", "budgets", "rollup", "daily"]
+
+def _months_back(today, n):
+    """The first of the month n months before today's."""
+    year, month = divmod(today.year * 12 + today.month - 1 - n, 12)
+    return date(year, month + 1, 1)
+
+def _steady_user(months):
+    """A user paid 50,000 and paying 5,000 rent on the 1st of each of the last `months` months and this one."""
+    db.create_user(USER, "-", "Check User")
+    today = date.today()
+    for n in range(months, -1, -1):
+        first = _months_back(today, n).isoformat()
+        db.add_transaction(USER, first, 50_000.0, "Salary", "Income", "Salary")
+        db.add_transaction(USER, first, 5_000.0, "Rent", "Expense", "House rent")
+    return USER, today.strftime("%Y-%m")
+
+def assert_same_summary(carried, rebuilt):
+    for name in SUMMARY_FRAMES:
+        frames = [getattr(s, name).astype({c: str for c in getattr(s, name).columns
+                                            if getattr(s, name)[c].dtype.name == "category"})
+                  .reset_index(drop=True) for s in (carried, rebuilt)]
+        pd.testing.assert_frame_equal(*frames, check_dtype=False, atol=1e-6, obj=name)
+    assert carried.income == pytest.approx(rebuilt.income)
+    assert carried.expense == pytest.approx(rebuilt.expense)
+
+# --- Forecast ---
+
+def test_steady_rent_is_not_forecast_over_budget(backend):
+    user, month = _steady_user(12)
+    db.set_budget(user, "Rent", 6_000.0, month)
+    summary = aggregates.summarize.uncached(user, month)
+    result, _ = optimizer.forecast(summary)
+    assert result.by_category.set_index("category").loc["Rent", "forecast"] == pytest.approx(5_000.0)
+    assert result.income == pytest.approx(50_000.0)
+    assert optimizer.forecast_overrun(summary) == []
+
+def test_new_user_lump_payment_is_the_months_total(backend):
+    user, month = _steady_user(0)
+    result, _ = optimizer.forecast(aggregates.summarize.uncached(user, month))
+    plan = optimizer.allocate(result)
+    assert result.by_category.set_index("category").loc["Rent", "forecast"] == pytest.approx(5_000.0)
+    assert result.income == pytest.approx(50_000.0)
+    assert plan.limits.set_index("category").loc["Rent", "limit"] == pytest.approx(5_000.0)
+
+def test_new_user_small_payments_are_paced(backend):
+    db.create_user(USER, "-", "Check User")
+    today = date.today()
+    for day in range(1, today.day + 1):
+        db.add_transaction(USER, today.replace(day=day).isoformat(), 100.0, "Food", "Expense", "Groceries")
+    result, _ = optimizer.forecast(aggregates.summarize.uncached(USER, today.strftime("%Y-%m")))
+    food = result.by_category.set_index("category").loc["Food", "forecast"]
+    paced = today.day >= optimizer.PACE_MIN_ROWS
+    assert food == pytest.approx(100.0 * today.day / (result.elapsed if paced else 1.0))
+
+# --- Incremental summaries ---
+
+def test_carried_summary_matches_rebuild_after_random_writes(backend, monkeypatch):
+    writes = 60
+    monkeypatch.setattr(aggregates, "RECONCILE_EVERY", writes + 1)
+    user = synthetic.generate(1, 2_000, bcrypt_rounds=4)[0]
+    today = date.today()
+    month = today.strftime("%Y-%m")
+    rng = random.Random(0)
+    aggregates.summarize(user, month)
+    applied = aggregates.INCREMENTAL_STATS["applied"]
+    added = []
+    for _ in range(writes):
+        pick = rng.random()
+        if pick < 0.5 or not added:
+            # Mostly days with no synthetic expenses, so deletes empty them again
+            day = today + timedelta(days=rng.randrange(1, 40)) if rng.random() < 0.7 else \
+                today - timedelta(days=rng.randrange(0, aggregates.DAILY_WINDOW))
+            change = db.add_transaction(user, day.isoformat(), round(rng.uniform(1, 500), 2),
+                                        rng.choice(["Food", "Rent", "New"]), rng.choice(["Expense", "Income"]), "x")
+            added.append(change.row[0])
+        elif pick < 0.85:
+            db.delete_transaction(added.pop(rng.randrange(len(added))))
+        else:
+            db.set_budget(user, rng.choice(["Food", "Other"]), round(rng.uniform(100, 9_000), 2), month)
+        assert_same_summary(aggregates.summarize(user, month), aggregates.summarize.uncached(user, month))
+    # Otherwise every comparison above was of two rebuilds
+    assert aggregates.INCREMENTAL_STATS["applied"] - applied == writes
+
+def test_write_between_version_read_and_compute_is_applied_once(backend):
+    user, month = _steady_user(2)
+    changes = []
+
+    def compute():
+        # Another session's write lands after the version was read. Its
+        # listeners run only later, once the value below has been cached.
+        with backend.connection() as conn:
+            changes.append(db.WRITES["add_transaction"](conn, user, date.today().isoformat(), 123.0, "Food",
+                                                         "Expense", "interleaved"))
+        return aggregates.summarize.uncached(user, month)
+
+    cache.get_or_compute(user, "summary", (month,), compute)
+    for listener in db.WRITE_LISTENERS:
+        listener("add_transaction", changes[0])
+    assert_same_summary(aggregates.summarize(user, month), aggregates.summarize.uncached(user, month))
+
+# --- Backends ---
+
+def test_taken_username_raises_duplicate_error(backend):
+    db.create_user(USER, "-", "Check User")
+    with pytest.raises(db.DuplicateError):
+        db.create_user(USER, "-", "Again")
+    assert auth.register_user(USER, "password", "Again") is False
+
+def test_quoted_placeholders_are_sql_text(backend):
+    with db.get_connection() as conn:
+        row = conn.execute("SELECT '?', 'a%b', ? -- why?\n", ("value",)).fetchone()
+    assert tuple(row) == ("?", "a%b", "value")
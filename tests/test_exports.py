@@ -0,0 +1,35 @@
+"""Export files and the directory they are written to."""
+import os
+import stat
+
+import pytest
+
+import database as db
+import exports
+
+@pytest.fixture
+def user(tmp_path, monkeypatch):
+    # Export workers open DB_NAME themselves, so these tests use SQLite
+    monkeypatch.setattr(db, "DATABASE_URL", None)
+    monkeypatch.setattr(db, "WRITER_ADDRESS", None)
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "test.db"))
+    db.init_db()
+    db.create_user("a@example.com", "-", "A")
+    db.add_transaction("a@example.com", "2026-01-02", 12.5, "Food", "Expense", "Lunch")
+    return "a@example.com"
+
+@pytest.mark.parametrize("kind", ["csv", "pdf"])
+def test_exports_are_private(user, tmp_path, monkeypatch, kind):
+    directory = tmp_path / "exports"
+    directory.mkdir(mode=0o777)
+    os.chmod(directory, 0o777)
+    monkeypatch.setattr(exports, "EXPORT_DIR", str(directory))
+    path = exports.request(user, kind, "A").result(60)
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+def test_export_dir_must_be_a_directory_of_this_user(tmp_path):
+    (tmp_path / "elsewhere").mkdir()
+    os.symlink(tmp_path / "elsewhere", tmp_path / "link")
+    with pytest.raises(PermissionError):
+        exports._private_dir(str(tmp_path / "link"))
@@ -0,0 +1,25 @@
+"""Render recording in perf.py."""
+import sys
+import threading
+
+import perf
+
+def test_rerun_stops_the_abandoned_profiler():
+    perf.start_render(profile=True)
+    assert sys.getprofile() is not None
+    # st.rerun() raises before finish_render; the script starts again on this thread
+    render = perf.start_render(profile=False)
+    assert sys.getprofile() is None
+    assert render["_profiler"] is None
+    assert perf._profiling == {}
+
+def test_stopped_render_on_an_exited_thread_is_cleaned_up():
+    # st.stop() ends the run, and its script thread, before finish_render
+    thread = threading.Thread(target=perf.start_render, kwargs={"profile": True})
+    thread.start()
+    thread.join()
+    assert thread.ident in perf._profiling
+    render = perf.start_render(profile=True)
+    assert list(perf._profiling) == [threading.get_ident()]
+    assert perf.finish_render("Test")["profile"]
+    assert perf._profiling == {} and sys.getprofile() is None
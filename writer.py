@@ -0,0 +1,200 @@
+"""Single writer service for running several app workers on one database.
+
+SQLite allows one writer at a time. With several Streamlit processes each
+writing on its own, they queue on the database lock and, past
+busy_timeout, fail with "database is locked". In the multi-worker
+deployment (see launcher.py) every worker sets BUDGET_WRITER_ADDRESS and
+database._write() sends its writes here instead. Reads stay in the
+workers, on their own WAL snapshots.
+
+The service applies writes from a queue on one connection. Whatever has
+queued up while the previous batch committed goes into the next
+transaction, each write under its own savepoint. One failing write is
+rolled back and reported to its caller without affecting the rest of
+the batch.
+
+Workers authenticate with the shared secret in BUDGET_WRITER_AUTHKEY.
+Requests arrive pickled, so anyone holding the key can run code in this
+process. There is no default key: the service refuses to start without
+one, and launcher.py generates a random key for each run.
+
+    BUDGET_WRITER_AUTHKEY=$(python -c "import secrets; print(secrets.token_hex(16))") \
+        python writer.py --db budget.db --address 127.0.0.1:8500
+"""
+import ipaddress
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import database as db
+
+BATCH_MAX = 512         # Writes committed together at most
+AUTHKEY = os.environ.get("BUDGET_WRITER_AUTHKEY", "").encode("utf-8")     # Required; no default
+
+def parse_address(text):
+    """'host:port' for TCP, anything else is a Unix socket path."""
+    host, sep, port = text.rpartition(":")
+    return (host, int(port)) if sep and port.isdigit() else text
+
+def is_local(text):
+    """True for a Unix socket or a loopback host, which other machines cannot reach."""
+    address = parse_address(text)
+    if isinstance(address, str):
+        return True
+    host = address[0].strip("[]")
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def _authkey():
+    if not AUTHKEY:
+        raise RuntimeError("BUDGET_WRITER_AUTHKEY is not set; the writer service needs a shared secret")
+    return AUTHKEY
+
+# --- Service ---
+
+class _Request:
+    __slots__ = ("op", "args", "result", "done")
+
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+        self.result = None
+        self.done = threading.Event()
+
+class WriterService:
+    def __init__(self, address):
+        self.listener = Listener(parse_address(address), authkey=_authkey())
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.stats = {"writes": 0, "errors": 0, "batches": 0, "largest_batch": 0, "seconds": 0.0}
+
+    def serve_forever(self):
+        threading.Thread(target=self._write_loop, name="writer", daemon=True).start()
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                continue    # Failed handshake, e.g. wrong authkey
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def _serve_client(self, conn):
+        # One connection per client thread, one request in flight on each
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if op not in db.WRITES:
+                    conn.send(("error", ValueError(f"Unknown write {op!r}")))
+                    continue
+                request = _Request(op, args)
+                self._queue.put(request)
+                request.done.wait()
+                conn.send(request.result)
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_MAX:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._apply(batch)
+
+    def _apply(self, batch):
+        start = time.perf_counter()
+        try:
+            with db.get_connection() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for request in batch:
+                    conn.execute("SAVEPOINT write")
+                    try:
+                        request.result = ("ok", db.WRITES[request.op](conn, *request.args))
+                    except Exception as exc:
+                        conn.execute("ROLLBACK TO write")
+                        request.result = ("error", exc)
+                    conn.execute("RELEASE write")
+        except Exception as exc:
+            # The commit itself failed: nothing in the batch was written
+            for request in batch:
+                request.result = ("error", exc)
+        with self._lock:
+            self.stats["writes"] += len(batch)
+            self.stats["errors"] += sum(r.result[0] == "error" for r in batch)
+            self.stats["batches"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            self.stats["seconds"] += time.perf_counter() - start
+        for request in batch:
+            request.done.set()
+
+# --- Client (app workers) ---
+
+_local = threading.local()
+
+def _client():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = Client(parse_address(db.WRITER_ADDRESS), authkey=_authkey())
+    return conn
+
+def call(op, *args):
+    """Runs database.WRITES[op](conn, *args) in the writer service and returns its result."""
+    conn = _client()
+    try:
+        conn.send((op, args))
+        status, value = conn.recv()
+    except (EOFError, OSError):
+        # Not retried: the write may have been applied before the connection dropped
+        _local.conn = None
+        raise
+    if status == "error":
+        raise value
+    return value
+
+def wait_ready(address, timeout=30.0):
+    """Blocks until a writer service accepts connections at `address`."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            Client(parse_address(address), authkey=_authkey()).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    import backup
+    import recurring
+
+    parser = argparse.ArgumentParser(description="Budget Optimizer single writer service")
+    parser.add_argument("--db", default=db.DB_NAME, help="database file (default: %(default)s)")
+    parser.add_argument("--address", default=db.WRITER_ADDRESS or "127.0.0.1:8500",
+                        help="host:port or socket path to listen on (default: %(default)s)")
+    args = parser.parse_args()
+    if not AUTHKEY:
+        parser.error("set BUDGET_WRITER_AUTHKEY to a random secret shared with the app workers")
+
+    db.DB_NAME = args.db
+    db.WRITER_ADDRESS = None    # This process is the writer
+    db.init_db()
+    # The workers leave background jobs to this process
+    recurring.start()
+    backup.start()
+    service = WriterService(args.address)
+    print(f"Writer for {args.db} listening on {args.address}", file=sys.stderr)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{service.stats}", file=sys.stderr)